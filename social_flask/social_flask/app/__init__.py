@@ -2,30 +2,68 @@ import os
 
 from flask import Flask, request, url_for
 from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache
 
 from config import config_by_name
-from .extensions import db, login_manager, mail
+from . import archive, deletion, exports, jobs, mail_queue, migrations, trending
+from .caching import FragmentCacheExtension
+from .extensions import db, instrumentation, limiter, login_manager, mail, response_cache, user_cache
 from .models import Notification
 
 
 def create_app(config_name: str = "dev") -> Flask:
     app = Flask(__name__, instance_relative_config=False, static_folder="static", template_folder="templates")
     app.config.from_object(config_by_name.get(config_name, config_by_name["dev"]))
+    configure_jinja(app)
 
     db.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
     login_manager.login_view = "auth.login"
+    user_cache.configure(maxsize=app.config["USER_CACHE_SIZE"], ttl=app.config["USER_CACHE_TTL"])
+    response_cache.init_app(app)
+    instrumentation.init_app(app)
+    limiter.init_app(app)
 
     register_blueprints(app)
     register_template_globals(app)
-
-    with app.app_context():
-        db.create_all()
+    migrations.register_cli(app)
+    mail_queue.register_cli(app)
+    jobs.register_cli(app)
+    exports.register_cli(app)
+    deletion.register_cli(app)
+    trending.register_cli(app)
+    archive.register_cli(app)
+
+    # В production схема обновляется отдельной командой `flask db upgrade`
+    # до перезапуска воркеров, поэтому при старте БД не трогаем вовсе.
+    if app.config["AUTO_MIGRATE"]:
+        with app.app_context():
+            migrations.upgrade(db.engine)
+
+    if app.config["PRECOMPILE_TEMPLATES"]:
+        precompile_templates(app)
 
     return app
 
 
+def configure_jinja(app: Flask) -> None:
+    # Настройки окружения Jinja задаются до первого обращения к app.jinja_env
+    options = dict(app.jinja_options)
+    options["extensions"] = [*options.get("extensions", ()), FragmentCacheExtension]
+    cache_dir = app.config["JINJA_BYTECODE_CACHE_DIR"]
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        options["bytecode_cache"] = FileSystemBytecodeCache(cache_dir)
+    app.jinja_options = options
+
+
+def precompile_templates(app: Flask) -> None:
+    """Компилирует все шаблоны заранее (в мастер-процессе до fork воркеров)."""
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+
+
 def register_blueprints(app: Flask) -> None:
     from .auth.routes import auth_bp
     from .main.routes import main_bp
@@ -0,0 +1,140 @@
+"""Правила видимости (Visibility) в одном месте.
+
+Для запросов правила компилируются в одно SQL-условие для конкретного
+зрителя: дружба и членство в группе проверяются коррелированным EXISTS
+по первичному ключу friendship и индексу ix_group_member_group_id_user_id,
+так что фильтрация идёт в базе без проверок по строкам в Python.
+
+    Post.query.filter(visible_posts(viewer_id))
+
+Для проверок уже загруженных объектов (`can_view_post(post)` и т.п.)
+граф зрителя — друзья и группы — загружается одним запросом и
+запоминается в flask.g до конца запроса.
+
+Правила: PUBLIC (и пустое значение в старых строках) видно всем,
+FRIENDS — автору/владельцу и его друзьям (дружба в любую сторону),
+PRIVATE — только автору/владельцу. Группы, кроме того, всегда видны
+своим участникам.
+"""
+
+from typing import FrozenSet, NamedTuple, Optional
+
+from flask import g, has_request_context
+from flask_login import current_user
+from sqlalchemy import and_, literal, or_, select, union_all
+
+from .extensions import db
+from .models import Group, GroupMember, GroupPost, Post, User, Visibility, friendship
+
+
+class ViewerGraph(NamedTuple):
+    friend_ids: FrozenSet[int]
+    group_ids: FrozenSet[int]
+
+
+EMPTY_GRAPH = ViewerGraph(frozenset(), frozenset())
+
+
+def current_viewer_id() -> Optional[int]:
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+
+def _public(column):
+    return or_(column.is_(None), column == Visibility.PUBLIC)
+
+
+def _friends_with(viewer_id: int, user_column):
+    """EXISTS: user_column и зритель — друзья (запись дружбы в любую сторону)."""
+    return or_(
+        select(friendship.c.user_id)
+        .where(friendship.c.user_id == viewer_id, friendship.c.friend_id == user_column)
+        .exists(),
+        select(friendship.c.user_id)
+        .where(friendship.c.user_id == user_column, friendship.c.friend_id == viewer_id)
+        .exists(),
+    )
+
+
+def _owned_visibility(visibility, owner_column, viewer_id: Optional[int]):
+    if viewer_id is None:
+        return _public(visibility)
+    return or_(
+        _public(visibility),
+        owner_column == viewer_id,
+        and_(visibility == Visibility.FRIENDS, _friends_with(viewer_id, owner_column)),
+    )
+
+
+def visible_posts(viewer_id: Optional[int]):
+    return _owned_visibility(Post.visibility, Post.user_id, viewer_id)
+
+
+def visible_users(viewer_id: Optional[int]):
+    """Чей профиль зритель видит полностью (User.privacy_level)."""
+    return _owned_visibility(User.privacy_level, User.id, viewer_id)
+
+
+def visible_groups(viewer_id: Optional[int]):
+    condition = _owned_visibility(Group.visibility, Group.owner_id, viewer_id)
+    if viewer_id is None:
+        return condition
+    is_member = (
+        select(GroupMember.id).where(GroupMember.group_id == Group.id, GroupMember.user_id == viewer_id).exists()
+    )
+    return or_(condition, is_member)
+
+
+def visible_group_posts(viewer_id: Optional[int]):
+    """Записи в группах видны тем, кому видна сама группа."""
+    return select(Group.id).where(Group.id == GroupPost.group_id, visible_groups(viewer_id)).exists()
+
+
+def viewer_graph() -> ViewerGraph:
+    """Друзья и группы текущего зрителя; один запрос на HTTP-запрос."""
+    viewer_id = current_viewer_id()
+    if viewer_id is None:
+        return EMPTY_GRAPH
+    graph = g.get("viewer_graph")
+    if graph is None:
+        rows = db.session.execute(
+            union_all(
+                select(literal("friend"), friendship.c.friend_id).where(friendship.c.user_id == viewer_id),
+                select(literal("friend"), friendship.c.user_id).where(friendship.c.friend_id == viewer_id),
+                select(literal("group"), GroupMember.group_id).where(GroupMember.user_id == viewer_id),
+            )
+        ).all()
+        graph = ViewerGraph(
+            frozenset(ref for kind, ref in rows if kind == "friend"),
+            frozenset(ref for kind, ref in rows if kind == "group"),
+        )
+        g.viewer_graph = graph
+    return graph
+
+
+def _can_view(visibility, owner_id: int) -> bool:
+    if visibility in (None, Visibility.PUBLIC):
+        return True
+    viewer_id = current_viewer_id()
+    if viewer_id is None:
+        return False
+    if owner_id == viewer_id:
+        return True
+    return visibility == Visibility.FRIENDS and owner_id in viewer_graph().friend_ids
+
+
+def can_view_post(post: Post) -> bool:
+    return _can_view(post.visibility, post.user_id)
+
+
+def can_view_user(user: User) -> bool:
+    return _can_view(user.privacy_level, user.id)
+
+
+def can_view_group(group: Group) -> bool:
+    return _can_view(group.visibility, group.owner_id) or is_group_member(group)
+
+
+def is_group_member(group: Group) -> bool:
+    return group.id in viewer_graph().group_ids
@@ -0,0 +1,294 @@
+"""Архив старых сообщений и уведомлений в сжатых сегментах.
+
+Сообщения старше ARCHIVE_AFTER_DAYS переносятся из таблицы message в
+message_segment: пачка до ARCHIVE_SEGMENT_SIZE сообщений одного чата —
+одна строка с zlib-сжатым JSON. Архивируется всегда начало переписки по
+id, поэтому у каждого чата архив — это непрерывный префикс: сегменты
+только дописываются, их диапазоны id не пересекаются и все меньше id
+сообщений, оставшихся в message. Чтение переписки (`chat_messages`)
+идёт от новых к старым и, когда горячие сообщения кончаются, продолжает
+по сегментам через индекс (chat_id, first_id) — для страницы чата
+разница не видна.
+
+Прочитанные уведомления старше того же срока так же складываются в
+notification_segment по пользователям; они доступны в выгрузке данных.
+
+Таблицы message и notification и их индексы остаются маленькими и
+помещаются в кэш страниц. Запуск: `flask archive run` (или
+`flask archive worker`); в SQLite место в файле базы освобождает
+`flask archive run --vacuum`.
+
+Запуски могут пересечься (воркер и ручной `flask archive run`), поэтому
+пачка сначала удаляется из горячей таблицы, и только если удалились все
+её строки, записывается сегмент. Иначе пачку уже забрал другой запуск:
+транзакция откатывается, и чат (или пользователь) пропускается до
+следующего прохода.
+"""
+
+import json
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import click
+from flask import Flask, current_app
+from sqlalchemy import delete, func, select
+
+from .extensions import db
+from .models import Message, MessageSegment, Notification, NotificationSegment
+from .workers import add_worker_command, run_periodic, start_thread
+
+MESSAGE_COLUMNS = (
+    Message.id, Message.sender_id, Message.body, Message.media_url, Message.media_type, Message.created_at,
+)
+NOTIFICATION_COLUMNS = (
+    Notification.id, Notification.kind, Notification.payload, Notification.is_read, Notification.created_at,
+)
+
+
+class ArchivedMessage(NamedTuple):
+    """Сообщение из сегмента; для шаблонов выглядит так же, как Message."""
+
+    id: int
+    chat_id: int
+    sender_id: int
+    body: Optional[str]
+    media_url: Optional[str]
+    media_type: Optional[str]
+    created_at: Optional[datetime]
+
+
+def _pack(rows: Sequence[dict]) -> bytes:
+    data = [dict(row, created_at=row["created_at"] and row["created_at"].isoformat()) for row in rows]
+    return zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"), 9)
+
+
+def unpack(data: bytes) -> List[dict]:
+    rows = json.loads(zlib.decompress(data).decode("utf-8"))
+    for row in rows:
+        row["created_at"] = row["created_at"] and datetime.fromisoformat(row["created_at"])
+    return rows
+
+
+def _segment(model, rows: Sequence[dict], **owner):
+    return model(
+        **owner,
+        first_id=rows[0]["id"],
+        last_id=rows[-1]["id"],
+        count=len(rows),
+        first_at=rows[0]["created_at"],
+        last_at=rows[-1]["created_at"],
+        data=_pack(rows),
+    )
+
+
+def cutoff(now: datetime = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(days=current_app.config["ARCHIVE_AFTER_DAYS"])
+
+
+def _claim(model, ids: List[int]) -> bool:
+    """Удаляет строки пачки; False (с откатом), если часть уже удалил параллельный запуск."""
+    result = db.session.execute(delete(model).where(model.id.in_(ids)), execution_options={"synchronize_session": False})
+    if result.rowcount == len(ids):
+        return True
+    db.session.rollback()
+    return False
+
+
+def _archive_chat(chat_id: int, before: datetime) -> int:
+    """Переносит в сегменты начало переписки чата до первого сообщения новее `before`."""
+    size = current_app.config["ARCHIVE_SEGMENT_SIZE"]
+    moved = 0
+    while True:
+        rows = [
+            row._asdict()
+            for row in db.session.execute(
+                select(*MESSAGE_COLUMNS).where(Message.chat_id == chat_id).order_by(Message.id).limit(size)
+            )
+        ]
+        old = []
+        for row in rows:
+            # сообщение без даты считаем старым, иначе префикс на нём бы застрял
+            if row["created_at"] is not None and row["created_at"] >= before:
+                break
+            old.append(row)
+        if not old:
+            return moved
+        # удаление и сегмент — одна транзакция; удаление заодно захватывает пачку
+        if not _claim(Message, [row["id"] for row in old]):
+            return moved
+        db.session.add(_segment(MessageSegment, old, chat_id=chat_id))
+        db.session.commit()
+        moved += len(old)
+        if len(old) < size:
+            return moved
+
+
+def _archive_notifications(user_id: int, before: datetime) -> int:
+    size = current_app.config["ARCHIVE_SEGMENT_SIZE"]
+    moved = 0
+    while True:
+        rows = [
+            row._asdict()
+            for row in db.session.execute(
+                select(*NOTIFICATION_COLUMNS)
+                .where(Notification.user_id == user_id, Notification.is_read.is_(True), Notification.created_at < before)
+                .order_by(Notification.id)
+                .limit(size)
+            )
+        ]
+        if not rows:
+            return moved
+        if not _claim(Notification, [row["id"] for row in rows]):
+            return moved
+        db.session.add(_segment(NotificationSegment, rows, user_id=user_id))
+        db.session.commit()
+        moved += len(rows)
+        if len(rows) < size:
+            return moved
+
+
+def run(now: datetime = None) -> Dict[str, int]:
+    """Архивирует всё, что старше срока; возвращает число перенесённых строк."""
+    before = cutoff(now)
+    counts = {"messages": 0, "notifications": 0}
+    chat_ids = list(db.session.scalars(select(Message.chat_id).where(Message.created_at < before).distinct()))
+    for chat_id in chat_ids:
+        counts["messages"] += _archive_chat(chat_id, before)
+    # непрочитанные остаются на месте: они нужны счётчику в шапке
+    user_ids = list(
+        db.session.scalars(
+            select(Notification.user_id)
+            .where(Notification.is_read.is_(True), Notification.created_at < before, Notification.user_id.is_not(None))
+            .distinct()
+        )
+    )
+    for user_id in user_ids:
+        counts["notifications"] += _archive_notifications(user_id, before)
+    return counts
+
+
+def chat_messages(chat_id: int, limit: int, before: Optional[int] = None) -> Tuple[list, bool]:
+    """Последние `limit` сообщений чата с id меньше `before` — по возрастанию, и есть ли ещё.
+
+    Сначала читается таблица message, недостающее — из сегментов архива,
+    по одному сегменту за запрос.
+    """
+    query = Message.query.filter(Message.chat_id == chat_id)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    items: list = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    bound = items[-1].id if items else before
+    while len(items) <= limit:
+        segment_query = select(MessageSegment).where(MessageSegment.chat_id == chat_id)
+        if bound is not None:
+            segment_query = segment_query.where(MessageSegment.first_id < bound)
+        segment = db.session.scalars(segment_query.order_by(MessageSegment.first_id.desc()).limit(1)).first()
+        if segment is None:
+            break
+        rows = [row for row in unpack(segment.data) if bound is None or row["id"] < bound]
+        items.extend(ArchivedMessage(chat_id=chat_id, **row) for row in reversed(rows))
+        bound = segment.first_id
+    has_more = len(items) > limit
+    return items[:limit][::-1], has_more
+
+
+def message_counts(chat_ids: Sequence[int]) -> Dict[int, int]:
+    """Число сообщений в каждом чате — в горячей таблице и в архиве вместе."""
+    counts = dict.fromkeys(chat_ids, 0)
+    if not counts:
+        return counts
+    hot = select(Message.chat_id, func.count()).where(Message.chat_id.in_(counts)).group_by(Message.chat_id)
+    archived = (
+        select(MessageSegment.chat_id, func.sum(MessageSegment.count))
+        .where(MessageSegment.chat_id.in_(counts))
+        .group_by(MessageSegment.chat_id)
+    )
+    for query in (hot, archived):
+        for chat_id, count in db.session.execute(query):
+            counts[chat_id] += count
+    return counts
+
+
+def message_archive_rows(chat_ids) -> Iterator[List[dict]]:
+    """Архивные сообщения чатов (`chat_ids` — список или подзапрос), по сегменту за раз."""
+    segments = db.session.execute(
+        select(MessageSegment.chat_id, MessageSegment.data)
+        .where(MessageSegment.chat_id.in_(chat_ids))
+        .order_by(MessageSegment.chat_id, MessageSegment.first_id)
+        .execution_options(yield_per=1)
+    )
+    for chat_id, data in segments:
+        yield [dict(row, chat_id=chat_id) for row in unpack(data)]
+
+
+def notification_archive_rows(user_id: int) -> Iterator[List[dict]]:
+    segments = db.session.scalars(
+        select(NotificationSegment.data)
+        .where(NotificationSegment.user_id == user_id)
+        .order_by(NotificationSegment.first_id)
+        .execution_options(yield_per=1)
+    )
+    for data in segments:
+        yield unpack(data)
+
+
+def forget_sender(chat_ids: Iterable[int], sender_id: int) -> int:
+    """Убирает сообщения отправителя из сегментов чатов; возвращает их число.
+
+    Единственное место, где сегмент переписывается: при удалении аккаунта.
+    Опустевшие сегменты удаляются, каждый чат — своя транзакция.
+    """
+    removed = 0
+    for chat_id in chat_ids:
+        # сегменты читаются пачками: в долгой переписке их тысячи
+        segments = MessageSegment.query.filter(MessageSegment.chat_id == chat_id).yield_per(20)
+        for segment in segments:
+            rows = unpack(segment.data)
+            kept = [row for row in rows if row["sender_id"] != sender_id]
+            if len(kept) == len(rows):
+                continue
+            removed += len(rows) - len(kept)
+            if not kept:
+                db.session.delete(segment)
+                continue
+            fresh = _segment(MessageSegment, kept, chat_id=chat_id)
+            for attr in ("first_id", "last_id", "count", "first_at", "last_at", "data"):
+                setattr(segment, attr, getattr(fresh, attr))
+        db.session.commit()
+    return removed
+
+
+def vacuum() -> bool:
+    """Возвращает освободившееся место файлу SQLite; в других СУБД ничего не делает."""
+    if db.engine.dialect.name != "sqlite":
+        return False
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    return True
+
+
+def run_worker(app: Flask, stop: threading.Event = None) -> None:
+    """Цикл архивации раз в ARCHIVE_INTERVAL секунд."""
+    run_periodic(app, run, "ARCHIVE_INTERVAL", "Ошибка при архивации", stop)
+
+
+def start_worker_thread(app: Flask) -> threading.Event:
+    return start_thread(run_worker, app, "archive")
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("archive")
+    def archive_cli():
+        """Архив старых сообщений и уведомлений."""
+
+    @archive_cli.command("run")
+    @click.option("--vacuum", "compact", is_flag=True, help="Затем сжать файл базы SQLite (VACUUM)")
+    def run_command(compact):
+        counts = run()
+        click.echo(", ".join(f"{name}: {value}" for name, value in counts.items()))
+        if compact and vacuum():
+            click.echo("Файл базы сжат")
+
+    add_worker_command(archive_cli, run_worker, "Архивация запущена")
@@ -2,10 +2,10 @@ from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, login_required
 
-from app.extensions import db, mail
+from app import mail_queue
+from app.extensions import db
 from app.forms import RegisterForm, LoginForm
-from app.models import User
-from flask_mail import Message
+from app.models import User, invalidate_user
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -40,18 +40,17 @@ def register():
         )
         user.set_password(form.password.data)
         db.session.add(user)
-        db.session.commit()
 
         token = _get_serializer().dumps(user.email)
         verify_link = url_for("auth.verify_email", token=token, _external=True)
-
-        try:
-            msg = Message("Подтверждение аккаунта", recipients=[user.email])
-            msg.body = f"Перейдите по ссылке, чтобы подтвердить аккаунт: {verify_link}"
-            mail.send(msg)
-            flash("Письмо с подтверждением отправлено на email", "info")
-        except Exception:
-            flash("Не удалось отправить письмо, попробуйте позже или проверьте настройки почты", "warning")
+        # письмо уходит фоновым воркером, регистрация не ждёт SMTP
+        mail_queue.enqueue(
+            "Подтверждение аккаунта",
+            [user.email],
+            f"Перейдите по ссылке, чтобы подтвердить аккаунт: {verify_link}",
+        )
+        db.session.commit()
+        flash("Письмо с подтверждением отправлено на email", "info")
 
         flash("Аккаунт создан! Подтвердите email для полного доступа.", "success")
         return redirect(url_for("auth.login"))
@@ -74,6 +73,7 @@ def verify_email(token: str):
     user = User.query.filter_by(email=email).first_or_404()
     user.is_verified = True
     db.session.commit()
+    invalidate_user(user.id)
     flash("Email успешно подтвержден!", "success")
     return redirect(url_for("main.feed"))
 
@@ -83,7 +83,8 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(phone=form.phone.data.strip()).first()
-        if user and user.check_password(form.password.data):
+        # аккаунт, удаление которого уже запрошено, войти не может
+        if user and user.is_active and user.check_password(form.password.data):
             login_user(user, remember=form.remember.data)
             flash("Добро пожаловать!", "success")
             next_url = request.args.get("next") or url_for("main.feed")
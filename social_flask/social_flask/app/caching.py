@@ -0,0 +1,323 @@
+"""Кэши: in-process LRU с TTL и кэш HTTP-ответов с подключаемым хранилищем."""
+
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from flask import Flask, Response, current_app, request, session
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+try:
+    import redis
+except ImportError:  # redis нужен только для RESPONSE_CACHE_BACKEND = "redis"
+    redis = None
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с TTL.
+
+    Живёт внутри одного процесса: у каждого воркера свой экземпляр,
+    поэтому TTL ограничивает, насколько долго воркер может видеть
+    устаревшие данные после инвалидации в соседнем процессе.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize: int, ttl: float) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._data.clear()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MemoryBackend:
+    """Хранилище в памяти процесса (у каждого воркера своё)."""
+
+    def __init__(self, maxsize: int = 2048) -> None:
+        self._cache = TTLCache(maxsize=maxsize)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._cache.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+
+class FileSystemBackend:
+    """Хранилище в каталоге на диске, общее для воркеров одной машины.
+
+    Старые ключи после инвалидации и смены версии поста больше никто не
+    читает, поэтому истёкшие файлы не дождались бы удаления в `get`.
+    Время изменения файла — момент истечения срока, и раз в
+    `sweep_interval` секунд `set` удаляет файлы, у которых оно в прошлом,
+    не открывая их.
+    """
+
+    # незаконченная запись; брошенная упавшим процессом удаляется через час
+    TMP_PREFIX = ".tmp"
+    TMP_MAX_AGE = 3600
+
+    def __init__(self, directory: str, sweep_interval: float = 60.0) -> None:
+        self.directory = directory
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._sweep_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as fh:
+                expires_at, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        # пишем во временный файл и переименовываем, чтобы читатели не видели половину записи
+        expires_at = time.time() + ttl
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=self.TMP_PREFIX)
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump((expires_at, value), fh)
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, self._path(key))
+        if time.monotonic() >= self._next_sweep:
+            self.sweep()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self) -> int:
+        """Удаляет файлы с истёкшим сроком, возвращает их число."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return 0
+        removed = 0
+        try:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            now = time.time()
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        deadline = entry.stat().st_mtime
+                        if entry.name.startswith(self.TMP_PREFIX):
+                            deadline += self.TMP_MAX_AGE
+                        if deadline < now:
+                            os.remove(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        # файл успел удалить соседний воркер
+                        pass
+        finally:
+            self._sweep_lock.release()
+        return removed
+
+
+class RedisBackend:
+    """Хранилище в Redis-совместимом сервере (Redis, KeyDB, Valkey)."""
+
+    def __init__(self, url: str, prefix: str = "rc:") -> None:
+        if redis is None:
+            raise RuntimeError("Для RESPONSE_CACHE_BACKEND = 'redis' установите пакет redis")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+
+class ResponseCache:
+    """Кэш готовых HTTP-ответов для анонимных посетителей.
+
+    Ключ — эндпоинт, аргументы URL, строка запроса и класс посетителя.
+    Сохраняются только ответы анонимам: у вошедших пользователей в странице
+    есть персональные данные (навигация, счётчик уведомлений, CSRF-токены),
+    им отдаётся свежий ответ, но тоже с ETag и 304.
+
+    Инвалидация — через «поколение» пространства имён: `invalidate("feed")`
+    увеличивает счётчик, и все старые ключи перестают совпадать.
+    """
+
+    def __init__(self) -> None:
+        self.backend = MemoryBackend()
+        self.default_ttl = 30.0
+        self.fragment_ttl = 600.0
+        self.enabled = True
+
+    def init_app(self, app: Flask) -> None:
+        kind = app.config["RESPONSE_CACHE_BACKEND"]
+        if kind == "filesystem":
+            self.backend = FileSystemBackend(
+                app.config["RESPONSE_CACHE_DIR"], app.config["RESPONSE_CACHE_SWEEP_INTERVAL"]
+            )
+        elif kind == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_REDIS_URL"])
+        else:
+            self.backend = MemoryBackend()
+        self.default_ttl = app.config["RESPONSE_CACHE_TTL"]
+        self.fragment_ttl = app.config["FRAGMENT_CACHE_TTL"]
+        self.enabled = kind != "null"
+
+    def _generation(self, namespace: str) -> bytes:
+        return self.backend.get(f"gen:{namespace}") or b"0"
+
+    def invalidate(self, namespace: str) -> None:
+        if not self.enabled:
+            return
+        # ttl поколения заведомо больше ttl любых ответов
+        self.backend.set(f"gen:{namespace}", str(time.time_ns()).encode(), self.default_ttl * 100)
+
+    def _key(self, namespaces: tuple) -> str:
+        generations = ",".join(self._generation(ns).decode() for ns in namespaces)
+        args = sorted((request.view_args or {}).items())
+        return f"resp:{request.endpoint}:{args}:{request.query_string.decode()}:anon:{generations}"
+
+    def cached(self, *namespaces: str, ttl: Optional[float] = None, namespace_arg: Optional[str] = None):
+        """Декоратор вьюхи. `namespace_arg` добавляет к пространствам имён
+        значение аргумента URL (например, "profile:<user_id>")."""
+
+        def decorator(view: Callable) -> Callable:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                spaces = namespaces
+                if namespace_arg is not None:
+                    spaces = spaces + (f"{namespaces[0]}:{kwargs[namespace_arg]}",)
+                cacheable = (
+                    self.enabled
+                    and request.method == "GET"
+                    and not current_user.is_authenticated
+                    and not session.get("_flashes")
+                )
+                if not cacheable:
+                    return _conditional(current_app.make_response(view(*args, **kwargs)), public=False)
+
+                key = self._key(spaces)
+                stored = self.backend.get(key)
+                if stored is not None:
+                    body, mimetype = pickle.loads(stored)
+                    response = Response(body, mimetype=mimetype)
+                    response.headers["X-Cache"] = "HIT"
+                    return _conditional(response, public=True, ttl=ttl or self.default_ttl)
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.backend.set(key, pickle.dumps((response.get_data(), response.mimetype)), ttl or self.default_ttl)
+                    response.headers["X-Cache"] = "MISS"
+                return _conditional(response, public=True, ttl=ttl or self.default_ttl)
+
+            return wrapper
+
+        return decorator
+
+    def fragment(self, key_parts: list, render: Callable[[], str], ttl: Optional[float] = None) -> str:
+        """Кусок HTML из кэша или результат `render()`, сохранённый под ключом."""
+        if not self.enabled:
+            return render()
+        key = "frag:" + ":".join(str(part) for part in key_parts)
+        stored = self.backend.get(key)
+        if stored is not None:
+            return stored.decode("utf-8")
+        html = render()
+        self.backend.set(key, str(html).encode("utf-8"), ttl or self.fragment_ttl)
+        return html
+
+
+class FragmentCacheExtension(Extension):
+    """Тег `{% cache "имя", часть_ключа, ... %}...{% endcache %}` для шаблонов.
+
+    Ключ должен включать всё, от чего зависит содержимое блока (например,
+    id и версию поста), — явной инвалидации у фрагментов нет.
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_cached", [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts: list, caller: Callable[[], str]) -> Markup:
+        from .extensions import response_cache
+
+        return Markup(response_cache.fragment(key_parts, caller))
+
+
+def _conditional(response: Response, public: bool, ttl: float = 0) -> Response:
+    """ETag по телу ответа и 304 при совпадении If-None-Match."""
+    if response.status_code != 200 or response.direct_passthrough:
+        return response
+    # один URL отдаёт разное анонимам и вошедшим пользователям
+    response.vary.add("Cookie")
+    if public:
+        response.cache_control.public = True
+        response.cache_control.max_age = int(ttl)
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
@@ -0,0 +1,105 @@
+"""Загрузка комментариев: превью для страницы ленты и постраничная подгрузка.
+
+Превью — последние несколько комментариев к каждому посту страницы одним
+запросом с оконной функцией ROW_NUMBER() OVER (PARTITION BY post_id), так
+что размер страницы не зависит от популярности постов. Остальное
+подгружается через JSON-эндпоинт main.post_comments с курсором
+(created_at, id) по индексу ix_comment_post_id_created_at.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import joinedload
+
+from .extensions import db
+from .models import Comment
+
+Preview = Tuple[List[Comment], bool]
+
+
+def latest_comments(post_ids: List[int], per_post: int) -> Dict[int, Preview]:
+    """{post_id: (последние комментарии верхнего уровня по возрастанию времени, есть ли ещё)}."""
+    result: Dict[int, Preview] = {pid: ([], False) for pid in post_ids}
+    if not post_ids:
+        return result
+    rank = (
+        func.row_number()
+        .over(partition_by=Comment.post_id, order_by=(Comment.created_at.desc(), Comment.id.desc()))
+        .label("rank")
+    )
+    ranked = (
+        select(Comment.id, rank)
+        .where(Comment.post_id.in_(post_ids), Comment.parent_id.is_(None))
+        .subquery()
+    )
+    # берём на один больше, чтобы знать, показывать ли «ещё комментарии»
+    rows = (
+        Comment.query.join(ranked, ranked.c.id == Comment.id)
+        .filter(ranked.c.rank <= per_post + 1)
+        .options(joinedload(Comment.author))
+        .order_by(Comment.post_id, Comment.created_at, Comment.id)
+        .all()
+    )
+    grouped = defaultdict(list)
+    for item in rows:
+        grouped[item.post_id].append(item)
+    for pid, items in grouped.items():
+        has_more = len(items) > per_post
+        result[pid] = (items[-per_post:] if has_more else items, has_more)
+    return result
+
+
+def encode_cursor(comment: Comment) -> str:
+    return f"{comment.created_at.isoformat()}_{comment.id}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        stamp, comment_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(stamp), int(comment_id)
+    except ValueError:
+        return None
+
+
+def comments_page(
+    post_id: int, limit: int, before: Optional[Tuple[datetime, int]] = None, parent_id: Optional[int] = None
+) -> Tuple[List[Comment], Optional[str]]:
+    """Страница комментариев старше курсора (или ответов на `parent_id`), по убыванию времени."""
+    query = Comment.query.filter(Comment.post_id == post_id, Comment.parent_id == parent_id).options(
+        joinedload(Comment.author)
+    )
+    if before is not None:
+        created_at, comment_id = before
+        query = query.filter(
+            or_(
+                Comment.created_at < created_at,
+                and_(Comment.created_at == created_at, Comment.id < comment_id),
+            )
+        )
+    items = query.order_by(Comment.created_at.desc(), Comment.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+
+def serialize(comment: Comment) -> dict:
+    return {
+        "id": comment.id,
+        "parent_id": comment.parent_id,
+        "author": comment.author.name,
+        "time": comment.created_at.strftime("%H:%M"),
+        "body": comment.body,
+    }
+
+
+def reply_counts(comment_ids: List[int]) -> Dict[int, int]:
+    if not comment_ids:
+        return {}
+    rows = (
+        db.session.query(Comment.parent_id, func.count(Comment.id))
+        .filter(Comment.parent_id.in_(comment_ids))
+        .group_by(Comment.parent_id)
+    )
+    return dict(rows.all())
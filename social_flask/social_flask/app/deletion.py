@@ -0,0 +1,323 @@
+"""Удаление аккаунта со всеми данными пачками.
+
+Каскады ORM (`cascade="all, delete"`) загружают в сессию каждый
+комментарий и лайк поста, а одна транзакция на весь аккаунт держит
+блокировку записи в SQLite минутами. Здесь каждая таблица чистится
+DELETE ... WHERE id IN (...) пачками по DELETE_BATCH_SIZE строк, и каждая
+пачка — своя короткая транзакция, между которыми успевают пройти
+обычные запросы. Счётчики и версии затронутых чужих постов
+пересчитываются тем же UPDATE в той же транзакции, а загруженные
+файлы удаляются, когда на них больше никто не ссылается. Вместе с пачкой
+постов уменьшаются счётчики постов у их хэштегов (TrendingTag) и
+удаляются уведомления, ссылающиеся на эти посты.
+
+Запуск: `flask account delete <id>` или задача "delete_account" в очереди
+app/jobs.py, которую ставит форма удаления на странице профиля.
+"""
+
+import os
+from typing import Callable, Iterable, List, Optional
+
+import click
+from flask import Flask, current_app
+from sqlalchemy import delete, func, select, tuple_, update
+
+from . import archive, jobs
+from .exports import UPLOADS_PREFIX, upload_name
+from .extensions import db, response_cache
+from .models import (
+    Chat,
+    ChatMembership,
+    Comment,
+    Group,
+    GroupMember,
+    GroupPost,
+    Job,
+    Like,
+    Message,
+    MessageSegment,
+    Notification,
+    NotificationSegment,
+    Post,
+    PostTag,
+    Repost,
+    TrendingPost,
+    TrendingSeen,
+    TrendingTag,
+    User,
+    followers,
+    friendship,
+    invalidate_user,
+)
+
+Report = Callable[..., None]
+
+
+class AccountDeletion(jobs.Progress):
+    """Одно удаление аккаунта: счётчики прогресса и общие шаги.
+
+    Хуки внутри транзакции пачки учитывают строки через `count`, а отчёт
+    (`add`) уходит только после коммита пачки.
+    """
+
+    def __init__(self, user_id: int, report: Optional[Report] = None) -> None:
+        super().__init__(report)
+        self.user_id = user_id
+        self.batch_size = current_app.config["DELETE_BATCH_SIZE"]
+
+    def delete_rows(self, step: str, model, criteria, columns=(), before=None, after=None) -> None:
+        """Удаляет строки `model` под условием пачками; каждая пачка — отдельная транзакция.
+
+        `before(rows)` и `after(rows)` выполняются в той же транзакции до и после DELETE,
+        в rows — id и дополнительные `columns` удаляемых строк.
+        """
+        while True:
+            rows = db.session.execute(
+                select(model.id, *columns).where(criteria).order_by(model.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                return
+            if before is not None:
+                before(rows)
+            ids = [row.id for row in rows]
+            db.session.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            if after is not None:
+                after(rows)
+            db.session.commit()
+            self.add(step, len(rows))
+            if "media_url" in rows[0]._fields:
+                self.remove_orphan_uploads(row.media_url for row in rows)
+            if len(rows) < self.batch_size:
+                return
+
+    def delete_links(self, step: str, table, left, right, criteria) -> None:
+        """То же для таблиц связей без id: пачка выбирается по составному ключу."""
+        while True:
+            rows = db.session.execute(select(left, right).where(criteria).limit(self.batch_size)).all()
+            if not rows:
+                return
+            db.session.execute(delete(table).where(tuple_(left, right).in_([tuple(row) for row in rows])))
+            db.session.commit()
+            self.add(step, len(rows))
+            if len(rows) < self.batch_size:
+                return
+
+    def remove_orphan_uploads(self, urls: Iterable[Optional[str]]) -> None:
+        """Удаляет файлы из static/uploads, на которые больше не ссылается ни одна строка."""
+        names = {name for name in map(upload_name, urls) if name}
+        if not names:
+            return
+        candidates = [UPLOADS_PREFIX + name for name in names]
+        used = set()
+        for column in (Post.media_url, Message.media_url, GroupPost.media_url, User.avatar_url):
+            used.update(db.session.scalars(select(column).where(column.in_(candidates))))
+        upload_dir = os.path.join(current_app.static_folder, "uploads")
+        removed = 0
+        for url in candidates:
+            if url in used:
+                continue
+            try:
+                os.remove(os.path.join(upload_dir, upload_name(url)))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            self.add("uploads", removed)
+
+
+def _detach_replies(rows) -> None:
+    # ответы других людей остаются, но становятся комментариями верхнего уровня
+    ids = [row.id for row in rows]
+    Comment.query.filter(Comment.parent_id.in_(ids)).update({Comment.parent_id: None}, synchronize_session=False)
+
+
+def _recount(counter, link_post_column):
+    """after-хук: пересчитывает счётчик у постов из удалённой пачки и сбрасывает их кэш."""
+
+    def after(rows) -> None:
+        post_ids = sorted({row.post_id for row in rows})
+        count = select(func.count()).where(link_post_column == Post.id).scalar_subquery()
+        db.session.execute(
+            update(Post)
+            .where(Post.id.in_(post_ids))
+            .values({counter: count, Post.version: Post.version + 1})
+            .execution_options(synchronize_session=False)
+        )
+
+    return after
+
+
+def _untag(post_ids: List[int]) -> None:
+    """Уменьшает TrendingTag.posts на число удаляемых постов с тегом; теги без постов удаляются.
+
+    Рейтинг тега — сумма весов в логарифмической шкале, и вклад отдельного
+    поста из неё не вычесть; он затухнет сам, а тег без единого поста из
+    «Популярного» уходит сразу.
+    """
+    removed = db.session.execute(
+        select(PostTag.tag, func.count()).where(PostTag.post_id.in_(post_ids)).group_by(PostTag.tag)
+    ).all()
+    for tag, posts in removed:
+        db.session.execute(
+            update(TrendingTag)
+            .where(TrendingTag.tag == tag)
+            .values(posts=TrendingTag.posts - posts)
+            .execution_options(synchronize_session=False)
+        )
+    if removed:
+        db.session.execute(
+            delete(TrendingTag)
+            .where(TrendingTag.tag.in_([tag for tag, _posts in removed]), TrendingTag.posts <= 0)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _post_children(run: AccountDeletion):
+    """before-хук для пачки постов: лайки, репосты, комментарии, рейтинг и уведомления этих постов.
+
+    Удаляются в той же транзакции, что и посты: строка, добавленная к посту
+    между пачками, не останется сиротой (внешние ключи в SQLite не проверяются).
+    """
+
+    def before(rows) -> None:
+        ids = [row.id for row in rows]
+        _untag(ids)
+        for step, model, column in (
+            ("post_likes", Like, Like.post_id),
+            ("post_reposts", Repost, Repost.original_post_id),
+            ("post_comments", Comment, Comment.post_id),
+            ("trending_posts", TrendingPost, TrendingPost.post_id),
+            ("post_tags", PostTag, PostTag.post_id),
+            # уведомления о лайках, репостах и комментариях хранят id поста в payload
+            ("post_notifications", Notification, Notification.payload["post_id"].as_integer()),
+        ):
+            deleted = db.session.execute(
+                delete(model).where(column.in_(ids)).execution_options(synchronize_session=False)
+            ).rowcount
+            run.count(step, deleted)
+
+    return before
+
+
+def _bump_posts(rows) -> None:
+    Post.bump_version(Post.id.in_({row.post_id for row in rows}))
+
+
+def _remove_exports(rows) -> None:
+    export_dir = current_app.config["EXPORT_DIR"]
+    for row in rows:
+        if row.result:
+            try:
+                os.remove(os.path.join(export_dir, row.result))
+            except FileNotFoundError:
+                pass
+
+
+def delete_user(user_id: int, report: Optional[Report] = None, keep_job_id: Optional[int] = None) -> dict:
+    """Удаляет пользователя и всё, что ему принадлежит; возвращает число строк по шагам."""
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise LookupError(f"пользователь {user_id} не найден")
+    avatar_url = user.avatar_url
+    run = AccountDeletion(user_id, report)
+    # посты пользователя вместе с чужими лайками, репостами и комментариями к ним
+    run.delete_rows("posts", Post, Post.user_id == user_id, columns=(Post.media_url,), before=_post_children(run))
+
+    # следы пользователя под чужими постами; учтённые лайки популярного — компактная таблица, один DELETE
+    db.session.execute(delete(TrendingSeen).where(TrendingSeen.user_id == user_id))
+    db.session.commit()
+    run.delete_rows(
+        "likes", Like, Like.user_id == user_id, columns=(Like.post_id,), after=_recount(Post.likes_count, Like.post_id)
+    )
+    run.delete_rows(
+        "reposts",
+        Repost,
+        Repost.user_id == user_id,
+        columns=(Repost.original_post_id.label("post_id"),),
+        after=_recount(Post.reposts_count, Repost.original_post_id),
+    )
+    run.delete_rows(
+        "comments",
+        Comment,
+        Comment.user_id == user_id,
+        columns=(Comment.post_id,),
+        before=_detach_replies,
+        after=_bump_posts,
+    )
+
+    # переписка: свои сообщения (и в архиве), участие в чатах; опустевшие чаты удаляются целиком
+    chat_ids: List[int] = list(
+        db.session.scalars(select(ChatMembership.chat_id).where(ChatMembership.user_id == user_id).distinct())
+    )
+    run.delete_rows("messages", Message, Message.sender_id == user_id, columns=(Message.media_url,))
+    run.add("archived_messages", archive.forget_sender(chat_ids, user_id))
+    run.delete_rows("chat_memberships", ChatMembership, ChatMembership.user_id == user_id)
+    Chat.query.filter(Chat.owner_id == user_id).update({Chat.owner_id: None}, synchronize_session=False)
+    db.session.commit()
+    for start in range(0, len(chat_ids), run.batch_size):
+        batch = chat_ids[start : start + run.batch_size]
+        empty = select(Chat.id).where(
+            Chat.id.in_(batch), ~select(ChatMembership.id).where(ChatMembership.chat_id == Chat.id).exists()
+        )
+        empty_ids = list(db.session.scalars(empty))
+        if empty_ids:
+            run.delete_rows("messages", Message, Message.chat_id.in_(empty_ids), columns=(Message.media_url,))
+            run.delete_rows("message_segments", MessageSegment, MessageSegment.chat_id.in_(empty_ids))
+            run.delete_rows("chats", Chat, Chat.id.in_(empty_ids))
+
+    # группы: собственные удаляются со всеми записями и участниками
+    owned_groups = select(Group.id).where(Group.owner_id == user_id)
+    run.delete_rows("group_posts", GroupPost, GroupPost.group_id.in_(owned_groups), columns=(GroupPost.media_url,))
+    run.delete_rows("group_members", GroupMember, GroupMember.group_id.in_(owned_groups))
+    run.delete_rows("groups", Group, Group.owner_id == user_id)
+    run.delete_rows("group_posts", GroupPost, GroupPost.author_id == user_id, columns=(GroupPost.media_url,))
+    run.delete_rows("group_members", GroupMember, GroupMember.user_id == user_id)
+
+    run.delete_rows("notifications", Notification, Notification.user_id == user_id)
+    run.delete_rows("notification_segments", NotificationSegment, NotificationSegment.user_id == user_id)
+    run.delete_links(
+        "friendship",
+        friendship,
+        friendship.c.user_id,
+        friendship.c.friend_id,
+        (friendship.c.user_id == user_id) | (friendship.c.friend_id == user_id),
+    )
+    run.delete_links(
+        "followers",
+        followers,
+        followers.c.follower_id,
+        followers.c.followed_id,
+        (followers.c.follower_id == user_id) | (followers.c.followed_id == user_id),
+    )
+    run.delete_rows(
+        "jobs", Job, (Job.user_id == user_id) & (Job.id != keep_job_id), columns=(Job.result,), before=_remove_exports
+    )
+    Job.query.filter(Job.user_id == user_id).update({Job.user_id: None}, synchronize_session=False)
+
+    db.session.execute(delete(User).where(User.id == user_id))
+    db.session.commit()
+    run.add("users", 1)
+    run.remove_orphan_uploads([avatar_url])
+
+    invalidate_user(user_id)
+    response_cache.invalidate(f"profile:{user_id}")
+    response_cache.invalidate("feed")
+    return run.counts
+
+
+@jobs.handler("delete_account")
+def _delete_account_job(job: Job, report: Report) -> None:
+    delete_user(job.user_id, report, keep_job_id=job.id)
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("account")
+    def account_cli():
+        """Управление аккаунтами пользователей."""
+
+    @account_cli.command("delete")
+    @click.argument("user_id", type=int)
+    @click.confirmation_option(prompt="Удалить пользователя и все его данные без возможности восстановления?")
+    def delete_command(user_id):
+        counts = delete_user(user_id, lambda **c: click.echo(", ".join(f"{k}: {v}" for k, v in c.items())))
+        click.echo(f"Пользователь {user_id} удалён ({sum(counts.values())} строк и файлов)")
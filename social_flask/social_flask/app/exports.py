@@ -0,0 +1,211 @@
+"""Выгрузка данных пользователя в zip-архив.
+
+Каждая таблица пишется в свой файл JSON Lines внутри архива: строки
+читаются курсором пачками по EXPORT_CHUNK_SIZE (yield_per — серверный
+курсор в PostgreSQL) и сразу сжимаются в открытый на запись элемент
+архива, так что память не зависит от объёма данных пользователя.
+Загруженные пользователем файлы кладутся в `media/`. Перенесённые в
+архив (app/archive.py) сообщения и уведомления читаются по сегменту за
+раз и пишутся в `messages_archive.jsonl` и `notifications_archive.jsonl`.
+
+Запуск: `flask export user <id>` или задача "export" в очереди app/jobs.py,
+которую ставит кнопка на странице редактирования профиля.
+"""
+
+import json
+import os
+import uuid
+import zipfile
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import click
+from flask import Flask, current_app
+from sqlalchemy import select
+
+from . import jobs
+from .archive import message_archive_rows, notification_archive_rows
+from .extensions import db
+from .models import ChatMembership, Comment, GroupPost, Job, Message, Notification, Post, User
+
+UPLOADS_PREFIX = "/static/uploads/"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def upload_name(url: Optional[str]) -> Optional[str]:
+    """Имя файла в static/uploads для ссылки на загрузку (стикеры и заглушки не считаются)."""
+    if not url or not url.startswith(UPLOADS_PREFIX):
+        return None
+    name = os.path.basename(url)
+    return name or None
+
+
+def _user_chats(user_id: int):
+    return select(ChatMembership.chat_id).where(ChatMembership.user_id == user_id)
+
+
+def _sections(user_id: int):
+    """(имя файла в архиве, запрос) — запросы по индексам на колонку автора."""
+    user_chats = _user_chats(user_id)
+    return [
+        (
+            "posts",
+            select(
+                Post.id, Post.body, Post.media_url, Post.media_type, Post.visibility,
+                Post.likes_count, Post.reposts_count, Post.created_at,
+            )
+            .where(Post.user_id == user_id)
+            .order_by(Post.id),
+        ),
+        (
+            "comments",
+            select(Comment.id, Comment.post_id, Comment.parent_id, Comment.body, Comment.created_at)
+            .where(Comment.user_id == user_id)
+            .order_by(Comment.id),
+        ),
+        (
+            # переписка целиком: сообщения всех чатов, где состоит пользователь
+            "messages",
+            select(
+                Message.id, Message.chat_id, Message.sender_id, Message.body,
+                Message.media_url, Message.media_type, Message.created_at,
+            )
+            .where(Message.chat_id.in_(user_chats))
+            .order_by(Message.chat_id, Message.id),
+        ),
+        (
+            "group_posts",
+            select(
+                GroupPost.id, GroupPost.group_id, GroupPost.body, GroupPost.media_url,
+                GroupPost.media_type, GroupPost.created_at,
+            )
+            .where(GroupPost.author_id == user_id)
+            .order_by(GroupPost.id),
+        ),
+        (
+            "notifications",
+            select(Notification.id, Notification.kind, Notification.payload, Notification.is_read, Notification.created_at)
+            .where(Notification.user_id == user_id)
+            .order_by(Notification.id),
+        ),
+    ]
+
+
+def _query_chunks(stmt) -> Iterable[List[dict]]:
+    result = db.session.execute(stmt.execution_options(yield_per=current_app.config["EXPORT_CHUNK_SIZE"]))
+    for rows in result.partitions():
+        yield [row._asdict() for row in rows]
+
+
+def _write_section(
+    archive: zipfile.ZipFile, name: str, chunks: Iterable[List[dict]], user_id: int, media: Set[str]
+) -> int:
+    count = 0
+    with archive.open(f"{name}.jsonl", "w", force_zip64=True) as entry:
+        for rows in chunks:
+            lines = []
+            for data in rows:
+                # в архив попадают только свои файлы, а не вложения собеседников
+                if data.get("sender_id", user_id) == user_id:
+                    upload = upload_name(data.get("media_url"))
+                    if upload:
+                        media.add(upload)
+                lines.append(json.dumps(data, ensure_ascii=False, default=_json_default))
+            entry.write(("\n".join(lines) + "\n").encode("utf-8"))
+            count += len(rows)
+    return count
+
+
+def export_user(user_id: int, path: str, report: Callable[..., None] = None) -> Dict[str, int]:
+    """Пишет архив данных пользователя в `path`; возвращает число записей по разделам."""
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise LookupError(f"пользователь {user_id} не найден")
+    profile = {
+        column: getattr(user, column)
+        for column in (
+            "id", "email", "phone", "name", "bio", "avatar_url", "date_of_birth", "city",
+            "occupation", "interests", "privacy_level", "created_at",
+        )
+    }
+    media: Set[str] = set()
+    avatar = upload_name(user.avatar_url)
+    if avatar:
+        media.add(avatar)
+
+    counts: Dict[str, int] = {}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.part"
+    with zipfile.ZipFile(partial, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("profile.json", json.dumps(profile, ensure_ascii=False, default=_json_default, indent=2))
+        sections = [(name, _query_chunks(stmt)) for name, stmt in _sections(user_id)]
+        sections += [
+            ("messages_archive", message_archive_rows(_user_chats(user_id))),
+            ("notifications_archive", notification_archive_rows(user_id)),
+        ]
+        for name, chunks in sections:
+            counts[name] = _write_section(archive, name, chunks, user_id, media)
+            if report is not None:
+                report(**{name: counts[name]})
+        upload_dir = os.path.join(current_app.static_folder, "uploads")
+        copied = 0
+        for name in sorted(media):
+            file_path = os.path.join(upload_dir, name)
+            if os.path.isfile(file_path):
+                # ZipFile.write копирует файл кусками, целиком в память он не читается
+                archive.write(file_path, f"media/{name}")
+                copied += 1
+        counts["media"] = copied
+        if report is not None:
+            report(media=copied)
+    # готовый архив появляется атомарно: недописанный файл никогда не отдаётся
+    os.replace(partial, path)
+    return counts
+
+
+def remove_previous_exports(user_id: int, keep_job_id: int) -> None:
+    """Удаляет файлы прежних архивов пользователя: скачать можно только последний."""
+    export_dir = current_app.config["EXPORT_DIR"]
+    previous = Job.query.filter(
+        Job.user_id == user_id, Job.kind == "export", Job.id != keep_job_id, Job.result.is_not(None)
+    )
+    for old in previous:
+        try:
+            os.remove(os.path.join(export_dir, old.result))
+        except FileNotFoundError:
+            pass
+        old.result = None
+
+
+@jobs.handler("export")
+def _export_job(job: Job, report: Callable[..., None]) -> None:
+    file_name = f"export_{job.user_id}_{job.id}_{uuid.uuid4().hex[:8]}.zip"
+    export_user(job.user_id, os.path.join(current_app.config["EXPORT_DIR"], file_name), report)
+    job.result = file_name
+    remove_previous_exports(job.user_id, job.id)
+    db.session.add(
+        Notification(
+            user_id=job.user_id,
+            kind="export",
+            payload={"job_id": job.id, "text": "Архив с вашими данными готов"},
+        )
+    )
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("export")
+    def export_cli():
+        """Выгрузка данных пользователей."""
+
+    @export_cli.command("user")
+    @click.argument("user_id", type=int)
+    @click.option("--output", default=None, help="Путь к архиву (по умолчанию — в EXPORT_DIR)")
+    def user_command(user_id, output):
+        path = output or os.path.join(current_app.config["EXPORT_DIR"], f"export_{user_id}.zip")
+        counts = export_user(user_id, path, lambda **c: click.echo(", ".join(f"{k}: {v}" for k, v in c.items())))
+        click.echo(f"Архив: {path} ({sum(counts.values())} записей)")
@@ -2,7 +2,16 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_mail import Mail
 
+from .caching import ResponseCache, TTLCache
+from .instrumentation import Instrumentation
+from .ratelimit import RateLimiter
+
 db = SQLAlchemy()
 login_manager = LoginManager()
 mail = Mail()
+# снимки колонок пользователя для load_user, см. models.load_user
+user_cache = TTLCache()
+response_cache = ResponseCache()
+instrumentation = Instrumentation()
+limiter = RateLimiter()
 
@@ -8,6 +8,7 @@ from wtforms import (
     DateField,
     SelectField,
     BooleanField,
+    HiddenField,
 )
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 from flask_wtf.file import FileField, FileAllowed
@@ -84,8 +85,19 @@ class PostForm(FlaskForm):
     submit = SubmitField("Опубликовать")
 
 
+class ExportForm(FlaskForm):
+    submit = SubmitField("Запросить архив")
+
+
+class DeleteAccountForm(FlaskForm):
+    password = PasswordField("Пароль для подтверждения", validators=[DataRequired()])
+    submit = SubmitField("Удалить аккаунт")
+
+
 class CommentForm(FlaskForm):
     body = StringField("Комментарий", validators=[DataRequired(), Length(max=280)])
+    # id комментария, на который отвечают (пусто — комментарий к посту)
+    parent_id = HiddenField()
     submit = SubmitField("Отправить")
 
 
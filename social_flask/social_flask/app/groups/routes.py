@@ -1,10 +1,12 @@
 import os
 import uuid
 
-from flask import Blueprint, render_template, redirect, url_for, flash, current_app, request
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app, request, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 
-from app.extensions import db
+from app.access import can_view_group, is_group_member, visible_groups
+from app.extensions import db, limiter
 from app.forms import GroupForm, PostForm
 from app.models import Group, GroupMember, GroupPost, Visibility
 
@@ -43,16 +45,21 @@ def list_groups():
         db.session.commit()
         flash("Группа создана", "success")
         return redirect(url_for("groups.detail", group_id=group.id))
-    groups = Group.query.order_by(Group.created_at.desc()).limit(50).all()
+    groups = Group.query.filter(visible_groups(current_user.id)).order_by(Group.created_at.desc()).limit(50).all()
     return render_template("groups/list.html", form=form, groups=groups)
 
 
 @groups_bp.route("/<int:group_id>", methods=["GET", "POST"])
 @login_required
+@limiter.limit("group_post")
 def detail(group_id: int):
     group = Group.query.get_or_404(group_id)
-    members = GroupMember.query.filter_by(group_id=group.id).all()
-    is_member = any(m.user_id == current_user.id for m in members)
+    # закрытые группы для посторонних не существуют
+    if not can_view_group(group):
+        abort(404)
+    # автор записи и участник выводятся с именем и аватаркой — грузим их тем же запросом
+    members = GroupMember.query.filter_by(group_id=group.id).options(joinedload(GroupMember.user)).all()
+    is_member = is_group_member(group)
     post_form = PostForm()
     if is_member and post_form.validate_on_submit():
         image_url = None
@@ -72,7 +79,12 @@ def detail(group_id: int):
         db.session.commit()
         flash("Пост опубликован в группе", "success")
         return redirect(url_for("groups.detail", group_id=group.id))
-    posts = GroupPost.query.filter_by(group_id=group.id).order_by(GroupPost.created_at.desc()).all()
+    posts = (
+        GroupPost.query.filter_by(group_id=group.id)
+        .options(joinedload(GroupPost.author))
+        .order_by(GroupPost.created_at.desc())
+        .all()
+    )
     return render_template("groups/detail.html", group=group, posts=posts, post_form=post_form, members=members, is_member=is_member)
 
 
@@ -80,6 +92,8 @@ def detail(group_id: int):
 @login_required
 def join(group_id: int):
     group = Group.query.get_or_404(group_id)
+    if not can_view_group(group):
+        abort(404)
     already = GroupMember.query.filter_by(group_id=group.id, user_id=current_user.id).first()
     if not already:
         db.session.add(GroupMember(group_id=group.id, user_id=current_user.id))
@@ -0,0 +1,282 @@
+"""Замеры по запросам: число SQL-запросов, время SQL, рендера шаблонов и ответа.
+
+Счётчики копятся по эндпоинтам в памяти процесса и отдаются в формате
+Prometheus на `/metrics`. Под gunicorn у каждого воркера свои счётчики,
+поэтому при заданном METRICS_DIR каждый процесс раз в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл, а `/metrics`
+складывает файлы всех воркеров. Без METRICS_DIR числа относятся к
+одному процессу. Медленные SQL-запросы пишутся в лог `app.slow_queries`.
+Для тестов есть бюджет запросов: `QUERY_BUDGETS` в конфиге или
+контекстный менеджер `query_budget`.
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from flask import Flask, Response, abort, current_app, g, has_request_context, request, template_rendered
+from flask.signals import before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Эндпоинт выполнил больше SQL-запросов, чем разрешено бюджетом."""
+
+
+class RequestStats:
+    """Счётчики одного запроса (живут в flask.g)."""
+
+    __slots__ = ("started", "queries", "sql_time", "render_time", "_render_started")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self._render_started = []
+
+
+class EndpointStats:
+    __slots__ = ("requests", "queries", "sql_time", "render_time", "latency", "buckets", "max_queries")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.latency = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.max_queries = 0
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, EndpointStats] = {}
+        self._engine_hooked = False
+        self._directory = ""
+        self._flush_interval = 1.0
+        self._flushed_at = 0.0
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config["INSTRUMENTATION_ENABLED"]:
+            return
+        if not self._engine_hooked:
+            # слушаем класс Engine: так ловятся все движки, созданные Flask-SQLAlchemy
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            self._engine_hooked = True
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        app.before_request(_start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule("/metrics", "metrics", self._metrics_view)
+        self._directory = app.config["METRICS_DIR"]
+        self._flush_interval = app.config["METRICS_FLUSH_INTERVAL"]
+        if self._directory:
+            os.makedirs(self._directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def _finish_request(self, response: Response) -> Response:
+        stats: Optional[RequestStats] = g.pop("request_stats", None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or "unknown"
+        latency = time.perf_counter() - stats.started
+        self.record(endpoint, stats, latency)
+        if self._directory and time.monotonic() - self._flushed_at >= self._flush_interval:
+            self.flush()
+
+        config = current_app.config
+        if config["DEBUG"]:
+            response.headers["X-Query-Count"] = str(stats.queries)
+            response.headers["X-SQL-Time"] = f"{stats.sql_time * 1000:.1f}ms"
+        budget = config["QUERY_BUDGETS"].get(endpoint)
+        if budget is not None and stats.queries > budget and config["QUERY_BUDGET_STRICT"]:
+            raise QueryBudgetExceeded(f"{endpoint}: {stats.queries} SQL-запросов при бюджете {budget}")
+        return response
+
+    def record(self, endpoint: str, stats: RequestStats, latency: float) -> None:
+        with self._lock:
+            item = self._endpoints.setdefault(endpoint, EndpointStats())
+            item.requests += 1
+            item.queries += stats.queries
+            item.sql_time += stats.sql_time
+            item.render_time += stats.render_time
+            item.latency += latency
+            item.max_queries = max(item.max_queries, stats.queries)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    item.buckets[i] += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "requests": s.requests,
+                    "queries": s.queries,
+                    "max_queries": s.max_queries,
+                    "sql_time": s.sql_time,
+                    "render_time": s.render_time,
+                    "latency": s.latency,
+                    "buckets": list(s.buckets),
+                }
+                for name, s in self._endpoints.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self._directory, f"{pid}.json")
+
+    def flush(self) -> None:
+        """Пишет счётчики процесса в METRICS_DIR/<pid>.json (атомарно, через переименование)."""
+        if not self._directory:
+            return
+        self._flushed_at = time.monotonic()
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp_path, self._path(os.getpid()))
+
+    def collect(self) -> Dict[str, dict]:
+        """Счётчики всех воркеров: свои из памяти плюс файлы остальных процессов.
+
+        Файлы завершившихся воркеров тоже учитываются — иначе счётчики
+        уменьшались бы при каждом перезапуске воркера (max_requests).
+        Каталог очищается при старте мастера gunicorn (gunicorn.conf.py).
+        """
+        merged = self.snapshot()
+        if not self._directory:
+            return merged
+        own = os.path.basename(self._path(os.getpid()))
+        for name in os.listdir(self._directory):
+            if not name.endswith(".json") or name == own:
+                continue
+            try:
+                with open(os.path.join(self._directory, name)) as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            for endpoint, stats in data.items():
+                item = merged.get(endpoint)
+                if item is None:
+                    merged[endpoint] = stats
+                    continue
+                for key in ("requests", "queries", "sql_time", "render_time", "latency"):
+                    item[key] += stats[key]
+                item["max_queries"] = max(item["max_queries"], stats["max_queries"])
+                item["buckets"] = [a + b for a, b in zip(item["buckets"], stats["buckets"])]
+        return merged
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        data = sorted(self.collect().items())
+        family("app_requests_total", "counter", "Число обработанных запросов")
+        lines += [f'app_requests_total{{endpoint="{ep}"}} {s["requests"]}' for ep, s in data]
+        family("app_sql_queries_total", "counter", "Число SQL-запросов")
+        lines += [f'app_sql_queries_total{{endpoint="{ep}"}} {s["queries"]}' for ep, s in data]
+        family("app_sql_queries_max", "gauge", "Максимум SQL-запросов в одном запросе")
+        lines += [f'app_sql_queries_max{{endpoint="{ep}"}} {s["max_queries"]}' for ep, s in data]
+        family("app_sql_seconds_total", "counter", "Суммарное время SQL")
+        lines += [f'app_sql_seconds_total{{endpoint="{ep}"}} {s["sql_time"]:.6f}' for ep, s in data]
+        family("app_template_seconds_total", "counter", "Суммарное время рендера шаблонов")
+        lines += [f'app_template_seconds_total{{endpoint="{ep}"}} {s["render_time"]:.6f}' for ep, s in data]
+        family("app_request_duration_seconds", "histogram", "Время обработки запроса")
+        for ep, s in data:
+            for bound, count in zip(LATENCY_BUCKETS, s["buckets"]):
+                lines.append(f'app_request_duration_seconds_bucket{{endpoint="{ep}",le="{bound}"}} {count}')
+            lines.append(f'app_request_duration_seconds_bucket{{endpoint="{ep}",le="+Inf"}} {s["requests"]}')
+            lines.append(f'app_request_duration_seconds_sum{{endpoint="{ep}"}} {s["latency"]:.6f}')
+            lines.append(f'app_request_duration_seconds_count{{endpoint="{ep}"}} {s["requests"]}')
+        return "\n".join(lines) + "\n"
+
+    def _metrics_view(self):
+        token = current_app.config["METRICS_TOKEN"]
+        if not token:
+            # без токена метрики открыты только в dev и тестах, в production эндпоинта как будто нет
+            if not (current_app.debug or current_app.testing):
+                abort(404)
+        elif request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+        return Response(self.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+def _current_stats() -> Optional[RequestStats]:
+    if not has_request_context():
+        return None
+    return g.get("request_stats")
+
+
+def _start_request() -> None:
+    g.request_stats = RequestStats()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    elapsed = time.perf_counter() - started
+    stats = _current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_time += elapsed
+    if has_request_context():
+        threshold = current_app.config["SLOW_QUERY_MS"] / 1000
+        if threshold and elapsed >= threshold:
+            slow_query_logger.warning(
+                "%.1f ms [%s] %s", elapsed * 1000, request.endpoint, " ".join(statement.split())
+            )
+
+
+def _before_render(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None:
+        stats._render_started.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None and stats._render_started:
+        stats.render_time += time.perf_counter() - stats._render_started.pop()
+
+
+@contextmanager
+def query_budget(limit: int):
+    """Проверка в тестах: блок должен уложиться в `limit` SQL-запросов.
+
+        with query_budget(5):
+            client.get("/")
+    """
+    counter = {"queries": 0}
+
+    def count(*_args):
+        counter["queries"] += 1
+
+    event.listen(Engine, "after_cursor_execute", count)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "after_cursor_execute", count)
+    if counter["queries"] > limit:
+        raise QueryBudgetExceeded(f"выполнено {counter['queries']} SQL-запросов при бюджете {limit}")
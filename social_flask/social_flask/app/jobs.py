@@ -0,0 +1,153 @@
+"""Фоновые задачи по пользователю: выгрузка архива и т.п.
+
+Запрос только добавляет строку в таблицу `job`, а выполняет её воркер:
+`flask jobs worker`. Обработчик задачи регистрируется декоратором
+`@handler("kind")` и получает функцию `report(**counters)`, которая
+сохраняет прогресс в job.progress и продлевает захват задачи. Счётчики
+по шагам удобно копить в `Progress`.
+"""
+
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import click
+from flask import Flask, current_app
+
+from .extensions import db
+from .models import Job
+from .workers import add_worker_command, run_periodic, start_thread
+
+Handler = Callable[[Job, Callable[..., None]], None]
+
+HANDLERS: Dict[str, Handler] = {}
+
+
+def handler(kind: str):
+    """Регистрирует функцию как обработчик задач вида `kind`."""
+
+    def decorator(fn: Handler) -> Handler:
+        HANDLERS[kind] = fn
+        return fn
+
+    return decorator
+
+
+class Progress:
+    """Счётчики задачи по шагам: `count` только копит, `add` копит и отправляет в report."""
+
+    def __init__(self, report: Optional[Callable[..., None]] = None) -> None:
+        self.counts: Dict[str, int] = {}
+        self._report = report
+
+    def count(self, step: str, n: int) -> None:
+        """Учитывает n единиц шага без отчёта: для кода внутри незакоммиченной транзакции."""
+        self.counts[step] = self.counts.get(step, 0) + n
+
+    def add(self, step: str, n: int) -> None:
+        """Учитывает n единиц шага и отправляет все счётчики.
+
+        report коммитит сессию — вызывать только между транзакциями.
+        """
+        self.count(step, n)
+        if self._report is not None:
+            self._report(**self.counts)
+
+
+def enqueue(kind: str, user_id: int) -> Job:
+    """Ставит задачу в очередь; если такая уже ждёт или выполняется — возвращает её.
+
+    Коммит остаётся за вызывающим кодом.
+    """
+    job = Job.query.filter(
+        Job.user_id == user_id, Job.kind == kind, Job.status.in_(("pending", "running"))
+    ).first()
+    if job is None:
+        job = Job(kind=kind, user_id=user_id, progress={})
+        db.session.add(job)
+    return job
+
+
+def _due(now: datetime):
+    # «running» с истёкшим захватом — воркер упал посреди задачи
+    return (Job.status == "pending") | ((Job.status == "running") & (Job.lease_until <= now))
+
+
+def _claim() -> Optional[Job]:
+    now = datetime.utcnow()
+    row = db.session.query(Job.id).filter(_due(now)).order_by(Job.id).first()
+    if row is None:
+        return None
+    token = uuid.uuid4().hex
+    # условный UPDATE: если соседний воркер успел забрать задачу, она нам не достанется
+    claimed = Job.query.filter(Job.id == row.id, _due(now)).update(
+        {
+            Job.status: "running",
+            Job.claimed_by: token,
+            Job.lease_until: now + timedelta(seconds=current_app.config["JOBS_LEASE"]),
+            Job.started_at: now,
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    if not claimed:
+        return None
+    return db.session.get(Job, row.id)
+
+
+def run_job(job: Job) -> None:
+    """Выполняет задачу и сохраняет её итог (done или failed)."""
+
+    def report(**counters) -> None:
+        job.progress = dict(job.progress or {}, **counters)
+        job.lease_until = datetime.utcnow() + timedelta(seconds=current_app.config["JOBS_LEASE"])
+        db.session.commit()
+
+    fn = HANDLERS.get(job.kind)
+    try:
+        if fn is None:
+            raise LookupError(f"нет обработчика для задач вида {job.kind!r}")
+        fn(job, report)
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.exception("Задача %s (%s) завершилась ошибкой", job.id, job.kind)
+        job.status = "failed"
+        job.last_error = f"{type(exc).__name__}: {exc}"
+    else:
+        job.status = "done"
+    job.claimed_by = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def drain() -> int:
+    """Выполняет задачи, пока очередь не опустеет; возвращает их число."""
+    done = 0
+    while True:
+        job = _claim()
+        if job is None:
+            return done
+        run_job(job)
+        done += 1
+
+
+def run_worker(app: Flask, stop: threading.Event = None) -> None:
+    """Цикл воркера: выполняет задачи по одной, а если их нет — ждёт."""
+    run_periodic(app, drain, "JOBS_POLL_INTERVAL", "Ошибка при разборе очереди задач", stop, until_idle=True)
+
+
+def start_worker_thread(app: Flask) -> threading.Event:
+    return start_thread(run_worker, app, "jobs")
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("jobs")
+    def jobs_cli():
+        """Очередь фоновых задач."""
+
+    add_worker_command(jobs_cli, run_worker, "Воркер задач запущен")
+
+    @jobs_cli.command("drain")
+    def drain_command():
+        click.echo(f"Выполнено задач: {drain()}")
@@ -0,0 +1,247 @@
+"""Лайки: переключение минимальным числом запросов и склейка частых кликов.
+
+Вместо SELECT + INSERT/DELETE + загрузки автора + COUNT переключение — это
+DELETE ... RETURNING (или INSERT ... ON CONFLICT DO NOTHING RETURNING) по
+уникальному ключу (post_id, user_id) и UPDATE счётчика Post.likes_count,
+который сразу возвращает новое значение и автора поста.
+
+При LIKE_COALESCE_MS > 0 клики сначала копятся в памяти процесса, а в базу
+раз в окно пишется только итоговое состояние: двойной клик не пишет ничего.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from flask import Flask, current_app
+from sqlalchemy import delete, exists, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .access import visible_posts
+from .extensions import db
+from .models import Like, Notification, Post
+
+
+def delete_link(model, post_column, post_id: int, user_id: int) -> bool:
+    """DELETE ... RETURNING строки «пользователь — пост» (лайк, репост)."""
+    stmt = delete(model).where(post_column == post_id, model.user_id == user_id).returning(model.id)
+    return db.session.execute(stmt).first() is not None
+
+
+def insert_link(model, post_column, post_id: int, user_id: int) -> bool:
+    """Вставка строки «пользователь — пост», только если пост виден пользователю и строки ещё нет."""
+    insert = pg_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+    source = select(Post.id, literal(user_id), literal(datetime.utcnow())).where(
+        Post.id == post_id, visible_posts(user_id)
+    )
+    stmt = (
+        insert(model)
+        .from_select([post_column.key, "user_id", "created_at"], source)
+        .on_conflict_do_nothing(index_elements=[post_column.key, "user_id"])
+        .returning(model.id)
+    )
+    return db.session.execute(stmt).first() is not None
+
+
+def change_counter(post_id: int, counter, delta: int):
+    """Сдвигает счётчик поста; возвращает (значение счётчика, автор) или None, если поста нет."""
+    stmt = (
+        update(Post)
+        .where(Post.id == post_id)
+        .values({counter: counter + delta, Post.version: Post.version + 1})
+        .returning(counter, Post.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(stmt).first()
+
+
+def _delete_like(post_id: int, user_id: int) -> bool:
+    return delete_link(Like, Like.post_id, post_id, user_id)
+
+
+def _insert_like(post_id: int, user_id: int) -> bool:
+    return insert_link(Like, Like.post_id, post_id, user_id)
+
+
+def _change_counter(post_id: int, delta: int):
+    return change_counter(post_id, Post.likes_count, delta)
+
+
+def _visible_count(post_id: int, user_id: int) -> Optional[int]:
+    """Число лайков поста или None, если поста нет или он не виден пользователю."""
+    return db.session.execute(select(Post.likes_count).where(Post.id == post_id, visible_posts(user_id))).scalar()
+
+
+def _notify(author_id: int, post_id: int, user_id: int, actor_name: str) -> None:
+    if author_id != user_id:
+        db.session.add(
+            Notification(user_id=author_id, kind="like", payload={"from": actor_name, "post_id": post_id})
+        )
+
+
+def set_like(post_id: int, user_id: int, liked: bool, actor_name: str) -> Optional[int]:
+    """Приводит лайк к состоянию `liked`. Возвращает число лайков или None, если поста нет.
+
+    Коммит остаётся за вызывающим кодом.
+    """
+    changed = _insert_like(post_id, user_id) if liked else _delete_like(post_id, user_id)
+    if not changed:
+        return _visible_count(post_id, user_id)
+    row = _change_counter(post_id, 1 if liked else -1)
+    if liked:
+        _notify(row.user_id, post_id, user_id, actor_name)
+    return row[0]
+
+
+def toggle_like(post_id: int, user_id: int, actor_name: str) -> Optional[Tuple[bool, int]]:
+    """Переключает лайк и коммитит. Возвращает (liked, likes_count) или None, если поста нет."""
+    if _delete_like(post_id, user_id):
+        liked = False
+    elif _insert_like(post_id, user_id):
+        liked = True
+    else:
+        # вставка не прошла: поста нет (или он скрыт), либо параллельный клик только что поставил лайк
+        count = _visible_count(post_id, user_id)
+        db.session.rollback()
+        return None if count is None else (True, count)
+    row = _change_counter(post_id, 1 if liked else -1)
+    if liked:
+        _notify(row.user_id, post_id, user_id, actor_name)
+    db.session.commit()
+    return liked, row[0]
+
+
+class LikeBuffer:
+    """Накопитель переключений лайков в памяти процесса.
+
+    Для каждой пары (post_id, user_id) помнит состояние в базе на момент
+    первого клика и желаемое состояние. Фоновый поток раз в окно пишет в
+    базу только пары, где желаемое отличается от исходного.
+
+    Блокировка защищает только словари в памяти; запросы к базе идут без
+    неё. Переключение, чьи чтения из базы пересеклись с коммитом окна
+    (`_epoch` сменилась или идёт коммит), перечитывает базу: иначе оно
+    взяло бы за исходное состояние, которое коммит уже изменил.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[Tuple[int, int], list] = {}
+        # окно, которое flush сейчас пишет в базу
+        self._inflight: Dict[Tuple[int, int], list] = {}
+        # незаписанная разница лайков по постам (pending и inflight) — для счётчика в ответе
+        self._delta: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        # растёт после каждого коммита окна
+        self._epoch = 0
+        self._committing = False
+        self._committed = threading.Event()
+        self._committed.set()
+        # два flush (фоновый и ручной) не пишут одновременно
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def toggle(self, post_id: int, user_id: int, actor_name: str) -> Optional[Tuple[bool, int]]:
+        key = (post_id, user_id)
+        while True:
+            self._committed.wait()
+            with self._lock:
+                epoch = self._epoch
+                known = key in self._pending or key in self._inflight
+            count, in_db = self._read(post_id, user_id, known)
+            if count is None:
+                return None
+            with self._lock:
+                if self._committing or self._epoch != epoch:
+                    continue
+                entry = self._pending.get(key)
+                if entry is None:
+                    inflight = self._inflight.get(key)
+                    if inflight is not None:
+                        # окно с этой парой ещё пишется: исходным будет записываемое состояние
+                        in_db = inflight[1]
+                    elif in_db is None:
+                        continue
+                    entry = self._pending[key] = [in_db, in_db, actor_name]
+                entry[1] = not entry[1]
+                liked = entry[1]
+                self._delta[post_id] += 1 if liked else -1
+                delta = self._delta[post_id]
+                if not delta:
+                    del self._delta[post_id]
+                break
+        self._ensure_flusher(current_app._get_current_object())
+        return liked, max(0, count + delta)
+
+    def _read(self, post_id: int, user_id: int, known: bool) -> Tuple[Optional[int], Optional[bool]]:
+        """Счётчик поста и, если пары ещё нет в буфере, есть ли лайк в базе."""
+        count = _visible_count(post_id, user_id)
+        if count is None or known:
+            return count, None
+        in_db = db.session.execute(select(exists().where(Like.post_id == post_id, Like.user_id == user_id))).scalar()
+        return count, in_db
+
+    def _ensure_flusher(self, app: Flask) -> None:
+        # поток стартует лениво, уже в процессе воркера (после fork)
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, args=(app,), name="like-buffer", daemon=True)
+                    self._thread.start()
+
+    def _run(self, app: Flask) -> None:
+        while True:
+            time.sleep(app.config["LIKE_COALESCE_MS"] / 1000)
+            with app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    app.logger.exception("Не удалось записать накопленные лайки")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def _finish_commit(self) -> None:
+        self._inflight = {}
+        self._epoch += 1
+        self._committing = False
+        self._committed.set()
+
+    def flush(self) -> int:
+        """Пишет накопленные изменения одной транзакцией, возвращает их число."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._inflight = pending
+            changes = [(key, desired, name) for key, (in_db, desired, name) in pending.items() if desired != in_db]
+            try:
+                for (post_id, user_id), desired, name in changes:
+                    set_like(post_id, user_id, desired, name)
+                with self._lock:
+                    self._committing = True
+                    self._committed.clear()
+                if changes:
+                    db.session.commit()
+            except Exception:
+                # не теряем клики: возвращаем окно в буфер; у новых кликов по тем же парам
+                # исходным остаётся состояние до окна — оно так и не записалось
+                db.session.rollback()
+                with self._lock:
+                    for key, entry in pending.items():
+                        newer = self._pending.setdefault(key, entry)
+                        newer[0] = entry[0]
+                    self._finish_commit()
+                raise
+            with self._lock:
+                for (post_id, _user_id), (in_db, desired, _name) in pending.items():
+                    if desired != in_db:
+                        self._delta[post_id] -= 1 if desired else -1
+                        if not self._delta[post_id]:
+                            del self._delta[post_id]
+                self._finish_commit()
+        return len(changes)
+
+
+like_buffer = LikeBuffer()
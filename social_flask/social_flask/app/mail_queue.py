@@ -0,0 +1,140 @@
+"""Очередь исходящей почты.
+
+Запрос только кладёт письмо в таблицу `outgoing_mail`, а отправкой
+занимается фоновый воркер: `flask mail worker`. Воркер забирает пачку
+писем, отправляет их через одно SMTP-соединение и при ошибках
+откладывает повтор с экспоненциальной задержкой.
+
+Для локальной проверки хватит SMTP-заглушки на порту из config.py:
+
+    python -m aiosmtpd -n -l localhost:8025
+"""
+
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import click
+from flask import Flask, current_app
+from flask_mail import Message
+
+from .extensions import db, mail
+from .models import OutgoingMail
+from .workers import add_worker_command, run_periodic, start_thread
+
+
+def enqueue(subject: str, recipients: List[str], body: str) -> OutgoingMail:
+    """Добавляет письмо в очередь. Коммит остаётся за вызывающим кодом."""
+    item = OutgoingMail(subject=subject, recipients=list(recipients), body=body)
+    db.session.add(item)
+    return item
+
+
+def _claim_batch(batch_size: int) -> List[OutgoingMail]:
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=current_app.config["MAIL_QUEUE_LEASE"])
+    token = uuid.uuid4().hex
+    due = (
+        (OutgoingMail.status == "pending")
+        # «sending» с истёкшим захватом — воркер упал посреди отправки
+        | (OutgoingMail.status == "sending")
+    ) & (OutgoingMail.next_attempt_at <= now)
+    ids = [
+        row.id
+        for row in db.session.query(OutgoingMail.id).filter(due).order_by(OutgoingMail.id).limit(batch_size)
+    ]
+    if not ids:
+        return []
+    # условный UPDATE: если соседний воркер успел забрать письмо, оно нам не достанется
+    OutgoingMail.query.filter(OutgoingMail.id.in_(ids), due).update(
+        {
+            OutgoingMail.status: "sending",
+            OutgoingMail.claimed_by: token,
+            OutgoingMail.next_attempt_at: lease_until,
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return OutgoingMail.query.filter_by(claimed_by=token, status="sending").order_by(OutgoingMail.id).all()
+
+
+def _schedule_retry(item: OutgoingMail, exc: Exception) -> None:
+    config = current_app.config
+    item.attempts += 1
+    item.last_error = f"{type(exc).__name__}: {exc}"
+    item.claimed_by = None
+    if item.attempts >= config["MAIL_QUEUE_MAX_ATTEMPTS"]:
+        item.status = "failed"
+        return
+    delay = min(config["MAIL_QUEUE_RETRY_BASE"] * 2 ** (item.attempts - 1), config["MAIL_QUEUE_RETRY_MAX"])
+    item.status = "pending"
+    item.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def _send_failed(item: OutgoingMail, exc: Exception) -> None:
+    if not isinstance(exc, (smtplib.SMTPException, OSError)):
+        # не сетевая ошибка (например, письмо не собирается): повторы скорее всего не помогут,
+        # но письмо всё равно доходит до failed через MAIL_QUEUE_MAX_ATTEMPTS, а не крутится вечно
+        current_app.logger.error("Письмо %s не отправлено", item.id, exc_info=exc)
+    _schedule_retry(item, exc)
+
+
+def drain(batch_size: int = None) -> int:
+    """Отправляет одну пачку писем, возвращает число отправленных.
+
+    Любая ошибка отправки остаётся внутри пачки: откат всей транзакции
+    вернул бы уже отправленным письмам статус «sending», и после истечения
+    захвата они ушли бы повторно.
+    """
+    batch = _claim_batch(batch_size or current_app.config["MAIL_QUEUE_BATCH_SIZE"])
+    if not batch:
+        return 0
+    sent = 0
+    try:
+        with mail.connect() as conn:
+            for item in batch:
+                try:
+                    conn.send(Message(item.subject, recipients=item.recipients, body=item.body))
+                except Exception as exc:
+                    _send_failed(item, exc)
+                else:
+                    item.status = "sent"
+                    item.sent_at = datetime.utcnow()
+                    item.claimed_by = None
+                    sent += 1
+    except Exception as exc:
+        # не удалось подключиться или соединение оборвалось при закрытии
+        for item in batch:
+            if item.status == "sending":
+                _send_failed(item, exc)
+    db.session.commit()
+    return sent
+
+
+def run_worker(app: Flask, stop: threading.Event = None) -> None:
+    """Цикл воркера: разбирает очередь, пока есть письма, иначе ждёт."""
+    run_periodic(app, drain, "MAIL_QUEUE_POLL_INTERVAL", "Ошибка при разборе очереди писем", stop, until_idle=True)
+
+
+def start_worker_thread(app: Flask) -> threading.Event:
+    return start_thread(run_worker, app, "mail-queue")
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("mail")
+    def mail_cli():
+        """Очередь исходящей почты."""
+
+    add_worker_command(mail_cli, run_worker, "Воркер почты запущен")
+
+    @mail_cli.command("drain")
+    def drain_command():
+        total = 0
+        while True:
+            sent = drain()
+            if not sent:
+                break
+            total += sent
+        click.echo(f"Отправлено писем: {total}")
@@ -1,12 +1,25 @@
 import os
 import uuid
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, selectinload
 
-from app.extensions import db
+from app.access import can_view_post, current_viewer_id, visible_posts
+from app.comments import (
+    comments_page,
+    decode_cursor,
+    encode_cursor,
+    latest_comments,
+    reply_counts,
+    serialize as serialize_comment,
+)
+from app.extensions import db, limiter, response_cache
 from app.forms import PostForm, CommentForm
-from app.models import Post, Comment, Like, Visibility, Notification, followers
+from app.likes import like_buffer, toggle_like
+from app.models import Post, PostTag, Comment, Repost, TrendingPost, Visibility, Notification
+from app.reposts import toggle_repost
+from app.trending import TAG_RE, top_tags
 
 main_bp = Blueprint("main", __name__)
 
@@ -44,54 +57,97 @@ def _save_video(file_storage):
 
 
 @main_bp.route("/")
+@response_cache.cached("feed")
 def feed():
+    # публичные посты, свои и «для друзей» от друзей (app/access.py); репосты живут в «Мои репосты»
+    # автор нужен уже для ключа кэша карточки (User.version) — грузим тем же запросом
+    posts = (
+        Post.query.filter(visible_posts(current_viewer_id()))
+        .options(joinedload(Post.author))
+        .order_by(Post.created_at.desc())
+        .limit(50)
+        .all()
+    )
     if current_user.is_authenticated:
-        # NOTE: `User.followers` is configured with lazy="dynamic", which cannot be used with `.any()`
-        # in a SQLAlchemy filter expression. Use the association table instead.
-        followed_user_ids = (
-            db.session.query(followers.c.followed_id)
-            .filter(followers.c.follower_id == current_user.id)
-            .subquery()
-        )
-        # В общей ленте показываем только исходные посты (без репостов),
-        # а сами репосты живут в разделе «Мои репосты».
-        posts = (
-            Post.query.filter(Post.original_post_id.is_(None))
-            .filter(
-                (Post.visibility == Visibility.PUBLIC)
-                | (Post.user_id == current_user.id)
-                | (Post.user_id.in_(followed_user_ids))
-            )
-            .order_by(Post.created_at.desc())
-            .limit(50)
-            .all()
-        )
         post_form = PostForm()
         comment_form = CommentForm()
     else:
-        posts = (
-            Post.query.filter(Post.original_post_id.is_(None), Post.visibility == Visibility.PUBLIC)
-            .order_by(Post.created_at.desc())
-            .limit(50)
-            .all()
-        )
+        # анонимам форма комментария не нужна (и её CSRF-токен не должен попасть в кэш)
         post_form = None
-        comment_form = CommentForm()
-    return render_template("main/feed.html", posts=posts, post_form=post_form, comment_form=comment_form)
+        comment_form = None
+    return _render_feed(posts, tab="feed", post_form=post_form, comment_form=comment_form)
+
+
+@main_bp.route("/trending")
+@response_cache.cached("trending")
+def trending():
+    """Популярное: порядок по затухающему рейтингу из app/trending.py, один запрос по индексу."""
+    tag = request.args.get("tag", "").lower()
+    if not TAG_RE.fullmatch(f"#{tag}"):
+        tag = None
+    query = (
+        Post.query.join(TrendingPost, TrendingPost.post_id == Post.id)
+        .filter(visible_posts(current_viewer_id()))
+        .options(joinedload(Post.author))
+    )
+    if tag:
+        # теги уже разобраны и приведены к нижнему регистру в Python (app/trending.py):
+        # LIKE/lower() в SQLite не знают регистра кириллицы
+        query = query.join(PostTag, PostTag.post_id == Post.id).filter(PostTag.tag == tag)
+    posts = query.order_by(TrendingPost.score.desc()).limit(50).all()
+    comment_form = CommentForm() if current_user.is_authenticated else None
+    return _render_feed(
+        posts, tab="trending", post_form=None, comment_form=comment_form, tags=top_tags(), active_tag=tag
+    )
+
+
+def _render_feed(posts, **context):
+    comments = latest_comments([p.id for p in posts], current_app.config["COMMENTS_PREVIEW"])
+    replies = reply_counts([c.id for preview, _has_more in comments.values() for c in preview])
+    return render_template(
+        "main/feed.html", posts=posts, comments=comments, replies=replies, encode_cursor=encode_cursor, **context
+    )
+
+
+@main_bp.route("/post/<int:post_id>/comments")
+def post_comments(post_id: int):
+    """Подгрузка комментариев старше курсора: ?before=<курсор>&parent=<id комментария>."""
+    if not can_view_post(Post.query.get_or_404(post_id)):
+        abort(404)
+    before = None
+    if request.args.get("before"):
+        before = decode_cursor(request.args["before"])
+        if before is None:
+            abort(400)
+    page_size = current_app.config["COMMENTS_PAGE_SIZE"]
+    limit = max(1, min(request.args.get("limit", page_size, type=int), page_size))
+    items, next_cursor = comments_page(post_id, limit, before, request.args.get("parent", type=int))
+    replies = reply_counts([c.id for c in items])
+    return jsonify(
+        {
+            "comments": [dict(serialize_comment(c), replies=replies.get(c.id, 0)) for c in items],
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 @main_bp.route("/my-reposts")
 @login_required
 def my_reposts():
-    posts = (
-        Post.query.filter_by(user_id=current_user.id)
-        .filter(Post.original_post_id.isnot(None))
-        .order_by(Post.created_at.desc())
-        .all()
+    page = request.args.get("page", 1, type=int)
+    # исходные посты и их авторов подгружаем пачкой, а не по одному на строку
+    reposts = (
+        Repost.query.filter_by(user_id=current_user.id)
+        # автор мог с тех пор скрыть пост
+        .join(Repost.original_post)
+        .filter(visible_posts(current_user.id))
+        .options(selectinload(Repost.original_post).selectinload(Post.author))
+        .order_by(Repost.created_at.desc(), Repost.id.desc())
+        .paginate(page=page, per_page=current_app.config["REPOSTS_PER_PAGE"], error_out=False)
     )
     # в этом окне новая форма поста не нужна
     comment_form = CommentForm()
-    return render_template("main/my_reposts.html", posts=posts, comment_form=comment_form)
+    return render_template("main/my_reposts.html", reposts=reposts, comment_form=comment_form)
 
 
 @main_bp.route("/post", methods=["POST"])
@@ -121,6 +177,7 @@ def create_post():
         )
         db.session.add(post)
         db.session.commit()
+        response_cache.invalidate("feed")
         flash("Пост опубликован", "success")
     else:
         flash("Не удалось опубликовать пост", "danger")
@@ -129,60 +186,55 @@ def create_post():
 
 @main_bp.route("/post/<int:post_id>/comment", methods=["POST"])
 @login_required
+@limiter.limit("comment")
 def comment(post_id: int):
     form = CommentForm()
-    post = Post.query.get_or_404(post_id)
-    if form.validate_on_submit():
-        comment = Comment(post_id=post.id, user_id=current_user.id, body=form.body.data)
-        db.session.add(comment)
-        if post.author.id != current_user.id:
-            db.session.add(
-                Notification(
-                    user_id=post.author.id,
-                    kind="comment",
-                    payload={"from": current_user.name, "post_id": post.id, "text": comment.body},
-                )
-            )
-        db.session.commit()
-        flash("Комментарий добавлен", "success")
+    # сначала CSRF и сама форма, и только потом запросы к базе
+    if not form.validate_on_submit():
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            return jsonify(
-                {
-                    "ok": True,
-                    "author": comment.author.name,
-                    "time": comment.created_at.strftime("%H:%M"),
-                    "body": comment.body,
-                }
+            return jsonify({"ok": False}), 400
+        return redirect(url_for("main.feed"))
+    post = Post.query.get_or_404(post_id)
+    if not can_view_post(post):
+        abort(404)
+    parent_id = form.parent_id.data or None
+    if parent_id is not None:
+        # отвечать можно только на комментарий этого же поста
+        if not parent_id.isdigit() or Comment.query.filter_by(id=int(parent_id), post_id=post.id).first() is None:
+            abort(400)
+        parent_id = int(parent_id)
+    comment = Comment(post_id=post.id, user_id=current_user.id, parent_id=parent_id, body=form.body.data)
+    db.session.add(comment)
+    Post.bump_version(Post.id == post.id)
+    if post.author.id != current_user.id:
+        db.session.add(
+            Notification(
+                user_id=post.author.id,
+                kind="comment",
+                payload={"from": current_user.name, "post_id": post.id, "text": comment.body},
             )
+        )
+    db.session.commit()
+    # превью комментариев входят в закэшированные для анонимов ленты
+    response_cache.invalidate("feed")
+    response_cache.invalidate("trending")
+    flash("Комментарий добавлен", "success")
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return jsonify({"ok": False}), 400
+        return jsonify({"ok": True, **serialize_comment(comment)})
     return redirect(url_for("main.feed"))
 
 
 @main_bp.route("/post/<int:post_id>/like", methods=["POST"])
 @login_required
+@limiter.limit("like")
 def like(post_id: int):
-    post = Post.query.get_or_404(post_id)
-    already = Like.query.filter_by(post_id=post.id, user_id=current_user.id).first()
-    if already:
-        db.session.delete(already)
-        flash("Лайк убран", "info")
-        liked = False
-    else:
-        like = Like(post_id=post.id, user_id=current_user.id)
-        db.session.add(like)
-        if post.author.id != current_user.id:
-            db.session.add(
-                Notification(
-                    user_id=post.author.id,
-                    kind="like",
-                    payload={"from": current_user.name, "post_id": post.id},
-                )
-            )
-        liked = True
-        flash("Понравилось!", "success")
-    db.session.commit()
-    likes_count = Like.query.filter_by(post_id=post.id).count()
+    # двойные клики можно склеивать в памяти и писать итог раз в LIKE_COALESCE_MS
+    toggle = like_buffer.toggle if current_app.config["LIKE_COALESCE_MS"] else toggle_like
+    result = toggle(post_id, current_user.id, current_user.name)
+    if result is None:
+        abort(404)
+    liked, likes_count = result
+    flash("Понравилось!" if liked else "Лайк убран", "success" if liked else "info")
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return jsonify({"liked": liked, "likes_count": likes_count})
     return redirect(url_for("main.feed"))
@@ -190,42 +242,18 @@ def like(post_id: int):
 
 @main_bp.route("/post/<int:post_id>/repost", methods=["POST"])
 @login_required
+@limiter.limit("repost")
 def repost(post_id: int):
-    clicked = Post.query.get_or_404(post_id)
-    # Если нажали "репост" на репосте — работаем с исходным постом,
-    # чтобы не плодить цепочки репостов/дубликаты.
-    original = clicked.original_post or clicked
     # Тоггл-поведение: первый клик создаёт репост, повторный клик удаляет его
-    existing_repost = Post.query.filter_by(
-        user_id=current_user.id, original_post_id=original.id
-    ).first()
-    if existing_repost:
-        db.session.delete(existing_repost)
-        db.session.commit()
-        flash("Репост убран из вашей ленты", "info")
-        action = "removed"
-    else:
-        repost = Post(
-            user_id=current_user.id,
-            body=f"Репост: {original.body[:200]}",
-            media_url=original.media_url,
-            media_type=original.media_type,
-            visibility=Visibility.PUBLIC,
-            original_post=original,
-        )
-        db.session.add(repost)
-        if original.author.id != current_user.id:
-            db.session.add(
-                Notification(
-                    user_id=original.author.id,
-                    kind="repost",
-                    payload={"from": current_user.name, "post_id": original.id},
-                )
-            )
-        db.session.commit()
+    result = toggle_repost(post_id, current_user.id, current_user.name)
+    if result is None:
+        abort(404)
+    reposted, reposts_count = result
+    response_cache.invalidate("feed")
+    if reposted:
         flash("Репост добавлен в вашу ленту", "success")
-        action = "added"
+    else:
+        flash("Репост убран из вашей ленты", "info")
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return jsonify({"action": action})
+        return jsonify({"action": "added" if reposted else "removed", "reposts_count": reposts_count})
     return redirect(url_for("main.feed"))
-
@@ -1,7 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, current_app, render_template, redirect, request, url_for, flash
 from flask_login import login_required, current_user
 
-from app.extensions import db
+from app.archive import chat_messages, message_counts
+from app.extensions import db, limiter
 from app.forms import MessageForm
 from app.models import Chat, ChatMembership, Message, User
 
@@ -32,13 +33,19 @@ def _ensure_private_chat(user_a: int, user_b: int) -> Chat:
 @login_required
 def inbox():
     chats = (
-        Chat.query.join(ChatMembership).filter(ChatMembership.user_id == current_user.id).order_by(Chat.created_at.desc())
+        Chat.query.join(ChatMembership)
+        .filter(ChatMembership.user_id == current_user.id)
+        .order_by(Chat.created_at.desc())
+        .all()
     )
-    return render_template("messages/inbox.html", chats=chats)
+    # старые сообщения лежат в архиве, поэтому chat.messages|length занижал бы счёт
+    counts = message_counts([chat.id for chat in chats])
+    return render_template("messages/inbox.html", chats=chats, counts=counts)
 
 
 @messages_bp.route("/with/<int:user_id>", methods=["GET", "POST"])
 @login_required
+@limiter.limit("message")
 def direct(user_id: int):
     target = User.query.get_or_404(user_id)
     chat = _ensure_private_chat(current_user.id, target.id)
@@ -49,6 +56,10 @@ def direct(user_id: int):
         db.session.commit()
         flash("Сообщение отправлено", "success")
         return redirect(url_for("messages.direct", user_id=user_id))
-    messages = Message.query.filter_by(chat_id=chat.id).order_by(Message.created_at.asc()).all()
-    return render_template("messages/direct.html", form=form, messages=messages, target=target)
+    # курсор — id самого раннего показанного сообщения; старые страницы читаются из архива
+    before = request.args.get("before", type=int)
+    messages, has_more = chat_messages(chat.id, current_app.config["MESSAGES_PAGE_SIZE"], before)
+    return render_template(
+        "messages/direct.html", form=form, messages=messages, target=target, has_more=has_more, before=before
+    )
 
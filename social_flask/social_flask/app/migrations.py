@@ -0,0 +1,260 @@
+"""Версионированные миграции схемы БД.
+
+Вместо `db.create_all()` при каждом старте процесса схема обновляется
+явной командой `flask db upgrade`. Текущая версия хранится в таблице
+`schema_version`, каждая миграция применяется ровно один раз.
+"""
+
+from typing import Callable, List, Tuple
+
+import click
+from flask import Flask
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .extensions import db
+
+MigrationFn = Callable[[Connection], None]
+
+MIGRATIONS: List[Tuple[int, str, MigrationFn]] = []
+
+# ключ в Connection.info: индексы, отложенные до конца транзакции миграции
+CONCURRENT_INDEXES = "concurrent_indexes"
+
+
+def migration(version: int, description: str):
+    """Регистрирует функцию как миграцию с номером `version`."""
+
+    def decorator(fn: MigrationFn) -> MigrationFn:
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+
+    return decorator
+
+
+def create_index(conn: Connection, name: str, table: str, columns: List[str], unique: bool = False) -> None:
+    """Создание индекса без долгой блокировки таблицы.
+
+    В PostgreSQL используется CREATE INDEX CONCURRENTLY. Внутри транзакции
+    миграции его выполнить нельзя, поэтому здесь он только запоминается,
+    а строит его upgrade() после коммита миграции на отдельном соединении.
+    В SQLite — обычный CREATE INDEX IF NOT EXISTS.
+    """
+    cols = ", ".join(f'"{c}"' for c in columns)
+    unique_sql = "UNIQUE " if unique else ""
+    if conn.dialect.name == "postgresql":
+        conn.info.setdefault(CONCURRENT_INDEXES, []).append(
+            (name, f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" ({cols})')
+        )
+    else:
+        conn.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON "{table}" ({cols})'))
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    """ALTER TABLE ADD COLUMN, если колонки ещё нет (свежая БД уже создана по моделям)."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+
+
+def _build_concurrently(engine: Engine, indexes: List[Tuple[str, str]]) -> None:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, ddl in indexes:
+            try:
+                conn.execute(text(ddl))
+            except Exception:
+                # прерванный CONCURRENTLY оставляет INVALID-индекс, а IF NOT EXISTS
+                # при повторном запуске счёл бы его готовым
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                raise
+
+
+def _record_version(conn: Connection, number: int) -> None:
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": number})
+
+
+def current_version(engine: Engine) -> int:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        row = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return row or 0
+
+
+def upgrade(engine: Engine, target: int = None) -> List[int]:
+    """Применяет все ещё не применённые миграции, возвращает их номера."""
+    applied = []
+    version = current_version(engine)
+    for number, _description, fn in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        # каждая миграция — отдельная транзакция, чтобы не держать блокировку надолго
+        with engine.begin() as conn:
+            fn(conn)
+            # info живёт вместе с DBAPI-соединением в пуле — забираем список сразу
+            deferred = conn.info.pop(CONCURRENT_INDEXES, [])
+            if not deferred:
+                _record_version(conn, number)
+        if deferred:
+            # версия записывается только после того, как построены все индексы;
+            # если сборка упала, миграция (идемпотентная) выполнится заново
+            _build_concurrently(engine, deferred)
+            with engine.begin() as conn:
+                _record_version(conn, number)
+        applied.append(number)
+    return applied
+
+
+@migration(1, "базовая схема")
+def _initial_schema(conn: Connection) -> None:
+    # checkfirst: существующие таблицы из старых установок не трогаем
+    db.metadata.create_all(bind=conn, checkfirst=True)
+
+
+@migration(2, "индексы для больших таблиц")
+def _hot_path_indexes(conn: Connection) -> None:
+    create_index(conn, "ix_post_user_id_created_at", "post", ["user_id", "created_at"])
+    create_index(conn, "ix_comment_post_id_created_at", "comment", ["post_id", "created_at"])
+    create_index(conn, "ix_like_post_id_user_id", "like", ["post_id", "user_id"])
+    create_index(conn, "ix_notification_user_id_is_read", "notification", ["user_id", "is_read"])
+    create_index(conn, "ix_chat_membership_user_id", "chat_membership", ["user_id"])
+    create_index(conn, "ix_chat_membership_chat_id", "chat_membership", ["chat_id"])
+    create_index(conn, "ix_group_post_group_id_created_at", "group_post", ["group_id", "created_at"])
+    create_index(conn, "ix_group_member_group_id_user_id", "group_member", ["group_id", "user_id"])
+    create_index(conn, "ix_followers_followed_id", "followers", ["followed_id"])
+    create_index(conn, "ix_friendship_friend_id", "friendship", ["friend_id"])
+
+
+@migration(3, "версия поста для кэша карточек")
+def _post_version(conn: Connection) -> None:
+    add_column(conn, "post", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(4, "очередь исходящих писем")
+def _outgoing_mail(conn: Connection) -> None:
+    from .models import OutgoingMail
+
+    OutgoingMail.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(5, "уникальные лайки и счётчик лайков у поста")
+def _like_counter(conn: Connection) -> None:
+    # дубли могли появиться от двойных кликов — оставляем самый ранний лайк
+    conn.execute(
+        text(
+            'DELETE FROM "like" WHERE id NOT IN (SELECT MIN(id) FROM "like" GROUP BY post_id, user_id)'
+        )
+    )
+    create_index(conn, "uq_like_post_id_user_id", "like", ["post_id", "user_id"], unique=True)
+    conn.execute(text("DROP INDEX IF EXISTS ix_like_post_id_user_id"))
+    add_column(conn, "post", "likes_count", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        text('UPDATE post SET likes_count = (SELECT COUNT(*) FROM "like" WHERE "like".post_id = post.id)')
+    )
+
+
+@migration(6, "репосты в отдельной таблице")
+def _repost_table(conn: Connection) -> None:
+    from .models import Repost
+
+    Repost.__table__.create(bind=conn, checkfirst=True)
+    add_column(conn, "post", "reposts_count", "INTEGER NOT NULL DEFAULT 0")
+    post_columns = {c["name"] for c in inspect(conn).get_columns("post")}
+    if "original_post_id" in post_columns:
+        # старые репосты были копиями постов; переносим ссылки, копии удаляем.
+        # Сама колонка остаётся (в SQLite нельзя удалить колонку с внешним ключом), но больше не используется.
+        conn.execute(
+            text(
+                "INSERT INTO repost (original_post_id, user_id, created_at) "
+                "SELECT original_post_id, user_id, MIN(created_at) FROM post "
+                "WHERE original_post_id IS NOT NULL GROUP BY original_post_id, user_id"
+            )
+        )
+        copies = "SELECT id FROM post WHERE original_post_id IS NOT NULL"
+        conn.execute(text(f'DELETE FROM "like" WHERE post_id IN ({copies})'))
+        conn.execute(text(f"DELETE FROM comment WHERE post_id IN ({copies})"))
+        conn.execute(text("DELETE FROM post WHERE original_post_id IS NOT NULL"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_post_original_post_id"))
+    conn.execute(
+        text("UPDATE post SET reposts_count = (SELECT COUNT(*) FROM repost WHERE repost.original_post_id = post.id)")
+    )
+
+
+@migration(7, "ответы на комментарии")
+def _comment_parent(conn: Connection) -> None:
+    add_column(conn, "comment", "parent_id", "INTEGER REFERENCES comment (id)")
+    create_index(conn, "ix_comment_parent_id", "comment", ["parent_id"])
+
+
+@migration(8, "фоновые задачи и индексы для выборок по автору")
+def _jobs(conn: Connection) -> None:
+    from .models import Job
+
+    Job.__table__.create(bind=conn, checkfirst=True)
+    create_index(conn, "ix_comment_user_id", "comment", ["user_id"])
+    create_index(conn, "ix_message_sender_id", "message", ["sender_id"])
+    create_index(conn, "ix_group_post_author_id", "group_post", ["author_id"])
+
+
+@migration(9, "таблицы популярного: посты, хэштеги, отметки обработки")
+def _trending(conn: Connection) -> None:
+    from .models import TrendingPost, TrendingTag, TrendingWatermark
+
+    for model in (TrendingPost, TrendingTag, TrendingWatermark):
+        model.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(10, "архив старых сообщений и уведомлений")
+def _archive(conn: Connection) -> None:
+    from .models import MessageSegment, NotificationSegment
+
+    for model in (MessageSegment, NotificationSegment):
+        model.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(11, "версия пользователя для кэша карточек")
+def _user_version(conn: Connection) -> None:
+    add_column(conn, "user", "version", "INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(12, "отметка об удалении аккаунта")
+def _user_deleted_at(conn: Connection) -> None:
+    add_column(conn, "user", "deleted_at", "DATETIME")
+
+
+@migration(13, "хэштеги постов и учтённые лайки популярного")
+def _post_tags(conn: Connection) -> None:
+    from .models import PostTag, TrendingSeen
+    from .trending import parse_tags
+
+    for model in (PostTag, TrendingSeen):
+        model.__table__.create(bind=conn, checkfirst=True)
+    # теги уже разобранных постов; новые добавляет app/trending.py
+    rows = conn.execute(text("SELECT id, body FROM post WHERE body LIKE '%#%'"))
+    values = [{"tag": tag, "post_id": post_id} for post_id, body in rows for tag in parse_tags(body)]
+    if values:
+        conn.execute(PostTag.__table__.insert(), values)
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("db")
+    def db_cli():
+        """Управление схемой БД."""
+
+    @db_cli.command("upgrade")
+    @click.option("--target", type=int, default=None, help="Остановиться на этой версии")
+    def upgrade_command(target):
+        applied = upgrade(db.engine, target)
+        if applied:
+            click.echo(f"Применены миграции: {', '.join(map(str, applied))}")
+        else:
+            click.echo("Схема уже актуальна")
+
+    @db_cli.command("current")
+    def current_command():
+        latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+        click.echo(f"Версия схемы: {current_version(db.engine)} (последняя: {latest})")
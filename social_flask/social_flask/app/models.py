@@ -3,9 +3,11 @@ from enum import Enum
 from typing import Optional
 
 from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from .extensions import db, login_manager
+from .extensions import db, login_manager, user_cache
 
 
 class Visibility(str, Enum):
@@ -36,15 +38,21 @@ class User(UserMixin, db.Model):
     phone = db.Column(db.String(20))
     password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(120), nullable=False)
-    bio = db.Column(db.Text)
+    # длинные поля профиля нужны только на страницах профиля — грузим их отдельно
+    bio = db.deferred(db.Column(db.Text), group="profile")
     avatar_url = db.Column(db.String(255))
     date_of_birth = db.Column(db.Date)
     city = db.Column(db.String(120))
     occupation = db.Column(db.String(120))
-    interests = db.Column(db.Text)
+    interests = db.deferred(db.Column(db.Text), group="profile")
     is_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     privacy_level = db.Column(db.Enum(Visibility), default=Visibility.PUBLIC)
+    # растёт при смене имени или аватара; входит в ключи кэша карточек постов и комментариев
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # когда запрошено удаление аккаунта: с этого момента войти и действовать от его имени нельзя,
+    # а данные удаляет фоновая задача (app/deletion.py)
+    deleted_at = db.Column(db.DateTime)
 
     posts = db.relationship("Post", backref="author", lazy="dynamic")
     comments = db.relationship("Comment", backref="author", lazy="dynamic")
@@ -70,10 +78,17 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password: str) -> None:
         self.password_hash = generate_password_hash(password)
+        if self.id is not None:
+            invalidate_user_after_commit(self.id)
 
     def check_password(self, password: str) -> bool:
         return check_password_hash(self.password_hash, password)
 
+    @property
+    def is_active(self) -> bool:
+        # login_user не пускает неактивных пользователей
+        return self.deleted_at is None
+
     def is_friend(self, user: "User") -> bool:
         return (
             self.friends.filter(friendship.c.friend_id == user.id).count() > 0
@@ -91,13 +106,81 @@ class User(UserMixin, db.Model):
     def is_following(self, user: "User") -> bool:
         return self.following.filter(followers.c.followed_id == user.id).count() > 0
 
+    @staticmethod
+    def bump_version(user_id: int) -> None:
+        User.query.filter(User.id == user_id).update({User.version: User.version + 1}, synchronize_session=False)
+
     def __repr__(self) -> str:
         return f"<User {self.email}>"
 
 
+# Колонки, которых достаточно для current_user на любой странице
+IDENTITY_COLUMNS = (
+    "id",
+    "email",
+    "phone",
+    "password_hash",
+    "name",
+    "avatar_url",
+    "is_verified",
+    "privacy_level",
+    "created_at",
+    "deleted_at",
+)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Сброс закэшированного снимка пользователя после изменения его данных.
+
+    Вызывать после коммита: сброшенный до коммита снимок параллельный
+    load_user успеет снова закэшировать со старыми данными.
+    """
+    user_cache.delete(user_id)
+
+
+# ключ в Session.info: пользователи, чьи снимки сбросить после коммита
+PENDING_INVALIDATIONS = "invalidate_users"
+
+
+def invalidate_user_after_commit(user_id: int) -> None:
+    """Сброс снимка, когда закоммитится текущая транзакция сессии."""
+    db.session.info.setdefault(PENDING_INVALIDATIONS, set()).add(user_id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_committed_users(session) -> None:
+    for user_id in session.info.pop(PENDING_INVALIDATIONS, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_rolled_back_users(session) -> None:
+    session.info.pop(PENDING_INVALIDATIONS, None)
+
+
 @login_manager.user_loader
 def load_user(user_id: str) -> Optional[User]:
-    return User.query.get(int(user_id))
+    uid = int(user_id)
+    snapshot = user_cache.get(uid)
+    if snapshot is None:
+        row = (
+            db.session.query(*(getattr(User, name) for name in IDENTITY_COLUMNS))
+            .filter(User.id == uid)
+            .first()
+        )
+        if row is None:
+            return None
+        snapshot = row._asdict()
+        user_cache.set(uid, snapshot)
+    if snapshot.get("deleted_at") is not None:
+        # сессия аккаунта, который удаляется, больше не действительна
+        return None
+    # В кэше лежит словарь, а не ORM-объект: экземпляр собираем заново и
+    # присоединяем к сессии без запроса (merge load=False). Остальные колонки
+    # догрузятся из БД при первом обращении.
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 
 class Post(db.Model):
@@ -108,17 +191,28 @@ class Post(db.Model):
     media_type = db.Column(db.String(50))
     visibility = db.Column(db.Enum(Visibility), default=Visibility.PUBLIC)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    original_post_id = db.Column(db.Integer, db.ForeignKey("post.id"))
-    original_post = db.relationship("Post", remote_side=[id])
+    # растёт при каждом изменении карточки поста (лайки, комментарии);
+    # входит в ключ кэша отрендеренной карточки вместе с User.version автора
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # денормализованный счётчик, меняется в app/likes.py вместе с самим лайком
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    reposts_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     comments = db.relationship("Comment", backref="post", lazy="dynamic", cascade="all, delete")
     likes = db.relationship("Like", backref="post", lazy="dynamic", cascade="all, delete")
 
+    @staticmethod
+    def bump_version(*criteria) -> None:
+        """Увеличивает version у постов, подходящих под условия, одним UPDATE."""
+        Post.query.filter(*criteria).update({Post.version: Post.version + 1}, synchronize_session=False)
+
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    # ответ на другой комментарий того же поста (None — комментарий верхнего уровня)
+    parent_id = db.Column(db.Integer, db.ForeignKey("comment.id"), index=True)
     body = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -129,6 +223,24 @@ class Like(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index("uq_like_post_id_user_id", "post_id", "user_id", unique=True),)
+
+
+class Repost(db.Model):
+    """Репост — только ссылка на исходный пост, без копии текста и медиа."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    original_post_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    original_post = db.relationship("Post")
+
+    __table_args__ = (
+        db.Index("uq_repost_original_post_id_user_id", "original_post_id", "user_id", unique=True),
+        db.Index("ix_repost_user_id_created_at", "user_id", "created_at"),
+    )
+
 
 class Chat(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -201,3 +313,133 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+
+class OutgoingMail(db.Model):
+    """Письмо в очереди на отправку, см. app/mail_queue.py."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.JSON, nullable=False)
+    body = db.Column(db.Text)
+    # pending -> sending -> sent; после MAIL_QUEUE_MAX_ATTEMPTS неудач — failed
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # для pending — когда можно отправлять, для sending — когда истекает захват воркером
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index("ix_outgoing_mail_status_next_attempt_at", "status", "next_attempt_at"),)
+
+
+class TrendingPost(db.Model):
+    """Затухающий рейтинг поста по лайкам, комментариям и репостам, см. app/trending.py."""
+
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id"), primary_key=True)
+    # log2 рейтинга, приведённого к общей точке отсчёта: сравнимо между постами без пересчёта
+    score = db.Column(db.Float, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    post = db.relationship("Post")
+
+
+class TrendingTag(db.Model):
+    """Затухающий рейтинг хэштега из текстов постов."""
+
+    tag = db.Column(db.String(50), primary_key=True)
+    score = db.Column(db.Float, nullable=False, index=True)
+    # сколько постов с этим тегом учтено
+    posts = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PostTag(db.Model):
+    """Хэштег поста в нижнем регистре; заполняется при разборе новых постов в app/trending.py."""
+
+    tag = db.Column(db.String(50), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id"), primary_key=True, index=True)
+
+
+class TrendingSeen(db.Model):
+    """Чьи лайки и репосты уже учтены в рейтинге поста: повторный лайк после снятия веса не добавляет.
+
+    Строки живут, пока пост есть в trending_post.
+    """
+
+    source = db.Column(db.String(20), primary_key=True)
+    post_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+
+class TrendingWatermark(db.Model):
+    """До какого id обработаны события каждого источника (post, like, comment, repost)."""
+
+    source = db.Column(db.String(20), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MessageSegment(db.Model):
+    """Сжатая пачка старых сообщений одного чата, см. app/archive.py.
+
+    Сегменты чата покрывают непересекающиеся диапазоны id, и все они
+    меньше id сообщений, оставшихся в таблице message.
+    """
+
+    __table_args__ = (db.Index("ix_message_segment_chat_id_first_id", "chat_id", "first_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey("chat.id"), nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    first_at = db.Column(db.DateTime)
+    last_at = db.Column(db.DateTime)
+    # zlib(JSON-список строк сообщений)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class NotificationSegment(db.Model):
+    """Сжатая пачка старых прочитанных уведомлений пользователя."""
+
+    __table_args__ = (db.Index("ix_notification_segment_user_id_first_id", "user_id", "first_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    first_at = db.Column(db.DateTime)
+    last_at = db.Column(db.DateTime)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    """Фоновая задача по пользователю (выгрузка архива и т.п.), см. app/jobs.py."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    # после удаления аккаунта задача удаления остаётся в истории без пользователя
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    # pending -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    # счётчики прогресса, например {"posts": 120, "comments": 45}
+    progress = db.Column(db.JSON)
+    # результат задачи: для выгрузки — имя файла архива в EXPORT_DIR
+    result = db.Column(db.String(255))
+    claimed_by = db.Column(db.String(32))
+    # до какого момента задача закреплена за воркером (упавший воркер её отпускает)
+    lease_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_job_status_id", "status", "id"),
+        db.Index("ix_job_user_id_kind", "user_id", "kind"),
+    )
+
@@ -2,22 +2,36 @@ from datetime import datetime
 import os
 import uuid
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
-from flask_login import login_required, current_user
+from flask import (
+    Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory, abort,
+)
+from flask_login import login_required, current_user, logout_user
+from sqlalchemy.orm import undefer_group
 
-from app.extensions import db
-from app.forms import ProfileForm
-from app.models import User, Visibility
+from app import jobs
+from app.access import current_viewer_id, visible_users
+from app.extensions import db, login_manager, response_cache
+from app.forms import DeleteAccountForm, ExportForm, ProfileForm
+from app.models import Job, User, Visibility, invalidate_user
 
 profile_bp = Blueprint("profile", __name__, url_prefix="/profile")
 
 
 @profile_bp.route("/<int:user_id>")
-@login_required
+@response_cache.cached("profile", namespace_arg="user_id")
 def view(user_id: int):
-    user = User.query.get_or_404(user_id)
-    can_view = user.privacy_level == Visibility.PUBLIC or user.id == current_user.id or user.is_friend(current_user)
-    return render_template("profile/profile.html", user=user, can_view=can_view)
+    # пользователь и право видеть профиль — одним запросом (правила в app/access.py)
+    row = (
+        db.session.query(User, visible_users(current_viewer_id()).label("can_view"))
+        .options(undefer_group("profile"))
+        .filter(User.id == user_id)
+        .first_or_404()
+    )
+    user, can_view = row
+    if not current_user.is_authenticated and not can_view:
+        # анонимам открыты только публичные профили
+        return login_manager.unauthorized()
+    return render_template("profile/profile.html", user=user, can_view=bool(can_view))
 
 
 @profile_bp.route("/edit", methods=["GET", "POST"])
@@ -60,7 +74,13 @@ def edit():
         current_user.date_of_birth = form.date_of_birth.data
         current_user.privacy_level = Visibility(form.privacy_level.data)
         current_user.avatar_url = current_user.avatar_url or "/static/img/avatar-placeholder.svg"
+        # одна строка вместо UPDATE по всем постам автора: User.version входит в ключи кэша карточек
+        User.bump_version(current_user.id)
         db.session.commit()
+        invalidate_user(current_user.id)
+        # имя и аватар автора видны и в ленте
+        response_cache.invalidate(f"profile:{current_user.id}")
+        response_cache.invalidate("feed")
         flash("Профиль обновлен", "success")
         return redirect(url_for("profile.view", user_id=current_user.id))
     if request.method == "GET":
@@ -70,7 +90,57 @@ def edit():
         form.interests.data = current_user.interests
         form.date_of_birth.data = current_user.date_of_birth or datetime.utcnow().date()
         form.privacy_level.data = current_user.privacy_level.value if current_user.privacy_level else "public"
-    return render_template("profile/edit.html", form=form, stickers=stickers)
+    export_job = Job.query.filter_by(user_id=current_user.id, kind="export").order_by(Job.id.desc()).first()
+    return render_template(
+        "profile/edit.html",
+        form=form,
+        stickers=stickers,
+        export_job=export_job,
+        export_form=ExportForm(),
+        delete_form=DeleteAccountForm(),
+    )
+
+
+@profile_bp.route("/export", methods=["POST"])
+@login_required
+def request_export():
+    if not ExportForm().validate_on_submit():
+        flash("Форма устарела, попробуйте ещё раз", "danger")
+        return redirect(url_for("profile.edit"))
+    # архив собирает фоновый воркер (app/exports.py), ссылка появится на странице профиля
+    jobs.enqueue("export", current_user.id)
+    db.session.commit()
+    flash("Готовим архив с вашими данными. Ссылка на скачивание появится здесь.", "info")
+    return redirect(url_for("profile.edit"))
+
+
+@profile_bp.route("/delete", methods=["POST"])
+@login_required
+def delete_account():
+    form = DeleteAccountForm()
+    if not form.validate_on_submit() or not current_user.check_password(form.password.data):
+        flash("Неверный пароль", "danger")
+        return redirect(url_for("profile.edit"))
+    # данные удаляет фоновый воркер пачками (app/deletion.py), чтобы не блокировать запись в БД;
+    # до тех пор аккаунт отключён: войти в него нельзя, а открытые сессии перестают действовать
+    user_id = current_user.id
+    User.query.filter(User.id == user_id).update({User.deleted_at: datetime.utcnow()}, synchronize_session=False)
+    jobs.enqueue("delete_account", user_id)
+    db.session.commit()
+    invalidate_user(user_id)
+    logout_user()
+    flash("Аккаунт будет удалён в течение нескольких минут", "info")
+    return redirect(url_for("main.feed"))
+
+
+@profile_bp.route("/export/<int:job_id>")
+@login_required
+def download_export(job_id: int):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id, kind="export", status="done").first_or_404()
+    if not job.result:
+        # файл удалён, когда был готов более новый архив
+        abort(404)
+    return send_from_directory(current_app.config["EXPORT_DIR"], job.result, as_attachment=True)
 
 
 @profile_bp.route("/follow/<int:user_id>", methods=["POST"])
@@ -0,0 +1,155 @@
+"""Ограничение частоты записей (лайки, комментарии, репосты, сообщения).
+
+Token bucket отдельно на пользователя и на IP: ведро вмещает `burst`
+запросов и пополняется со скоростью `per_second`. Запрос забирает по
+жетону из всех своих вёдер сразу и только если во всех есть жетон:
+отклонённый запрос не тратит остальные вёдра. Когда хоть одно ведро
+пусто, эндпоинт отвечает 429 с заголовком Retry-After.
+
+Хранилище состояния: "memory" — своё в каждом процессе, "sqlite" —
+общий файл для всех воркеров на машине (RATE_LIMIT_STORAGE_PATH).
+"""
+
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Sequence, Tuple
+
+from flask import Flask, current_app, jsonify, make_response, request
+from flask_login import current_user
+
+from .caching import TTLCache
+
+
+# (ключ, burst, per_second)
+Bucket = Tuple[str, float, float]
+
+
+class MemoryBucketStore:
+    def __init__(self, maxsize: int = 100000) -> None:
+        # полностью восстановившиеся вёдра вытесняются по TTL — это то же, что полное ведро
+        self._buckets = TTLCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def take(self, buckets: Sequence[Bucket]) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, burst, per_second in buckets:
+                levels.append(_refill(*(self._buckets.get(key) or (burst, now)), now, burst, per_second))
+            allowed, retry_after, levels = _take_all(levels, buckets)
+            for (key, burst, per_second), tokens in zip(buckets, levels):
+                self._buckets.set(key, (tokens, now), ttl=burst / per_second)
+        return allowed, retry_after
+
+
+class SQLiteBucketStore:
+    """Вёдра в отдельном файле SQLite: одно состояние на все процессы машины."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets: Sequence[Bucket]) -> Tuple[bool, float]:
+        now = time.time()
+        conn = self._connect()
+        # IMMEDIATE сразу берёт блокировку на запись: чтение и обновление вёдер атомарны
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for key, burst, per_second in buckets:
+                row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+                levels.append(_refill(*(row or (burst, now)), now, burst, per_second))
+            allowed, retry_after, levels = _take_all(levels, buckets)
+            conn.executemany(
+                "INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                [(key, tokens, now) for (key, _burst, _per_second), tokens in zip(buckets, levels)],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+
+def _refill(tokens: float, updated: float, now: float, burst: float, per_second: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * per_second)
+
+
+def _take_all(levels: List[float], buckets: Sequence[Bucket]) -> Tuple[bool, float, List[float]]:
+    """Жетон из каждого ведра, если он есть во всех; иначе вёдра не меняются."""
+    retry_after = max(
+        ((1 - tokens) / per_second for tokens, (_key, _burst, per_second) in zip(levels, buckets) if tokens < 1),
+        default=0.0,
+    )
+    if retry_after:
+        return False, retry_after, levels
+    return True, 0.0, [tokens - 1 for tokens in levels]
+
+
+class RateLimiter:
+    def __init__(self) -> None:
+        self.store = MemoryBucketStore()
+
+    def init_app(self, app: Flask) -> None:
+        if app.config["RATE_LIMIT_STORAGE"] == "sqlite":
+            self.store = SQLiteBucketStore(app.config["RATE_LIMIT_STORAGE_PATH"])
+        else:
+            self.store = MemoryBucketStore()
+
+    def limit(self, name: str, methods: Tuple[str, ...] = ("POST",)) -> Callable:
+        """Декоратор вьюхи; лимиты берутся из RATE_LIMITS[name]."""
+
+        def decorator(view: Callable) -> Callable:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if current_app.config["RATE_LIMIT_ENABLED"] and request.method in methods:
+                    retry_after = self._check(name)
+                    if retry_after:
+                        return _too_many_requests(retry_after)
+                return view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _check(self, name: str) -> float:
+        """0 — можно выполнять, иначе через сколько секунд повторить."""
+        rules = current_app.config["RATE_LIMITS"].get(name)
+        if not rules:
+            return 0
+        buckets = []
+        if "per_user" in rules and current_user.is_authenticated:
+            buckets.append((f"{name}:user:{current_user.id}", *rules["per_user"]))
+        if "per_ip" in rules:
+            buckets.append((f"{name}:ip:{request.remote_addr}", *rules["per_ip"]))
+        if not buckets:
+            return 0
+        _allowed, retry_after = self.store.take(buckets)
+        return retry_after
+
+
+def _too_many_requests(retry_after: float):
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        response = make_response(jsonify({"ok": False, "error": "rate_limited"}), 429)
+    else:
+        response = make_response("Слишком много запросов, попробуйте чуть позже.", 429)
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
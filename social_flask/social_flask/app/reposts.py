@@ -0,0 +1,35 @@
+"""Репосты: переключение по уникальному ключу (original_post_id, user_id).
+
+Тот же приём, что и у лайков (app/likes.py): DELETE/INSERT ... RETURNING
+и UPDATE счётчика Post.reposts_count с возвратом автора.
+"""
+
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+
+from .access import visible_posts
+from .extensions import db
+from .likes import change_counter, delete_link, insert_link
+from .models import Notification, Post, Repost
+
+
+def toggle_repost(post_id: int, user_id: int, actor_name: str) -> Optional[Tuple[bool, int]]:
+    """Переключает репост и коммитит. Возвращает (reposted, reposts_count) или None, если поста нет или он скрыт."""
+    if delete_link(Repost, Repost.original_post_id, post_id, user_id):
+        reposted = False
+    elif insert_link(Repost, Repost.original_post_id, post_id, user_id):
+        reposted = True
+    else:
+        count = db.session.execute(
+            select(Post.reposts_count).where(Post.id == post_id, visible_posts(user_id))
+        ).scalar()
+        db.session.rollback()
+        return None if count is None else (True, count)
+    row = change_counter(post_id, Post.reposts_count, 1 if reposted else -1)
+    if reposted and row.user_id != user_id:
+        db.session.add(
+            Notification(user_id=row.user_id, kind="repost", payload={"from": actor_name, "post_id": post_id})
+        )
+    db.session.commit()
+    return reposted, row[0]
@@ -44,6 +44,95 @@ if (avatarModalEl) {
     });
 }
 
+// Один комментарий (из JSON ответа сервера) в том же виде, что рисует шаблон ленты
+function renderComment(data) {
+    const wrapper = document.createElement('div');
+    wrapper.className = 'mt-2';
+    wrapper.dataset.commentId = data.id;
+    const author = document.createElement('strong');
+    author.textContent = data.author;
+    const time = document.createElement('span');
+    time.className = 'text-muted small';
+    time.textContent = data.time;
+    const body = document.createElement('div');
+    body.textContent = data.body;
+    const reply = document.createElement('button');
+    reply.type = 'button';
+    reply.className = 'btn btn-link btn-sm p-0 js-reply';
+    reply.dataset.id = data.id;
+    reply.dataset.author = data.author;
+    reply.textContent = 'Ответить';
+    wrapper.append(author, ' ', time, body, reply);
+    if (data.replies) {
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'btn btn-link btn-sm p-0 ms-2 js-load-replies';
+        more.dataset.parent = data.id;
+        more.textContent = `Ответы (${data.replies})`;
+        wrapper.append(more);
+    }
+    const replies = document.createElement('div');
+    replies.className = 'ms-4 js-replies';
+    wrapper.append(replies);
+    return wrapper;
+}
+
+// Подгрузка комментариев по курсору: более старые — в начало списка, ответы — под комментарий
+document.addEventListener('click', (e) => {
+    const button = e.target.closest('.js-more-comments, .js-load-replies');
+    if (!button) {
+        return;
+    }
+    const isReplies = button.matches('.js-load-replies');
+    const commentsBox = button.closest('.card-footer').querySelector('.js-comments');
+    const url = new URL(commentsBox.dataset.url, window.location.origin);
+    if (isReplies) {
+        url.searchParams.set('parent', button.dataset.parent);
+    }
+    if (button.dataset.cursor) {
+        url.searchParams.set('before', button.dataset.cursor);
+    }
+    button.disabled = true;
+    fetch(url, { credentials: 'same-origin' })
+        .then((r) => r.json())
+        .then((data) => {
+            // сервер отдаёт от новых к старым, а показываем по порядку: более старые сверху
+            const box = isReplies ? button.parentElement.querySelector(':scope > .js-replies') : commentsBox;
+            data.comments.forEach((item) => {
+                // только что добавленный через форму комментарий уже на странице
+                if (!box.querySelector(`:scope > [data-comment-id="${item.id}"]`)) {
+                    box.prepend(renderComment(item));
+                }
+            });
+            if (data.next_cursor) {
+                button.dataset.cursor = data.next_cursor;
+                button.disabled = false;
+            } else {
+                button.remove();
+            }
+        })
+        .catch((err) => {
+            console.error('comments load failed', err);
+            button.disabled = false;
+        });
+});
+
+// Ответ на комментарий: запоминаем родителя в скрытом поле формы
+document.addEventListener('click', (e) => {
+    const button = e.target.closest('.js-reply');
+    if (!button) {
+        return;
+    }
+    const form = button.closest('.card-footer').querySelector('.js-comment-form');
+    if (!form) {
+        return;
+    }
+    form.querySelector('input[name="parent_id"]').value = button.dataset.id;
+    const input = form.querySelector('input[type="text"], textarea');
+    input.placeholder = `Ответ для ${button.dataset.author}`;
+    input.focus();
+});
+
 // AJAX-действия с постами: лайк, репост, комментарий
 document.addEventListener('submit', (e) => {
     const form = e.target;
@@ -73,6 +162,10 @@ document.addEventListener('submit', (e) => {
                 }
                 // репост
                 if (form.matches('.js-repost-form') && data && data.action) {
+                    const repostCount = form.querySelector('.js-repost-count');
+                    if (repostCount && typeof data.reposts_count !== 'undefined') {
+                        repostCount.textContent = data.reposts_count;
+                    }
                     const card = form.closest('.js-post-card');
                     // если репост удалён и мы в разделе "Мои репосты" — просто убираем карточку
                     if (data.action === 'removed' && card && window.location.pathname.indexOf('my-reposts') !== -1) {
@@ -81,19 +174,22 @@ document.addEventListener('submit', (e) => {
                 }
                 // комментарий
                 if (form.matches('.js-comment-form') && data && data.ok) {
-                    const commentsBox = form.parentElement.querySelector('.js-comments');
+                    const footer = form.parentElement;
+                    const parentBox = data.parent_id
+                        ? footer.querySelector(`[data-comment-id="${data.parent_id}"] > .js-replies`)
+                        : null;
+                    const commentsBox = parentBox || footer.querySelector('.js-comments');
                     if (commentsBox) {
-                        const wrapper = document.createElement('div');
-                        wrapper.className = 'mt-2';
-                        wrapper.innerHTML =
-                            `<strong>${data.author}</strong> ` +
-                            `<span class="text-muted small">${data.time}</span>` +
-                            `<div>${data.body}</div>`;
-                        commentsBox.appendChild(wrapper);
+                        commentsBox.appendChild(renderComment(data));
                     }
                     const input = form.querySelector('input[type="text"], textarea');
                     if (input) {
                         input.value = '';
+                        input.placeholder = 'Комментарий';
+                    }
+                    const parentInput = form.querySelector('input[name="parent_id"]');
+                    if (parentInput) {
+                        parentInput.value = '';
                     }
                 }
             })
@@ -0,0 +1,260 @@
+"""Популярные посты и хэштеги: инкрементальный пересчёт по новым событиям.
+
+Задача `flask trending update` (или `flask trending worker`) читает только
+события с id больше сохранённой отметки (TrendingWatermark): новые
+лайки, комментарии, репосты и посты. Каждое событие добавляет к рейтингу
+поста вес из TRENDING_WEIGHTS, который затухает вдвое каждые
+TRENDING_HALF_LIFE_HOURS.
+
+Рейтинг хранится как log2(Σ вес · 2^((t - EPOCH) / half_life)). Так
+затухание не требует переписывать строки: порядок по колонке score уже
+и есть порядок по текущему рейтингу, и лента «Популярное» — один
+запрос по индексу ix_trending_post_score. Строки, чей текущий рейтинг
+опустился ниже TRENDING_MIN_SCORE, удаляются, и таблица остаётся
+компактной.
+
+Хэштеги (#слово в Post.body) получают те же веса от событий своих постов;
+теги каждого нового поста сохраняются в post_tag, по которой фильтруется
+лента «Популярное» по тегу.
+
+Пачка событий захватывается условным UPDATE отметки (`WHERE last_id =
+:old`) в той же транзакции, что и рейтинги: параллельный пересчёт,
+прочитавший ту же отметку, не изменит ни одной строки и откатится. События
+моложе TRENDING_LAG_SECONDS не читаются, а пачка обрывается на первом
+таком событии: в PostgreSQL строка с меньшим id может закоммититься
+позже строки с бо́льшим, и отметка не должна её перепрыгнуть. Повторный
+лайк или репост той же пары (пользователь, пост) после снятия вес не
+добавляет (trending_seen).
+"""
+
+import math
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import click
+from flask import Flask, current_app
+from sqlalchemy import delete, insert, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db, response_cache
+from .models import Comment, Like, Post, PostTag, Repost, TrendingPost, TrendingSeen, TrendingTag, TrendingWatermark
+from .workers import add_worker_command, run_periodic, start_thread
+
+# точка отсчёта для log-рейтинга; при смене TRENDING_HALF_LIFE_HOURS таблицы нужно пересобрать
+EPOCH = datetime(2024, 1, 1)
+
+TAG_RE = re.compile(r"#(\w{1,50})")
+
+# (источник, модель, колонка поста, вес событий попадает в рейтинг поста,
+#  колонка пользователя, если каждая пара пользователь–пост учитывается один раз)
+SOURCES = (
+    ("post", Post, Post.id, False, None),
+    ("like", Like, Like.post_id, True, Like.user_id),
+    ("comment", Comment, Comment.post_id, True, None),
+    ("repost", Repost, Repost.original_post_id, True, Repost.user_id),
+)
+
+
+def parse_tags(body: Optional[str]) -> List[str]:
+    return sorted({tag.lower() for tag in TAG_RE.findall(body or "")})
+
+
+def _log_add(a: float, b: float) -> float:
+    """log2(2^a + 2^b) без переполнения."""
+    if a == -math.inf:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def _units(moment: datetime) -> float:
+    return (moment - EPOCH).total_seconds() / (current_app.config["TRENDING_HALF_LIFE_HOURS"] * 3600)
+
+
+def current_score(stored: float, now: datetime = None) -> float:
+    """Рейтинг в «весах событий» на момент `now`."""
+    return 2 ** (stored - _units(now or datetime.utcnow()))
+
+
+def _merge(model, key_column, increments: Dict, extra: Dict = None) -> None:
+    """Прибавляет log-приращения к строкам рейтинга (создавая недостающие)."""
+    existing = {
+        getattr(row, key_column.key): row for row in model.query.filter(key_column.in_(list(increments)))
+    }
+    now = datetime.utcnow()
+    for key, value in increments.items():
+        row = existing.get(key)
+        if row is None:
+            row = model(**{key_column.key: key}, score=value)
+            db.session.add(row)
+        else:
+            row.score = _log_add(row.score, value)
+        row.updated_at = now
+        for attr, delta in (extra or {}).get(key, {}).items():
+            setattr(row, attr, (getattr(row, attr) or 0) + delta)
+
+
+def _unseen(source: str, events: List[Tuple[int, int, int, datetime]]):
+    """Отбрасывает события пар (пост, пользователь), уже учтённых раньше, и запоминает новые."""
+    pairs = {(post_id, user_id) for _event_id, post_id, user_id, _created_at in events}
+    seen = set(
+        db.session.execute(
+            select(TrendingSeen.post_id, TrendingSeen.user_id).where(
+                TrendingSeen.source == source,
+                tuple_(TrendingSeen.post_id, TrendingSeen.user_id).in_(list(pairs)),
+            )
+        ).all()
+    )
+    fresh = []
+    for event in events:
+        pair = (event[1], event[2])
+        if pair not in seen:
+            seen.add(pair)
+            fresh.append(event)
+    new_pairs = [{"source": source, "post_id": post_id, "user_id": user_id} for _id, post_id, user_id, _at in fresh]
+    if new_pairs:
+        db.session.execute(insert(TrendingSeen), new_pairs)
+    return fresh
+
+
+def _consume(source: str, model, post_column, scores_posts: bool, user_column) -> int:
+    """Обрабатывает одну пачку событий источника; возвращает их число (0 — догнали или пачку забрал другой)."""
+    config = current_app.config
+    weight = math.log2(config["TRENDING_WEIGHTS"][source])
+    last_id = db.session.execute(
+        select(TrendingWatermark.last_id).where(TrendingWatermark.source == source)
+    ).scalar()
+    rows = db.session.execute(
+        select(model.id, post_column, user_column if user_column is not None else literal(None), model.created_at)
+        .where(model.id > last_id)
+        .order_by(model.id)
+        .limit(config["TRENDING_BATCH_SIZE"])
+    ).all()
+    settled = datetime.utcnow() - timedelta(seconds=config["TRENDING_LAG_SECONDS"])
+    events = []
+    for row in rows:
+        if row[3] is not None and row[3] >= settled:
+            break
+        events.append(row)
+    if not events:
+        db.session.rollback()
+        return 0
+
+    # захват пачки: если отметку уже сдвинул другой пересчёт, ничего не пишем
+    claimed = TrendingWatermark.query.filter(
+        TrendingWatermark.source == source, TrendingWatermark.last_id == last_id
+    ).update({TrendingWatermark.last_id: events[-1][0]}, synchronize_session=False)
+    if not claimed:
+        db.session.rollback()
+        return 0
+    scored = _unseen(source, events) if user_column is not None else events
+
+    post_scores: Dict[int, float] = defaultdict(lambda: -math.inf)
+    for _event_id, post_id, _user_id, created_at in scored:
+        post_scores[post_id] = _log_add(post_scores[post_id], weight + _units(created_at or datetime.utcnow()))
+    bodies = dict(db.session.execute(select(Post.id, Post.body).where(Post.id.in_(list(post_scores)))).all())
+
+    tag_scores: Dict[str, float] = defaultdict(lambda: -math.inf)
+    tag_posts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"posts": 0})
+    post_tags = []
+    for post_id, value in post_scores.items():
+        for tag in parse_tags(bodies.get(post_id)):
+            tag_scores[tag] = _log_add(tag_scores[tag], value)
+            if source == "post":
+                tag_posts[tag]["posts"] += 1
+                post_tags.append({"tag": tag, "post_id": post_id})
+
+    try:
+        if scores_posts:
+            # события по уже удалённым постам пропускаем
+            _merge(TrendingPost, TrendingPost.post_id, {pid: v for pid, v in post_scores.items() if pid in bodies})
+        if tag_scores:
+            _merge(TrendingTag, TrendingTag.tag, tag_scores, tag_posts)
+        if post_tags:
+            # теги старых постов уже записала миграция 13
+            insert_tags = pg_insert if db.session.get_bind().dialect.name == "postgresql" else sqlite_insert
+            db.session.execute(insert_tags(PostTag).on_conflict_do_nothing(index_elements=["tag", "post_id"]), post_tags)
+        # рейтинги и отметка — в одной транзакции: каждое событие учитывается ровно один раз
+        db.session.commit()
+    except IntegrityError:
+        # соседний пересчёт другого источника только что создал ту же строку рейтинга;
+        # отметка откатывается вместе с рейтингами, пачка будет обработана в следующий раз
+        db.session.rollback()
+        current_app.logger.warning("Пачка %s после отметки %s отложена: конфликт записи", source, last_id, exc_info=True)
+        return 0
+    return len(events)
+
+
+def _ensure_watermarks() -> None:
+    """Создаёт недостающие отметки с нулём, чтобы захват пачки всегда был UPDATE."""
+    existing = set(db.session.scalars(select(TrendingWatermark.source)))
+    missing = [source for source, *_rest in SOURCES if source not in existing]
+    if not missing:
+        return
+    try:
+        db.session.add_all(TrendingWatermark(source=source, last_id=0) for source in missing)
+        db.session.commit()
+    except IntegrityError:
+        # их только что создал параллельный пересчёт
+        db.session.rollback()
+
+
+def prune() -> int:
+    """Удаляет строки, чей текущий рейтинг ниже TRENDING_MIN_SCORE."""
+    floor = _units(datetime.utcnow()) + math.log2(current_app.config["TRENDING_MIN_SCORE"])
+    removed = 0
+    for model in (TrendingPost, TrendingTag):
+        removed += db.session.execute(delete(model).where(model.score < floor)).rowcount
+    # учтённые пары нужны, только пока пост в рейтинге
+    db.session.execute(delete(TrendingSeen).where(TrendingSeen.post_id.not_in(select(TrendingPost.post_id))))
+    db.session.commit()
+    return removed
+
+
+def update() -> Dict[str, int]:
+    """Догоняет все источники до конца и чистит устаревшее; возвращает число событий по источникам."""
+    counts = {}
+    _ensure_watermarks()
+    for source, model, post_column, scores_posts, user_column in SOURCES:
+        total = 0
+        while True:
+            consumed = _consume(source, model, post_column, scores_posts, user_column)
+            total += consumed
+            if consumed < current_app.config["TRENDING_BATCH_SIZE"]:
+                break
+        counts[source] = total
+    counts["pruned"] = prune()
+    if any(counts[source] for source, *_rest in SOURCES):
+        response_cache.invalidate("trending")
+    return counts
+
+
+def top_tags(limit: int = 10) -> Iterable[TrendingTag]:
+    return TrendingTag.query.order_by(TrendingTag.score.desc()).limit(limit).all()
+
+
+def run_worker(app: Flask, stop: threading.Event = None) -> None:
+    """Цикл пересчёта раз в TRENDING_INTERVAL секунд."""
+    run_periodic(app, update, "TRENDING_INTERVAL", "Ошибка при пересчёте популярного", stop)
+
+
+def start_worker_thread(app: Flask) -> threading.Event:
+    return start_thread(run_worker, app, "trending")
+
+
+def register_cli(app: Flask) -> None:
+    @app.cli.group("trending")
+    def trending_cli():
+        """Популярные посты и хэштеги."""
+
+    @trending_cli.command("update")
+    def update_command():
+        counts = update()
+        click.echo(", ".join(f"{name}: {value}" for name, value in counts.items()))
+
+    add_worker_command(trending_cli, run_worker, "Пересчёт популярного запущен")
@@ -0,0 +1,61 @@
+"""Общий цикл фоновых воркеров.
+
+Очередь почты, очередь задач, пересчёт популярного и архивация устроены
+одинаково: в контексте приложения вызывается функция-шаг, ошибка
+логируется и откатывает сессию, сессия закрывается, затем пауза.
+Каждый модуль держит свои `run_worker` и `start_worker_thread` — тонкие
+обёртки над функциями отсюда.
+"""
+
+import threading
+import time
+from typing import Callable
+
+import click
+from flask import Flask, current_app
+
+from .extensions import db
+
+
+def run_periodic(
+    app: Flask,
+    step: Callable[[], object],
+    interval_key: str,
+    error_message: str,
+    stop: threading.Event = None,
+    until_idle: bool = False,
+) -> None:
+    """Вызывает `step` раз в app.config[interval_key] секунд, пока не выставлен `stop`.
+
+    С `until_idle` пауза делается только тогда, когда шаг ничего не сделал
+    (вернул 0) — так очереди разбираются без задержек между пачками.
+    """
+    interval = app.config[interval_key]
+    while stop is None or not stop.is_set():
+        with app.app_context():
+            try:
+                result = step()
+            except Exception:
+                app.logger.exception(error_message)
+                db.session.rollback()
+                result = None
+            finally:
+                db.session.remove()
+        if not (until_idle and result):
+            time.sleep(interval)
+
+
+def start_thread(run_worker: Callable[[Flask, threading.Event], None], app: Flask, name: str) -> threading.Event:
+    """Запускает `run_worker` в фоновом потоке — для dev-сервера, где нет отдельного процесса."""
+    stop = threading.Event()
+    threading.Thread(target=run_worker, args=(app, stop), name=name, daemon=True).start()
+    return stop
+
+
+def add_worker_command(group: click.Group, run_worker: Callable[[Flask], None], message: str) -> None:
+    """Добавляет в группу CLI команду `worker`, которая запускает цикл в текущем процессе."""
+
+    @group.command("worker")
+    def worker_command():
+        click.echo(message)
+        run_worker(current_app._get_current_object())
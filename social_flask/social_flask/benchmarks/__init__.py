@@ -0,0 +1 @@
+"""Бенчмарки и нагрузочные сценарии (запуск: python -m benchmarks.<модуль> --help)."""
@@ -0,0 +1,357 @@
+"""Генератор синтетического социального графа для бенчмарков.
+
+Заполняет пустую базу пользователями, дружбой, подписками (степенное
+распределение: немногие популярные авторы собирают большинство
+подписчиков и лайков), постами, лайками, комментариями, репостами, чатами,
+группами и уведомлениями. Строки вставляются пачками через Core INSERT.
+
+    python -m benchmarks.datagen --db instance/bench.db --users 10000
+"""
+
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+CHUNK = 5000
+BENCH_PASSWORD = "bench-password"
+
+
+def make_app(db_path: str):
+    """Приложение с production-настройками поверх отдельного файла БД."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_path)}"
+    from app import create_app
+
+    app = create_app("prod")
+    # все запросы тестового клиента идут с одного IP — лимиты исказили бы замеры
+    app.config.update(WTF_CSRF_ENABLED=False, SERVER_NAME="bench.local", RATE_LIMIT_ENABLED=False)
+    return app
+
+
+class PowerLaw:
+    """Выбор индексов 0..n-1 с весами по закону Парето (индекс 0 не обязательно самый популярный)."""
+
+    def __init__(self, n: int, rng: random.Random, alpha: float = 1.2) -> None:
+        weights = [rng.paretovariate(alpha) for _ in range(n)]
+        self._cum = list(itertools.accumulate(weights))
+        self._total = self._cum[-1]
+        self._rng = rng
+
+    def pick(self) -> int:
+        return bisect.bisect_left(self._cum, self._rng.random() * self._total)
+
+    def sample(self, k: int) -> set:
+        picked = set()
+        # ограничиваем число попыток, чтобы не зациклиться на маленьких графах
+        for _ in range(k * 3):
+            if len(picked) >= k:
+                break
+            picked.add(self.pick())
+        return picked
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    # экспоненциальное приближение: быстро и с «длинным хвостом» активности
+    return int(rng.expovariate(1 / mean)) if mean > 0 else 0
+
+
+def _insert(conn, table, rows) -> int:
+    total = 0
+    for batch in _chunks(rows):
+        conn.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def _chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(
+    users: int,
+    seed: int = 42,
+    follows_per_user: float = 20,
+    friends_per_user: float = 5,
+    posts_per_user: float = 5,
+    likes_per_user: float = 15,
+    comments_per_user: float = 3,
+    reposts_per_user: float = 1,
+    chats_per_user: float = 2,
+    messages_per_chat: float = 20,
+    users_per_group: int = 100,
+    group_posts_per_group: float = 30,
+    notifications_per_user: float = 5,
+) -> dict:
+    """Заполняет базу текущего приложения (нужен app context). Возвращает число строк по таблицам."""
+    from werkzeug.security import generate_password_hash
+
+    from app.extensions import db
+    from app.models import (
+        Chat,
+        ChatMembership,
+        Comment,
+        Group,
+        GroupMember,
+        GroupPost,
+        Like,
+        Message,
+        Notification,
+        Post,
+        Repost,
+        User,
+        followers,
+        friendship,
+    )
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    counts = {}
+    # хэш пароля дорогой — считаем один раз на всех
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    popularity = PowerLaw(users, rng)
+
+    def ago(max_days: float = 365) -> datetime:
+        return now - timedelta(seconds=rng.random() * max_days * 86400)
+
+    with db.engine.begin() as conn:
+        counts["user"] = _insert(
+            conn,
+            User.__table__,
+            (
+                {
+                    "id": i + 1,
+                    "email": f"user{i + 1}@bench.local",
+                    "phone": f"+7{i + 1:010d}",
+                    "password_hash": password_hash,
+                    "name": f"Пользователь {i + 1}",
+                    "date_of_birth": date(1970 + i % 40, 1 + i % 12, 1 + i % 28),
+                    "is_verified": True,
+                    "created_at": ago(),
+                    "privacy_level": rng.choice(["PUBLIC"] * 8 + ["FRIENDS", "PRIVATE"]),
+                }
+                for i in range(users)
+            ),
+        )
+
+        def follow_rows():
+            for uid in range(1, users + 1):
+                for target in popularity.sample(_poisson(rng, follows_per_user)):
+                    if target + 1 != uid:
+                        yield {"follower_id": uid, "followed_id": target + 1, "created_at": ago()}
+
+        counts["followers"] = _insert(conn, followers, follow_rows())
+
+        def friend_rows():
+            seen = set()
+            for uid in range(1, users + 1):
+                for _ in range(_poisson(rng, friends_per_user / 2)):
+                    other = rng.randint(1, users)
+                    pair = (min(uid, other), max(uid, other))
+                    if other != uid and pair not in seen:
+                        seen.add(pair)
+                        yield {"user_id": pair[0], "friend_id": pair[1], "created_at": ago()}
+
+        counts["friendship"] = _insert(conn, friendship, friend_rows())
+
+        post_authors = []
+
+        def post_rows():
+            total_posts = int(users * posts_per_user)
+            for pid in range(1, total_posts + 1):
+                author = popularity.pick() + 1
+                post_authors.append(author)
+                yield {
+                    "id": pid,
+                    "user_id": author,
+                    "body": f"Пост {pid} #тема{pid % 50} " + "текст " * rng.randint(3, 40),
+                    "visibility": rng.choice(["PUBLIC"] * 7 + ["FRIENDS", "FRIENDS", "PRIVATE"]),
+                    "created_at": ago(),
+                }
+
+        counts["post"] = _insert(conn, Post.__table__, post_rows())
+        post_popularity = PowerLaw(max(1, len(post_authors)), rng)
+
+        def like_rows():
+            for uid in range(1, users + 1):
+                for idx in post_popularity.sample(_poisson(rng, likes_per_user)):
+                    yield {"post_id": idx + 1, "user_id": uid, "created_at": ago(30)}
+
+        counts["like"] = _insert(conn, Like.__table__, like_rows())
+        conn.execute(
+            Post.__table__.update().values(
+                likes_count=db.select(db.func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+            )
+        )
+
+        def comment_rows():
+            for uid in range(1, users + 1):
+                for _ in range(_poisson(rng, comments_per_user)):
+                    yield {
+                        "post_id": post_popularity.pick() + 1,
+                        "user_id": uid,
+                        "body": "комментарий " * rng.randint(1, 10),
+                        "created_at": ago(30),
+                    }
+
+        counts["comment"] = _insert(conn, Comment.__table__, comment_rows())
+
+        def repost_rows():
+            for uid in range(1, users + 1):
+                for idx in post_popularity.sample(_poisson(rng, reposts_per_user)):
+                    yield {"original_post_id": idx + 1, "user_id": uid, "created_at": ago(30)}
+
+        counts["repost"] = _insert(conn, Repost.__table__, repost_rows())
+        conn.execute(
+            Post.__table__.update().values(
+                reposts_count=db.select(db.func.count(Repost.id))
+                .where(Repost.original_post_id == Post.id)
+                .scalar_subquery()
+            )
+        )
+
+        pairs = set()
+        for uid in range(1, users + 1):
+            for _ in range(_poisson(rng, chats_per_user / 2)):
+                other = rng.randint(1, users)
+                if other != uid:
+                    pairs.add((min(uid, other), max(uid, other)))
+        pairs = sorted(pairs)
+        counts["chat"] = _insert(
+            conn,
+            Chat.__table__,
+            ({"id": cid, "is_group": False, "created_at": ago()} for cid in range(1, len(pairs) + 1)),
+        )
+        counts["chat_membership"] = _insert(
+            conn,
+            ChatMembership.__table__,
+            (
+                {"chat_id": cid, "user_id": member, "joined_at": ago()}
+                for cid, pair in enumerate(pairs, start=1)
+                for member in pair
+            ),
+        )
+
+        def message_rows():
+            for cid, pair in enumerate(pairs, start=1):
+                started = ago()
+                for n in range(_poisson(rng, messages_per_chat)):
+                    yield {
+                        "chat_id": cid,
+                        "sender_id": rng.choice(pair),
+                        "body": "сообщение " * rng.randint(1, 12),
+                        "created_at": started + timedelta(minutes=n),
+                    }
+
+        counts["message"] = _insert(conn, Message.__table__, message_rows())
+
+        group_count = max(1, users // users_per_group)
+        owners = [popularity.pick() + 1 for _ in range(group_count)]
+        counts["group"] = _insert(
+            conn,
+            Group.__table__,
+            (
+                {
+                    "id": gid,
+                    "name": f"Группа {gid}",
+                    "description": "Описание группы",
+                    "owner_id": owners[gid - 1],
+                    "visibility": rng.choice(["PUBLIC", "PUBLIC", "FRIENDS", "PRIVATE"]),
+                    "created_at": ago(),
+                }
+                for gid in range(1, group_count + 1)
+            ),
+        )
+        group_popularity = PowerLaw(group_count, rng)
+        members = {gid: {owners[gid - 1]} for gid in range(1, group_count + 1)}
+        for uid in range(1, users + 1):
+            for idx in group_popularity.sample(_poisson(rng, 2)):
+                members[idx + 1].add(uid)
+        counts["group_member"] = _insert(
+            conn,
+            GroupMember.__table__,
+            (
+                {"group_id": gid, "user_id": uid, "is_admin": uid == owners[gid - 1], "created_at": ago()}
+                for gid, uids in members.items()
+                for uid in uids
+            ),
+        )
+
+        def group_post_rows():
+            for gid, uids in members.items():
+                authors = sorted(uids)
+                for _ in range(_poisson(rng, group_posts_per_group)):
+                    yield {
+                        "group_id": gid,
+                        "author_id": rng.choice(authors),
+                        "body": "пост в группе " * rng.randint(1, 20),
+                        "created_at": ago(),
+                    }
+
+        counts["group_post"] = _insert(conn, GroupPost.__table__, group_post_rows())
+
+        def notification_rows():
+            for uid in range(1, users + 1):
+                for _ in range(_poisson(rng, notifications_per_user)):
+                    yield {
+                        "user_id": uid,
+                        "kind": rng.choice(["like", "comment", "repost"]),
+                        "payload": {"from": f"Пользователь {rng.randint(1, users)}", "post_id": rng.randint(1, max(1, len(post_authors)))},
+                        "is_read": rng.random() < 0.7,
+                        "created_at": ago(30),
+                    }
+
+        counts["notification"] = _insert(conn, Notification.__table__, notification_rows())
+
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных для бенчмарков")
+    parser.add_argument("--db", default=os.path.join(PROJECT_ROOT, "instance", "bench.db"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--follows", type=float, default=20, help="среднее число подписок на пользователя")
+    parser.add_argument("--posts", type=float, default=5, help="среднее число постов на пользователя")
+    parser.add_argument("--likes", type=float, default=15, help="среднее число лайков от пользователя")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    app = make_app(args.db)
+
+    from app import migrations, trending
+    from app.extensions import db
+
+    started = time.perf_counter()
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        counts = generate(
+            args.users, seed=args.seed, follows_per_user=args.follows, posts_per_user=args.posts, likes_per_user=args.likes
+        )
+        # вкладка «Популярное» читает готовую таблицу — наполняем её так же, как воркер
+        events = trending.update()
+        counts["trending_events"] = sum(events[source] for source, *_rest in trending.SOURCES)
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"  {table:<16} {count:>10}")
+    print(f"Готово за {elapsed:.1f} с: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
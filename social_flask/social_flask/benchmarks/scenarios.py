@@ -0,0 +1,165 @@
+"""Нагрузочные сценарии через тестовый клиент Flask.
+
+Каждый сценарий — один типичный запрос от случайного пользователя.
+Для каждого печатаются p50/p99 задержки, пропускная способность и
+среднее/максимальное число SQL-запросов (из app/instrumentation.py).
+
+    python -m benchmarks.datagen --db instance/bench.db --users 10000
+    python -m benchmarks.scenarios --db instance/bench.db --requests 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.datagen import make_app  # noqa: E402
+
+XHR = {"X-Requested-With": "XMLHttpRequest"}
+
+
+class Context:
+    """Границы id в сгенерированной базе, чтобы выбирать случайные объекты."""
+
+    def __init__(self) -> None:
+        from app.extensions import db
+        from app.models import Group, Post, User, Visibility
+
+        self.max_user = db.session.query(db.func.max(User.id)).scalar() or 1
+        self.max_post = db.session.query(db.func.max(Post.id)).scalar() or 1
+        # лайкать и комментировать можно только видимые посты (app/access.py), берём публичные
+        self.public_posts = [
+            post_id for (post_id,) in db.session.query(Post.id).filter(Post.visibility == Visibility.PUBLIC)
+        ] or [1]
+        self.max_group = db.session.query(db.func.max(Group.id)).scalar() or 1
+
+
+def _login(client, user_id: int) -> None:
+    # минуем проверку пароля: она специально медленная и не то, что мы меряем
+    with client.session_transaction() as sess:
+        sess["_user_id"] = str(user_id)
+        sess["_fresh"] = True
+
+
+def feed(client, ctx, rng):
+    return client.get("/")
+
+
+def trending(client, ctx, rng):
+    return client.get("/trending")
+
+
+def like(client, ctx, rng):
+    return client.post(f"/post/{rng.choice(ctx.public_posts)}/like", headers=XHR)
+
+
+def comment(client, ctx, rng):
+    return client.post(f"/post/{rng.choice(ctx.public_posts)}/comment", data={"body": "бенчмарк"}, headers=XHR)
+
+
+def direct_read(client, ctx, rng):
+    return client.get(f"/messages/with/{rng.randint(1, ctx.max_user)}")
+
+
+def direct_send(client, ctx, rng):
+    return client.post(f"/messages/with/{rng.randint(1, ctx.max_user)}", data={"body": "привет"})
+
+
+def inbox(client, ctx, rng):
+    return client.get("/messages/")
+
+
+def group_detail(client, ctx, rng):
+    return client.get(f"/groups/{rng.randint(1, ctx.max_group)}")
+
+
+SCENARIOS = {
+    "feed": feed,
+    "trending": trending,
+    "like": like,
+    "comment": comment,
+    "direct_read": direct_read,
+    "direct_send": direct_send,
+    "inbox": inbox,
+    "group_detail": group_detail,
+}
+
+
+def _percentile(values, q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def run_scenario(app, name: str, requests: int, users: int, seed: int) -> dict:
+    from app.extensions import instrumentation
+
+    rng = random.Random(seed)
+    scenario = SCENARIOS[name]
+    with app.app_context():
+        ctx = Context()
+    clients = []
+    for _ in range(min(users, ctx.max_user)):
+        client = app.test_client()
+        _login(client, rng.randint(1, ctx.max_user))
+        clients.append(client)
+
+    instrumentation.reset()
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        client = rng.choice(clients)
+        t0 = time.perf_counter()
+        response = scenario(client, ctx, rng)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    stats = instrumentation.snapshot()
+    total_requests = sum(s["requests"] for s in stats.values()) or 1
+    return {
+        "scenario": name,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": _percentile(latencies, 50),
+        "p99_ms": _percentile(latencies, 99),
+        "rps": requests / elapsed,
+        "queries_avg": sum(s["queries"] for s in stats.values()) / total_requests,
+        "queries_max": max((s["max_queries"] for s in stats.values()), default=0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочные сценарии")
+    parser.add_argument("--db", default=os.path.join(PROJECT_ROOT, "instance", "bench.db"))
+    parser.add_argument("--requests", type=int, default=300, help="запросов на сценарий")
+    parser.add_argument("--users", type=int, default=50, help="сколько разных пользователей делают запросы")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="по умолчанию — все")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"нет базы {args.db}, сначала запустите python -m benchmarks.datagen")
+    app = make_app(args.db)
+
+    header = f"{'сценарий':<14}{'запросов':>9}{'ошибок':>8}{'p50, мс':>10}{'p99, мс':>10}{'RPS':>9}{'SQL ср.':>9}{'SQL макс':>10}"
+    print(header)
+    print("-" * len(header))
+    for name in args.scenario or list(SCENARIOS):
+        r = run_scenario(app, name, args.requests, args.users, args.seed)
+        print(
+            f"{r['scenario']:<14}{r['requests']:>9}{r['errors']:>8}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+            f"{r['rps']:>9.1f}{r['queries_avg']:>9.1f}{r['queries_max']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
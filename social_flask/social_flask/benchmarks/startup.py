@@ -0,0 +1,62 @@
+"""Замер времени холодного старта `create_app("prod")`.
+
+Каждый прогон — отдельный процесс, чтобы учитывать импорт модулей так же,
+как при перезапуске воркера во время деплоя.
+
+    python benchmarks/startup.py --runs 20 --config prod
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = """
+import time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+create_app({config!r})
+t2 = time.perf_counter()
+print(f"{{t1 - t0:.6f}} {{t2 - t1:.6f}}")
+"""
+
+
+def run_once(config_name: str) -> tuple:
+    out = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(config=config_name)],
+        cwd=PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    import_s, create_s = (float(x) for x in out.split())
+    return import_s, create_s
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--config", default="prod")
+    args = parser.parse_args()
+
+    imports, creates = [], []
+    for _ in range(args.runs):
+        import_s, create_s = run_once(args.config)
+        imports.append(import_s * 1000)
+        creates.append(create_s * 1000)
+
+    totals = [a + b for a, b in zip(imports, creates)]
+    print(f"create_app({args.config!r}), прогонов: {args.runs}")
+    for label, values in (("импорт", imports), ("create_app", creates), ("всего", totals)):
+        print(
+            f"  {label:<10} median={statistics.median(values):8.2f} ms"
+            f"  min={min(values):8.2f} ms  max={max(values):8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,19 +13,134 @@ class BaseConfig:
     MAIL_PORT = int(os.environ.get("MAIL_PORT", 8025))
     MAIL_USE_TLS = False
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "noreply@social.local")
+    # Очередь писем (app/mail_queue.py)
+    MAIL_QUEUE_BATCH_SIZE = int(os.environ.get("MAIL_QUEUE_BATCH_SIZE", 50))
+    MAIL_QUEUE_POLL_INTERVAL = float(os.environ.get("MAIL_QUEUE_POLL_INTERVAL", 2))
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get("MAIL_QUEUE_MAX_ATTEMPTS", 8))
+    MAIL_QUEUE_RETRY_BASE = float(os.environ.get("MAIL_QUEUE_RETRY_BASE", 30))
+    MAIL_QUEUE_RETRY_MAX = float(os.environ.get("MAIL_QUEUE_RETRY_MAX", 3600))
+    MAIL_QUEUE_LEASE = float(os.environ.get("MAIL_QUEUE_LEASE", 300))
+    # Разбирать очередь в потоке dev-сервера (в production — `flask mail worker`)
+    MAIL_QUEUE_IN_PROCESS = False
+    # Фоновые задачи (app/jobs.py): выгрузка архива пользователя и т.п.
+    JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", 2))
+    JOBS_LEASE = float(os.environ.get("JOBS_LEASE", 600))
+    # Выполнять задачи в потоке dev-сервера (в production — `flask jobs worker`)
+    JOBS_IN_PROCESS = False
+    # Архивы с данными пользователей (app/exports.py) и размер пачки при чтении
+    EXPORT_DIR = os.environ.get("EXPORT_DIR", os.path.join(os.path.dirname(__file__), "instance", "exports"))
+    EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 500))
+    # Популярное (app/trending.py): веса событий, период полураспада рейтинга
+    # (при смене пересоберите таблицы trending_*), порог удаления и частота пересчёта
+    TRENDING_WEIGHTS = {"post": 1.0, "like": 1.0, "comment": 2.0, "repost": 3.0}
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", 12))
+    TRENDING_MIN_SCORE = float(os.environ.get("TRENDING_MIN_SCORE", 0.05))
+    TRENDING_BATCH_SIZE = int(os.environ.get("TRENDING_BATCH_SIZE", 5000))
+    TRENDING_INTERVAL = float(os.environ.get("TRENDING_INTERVAL", 60))
+    # события моложе этого не читаются: в PostgreSQL строки коммитятся не в порядке id
+    TRENDING_LAG_SECONDS = float(os.environ.get("TRENDING_LAG_SECONDS", 5))
+    # Пересчитывать в потоке dev-сервера (в production — `flask trending worker` или cron с `update`)
+    TRENDING_IN_PROCESS = False
+    # Удаление аккаунта (app/deletion.py): строк в одной транзакции DELETE
+    DELETE_BATCH_SIZE = int(os.environ.get("DELETE_BATCH_SIZE", 500))
+    # Архив (app/archive.py): сообщения и прочитанные уведомления старше срока переносятся
+    # в сжатые сегменты по ARCHIVE_SEGMENT_SIZE строк
+    ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+    ARCHIVE_SEGMENT_SIZE = int(os.environ.get("ARCHIVE_SEGMENT_SIZE", 500))
+    ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", 3600))
+    # Архивировать в потоке dev-сервера (в production — `flask archive worker` или cron с `run`)
+    ARCHIVE_IN_PROCESS = False
+    # Сообщений на странице переписки
+    MESSAGES_PAGE_SIZE = int(os.environ.get("MESSAGES_PAGE_SIZE", 50))
     OAUTH_GOOGLE_CLIENT_ID = os.environ.get("OAUTH_GOOGLE_CLIENT_ID", "")
     OAUTH_GOOGLE_CLIENT_SECRET = os.environ.get("OAUTH_GOOGLE_CLIENT_SECRET", "")
     OAUTH_FACEBOOK_CLIENT_ID = os.environ.get("OAUTH_FACEBOOK_CLIENT_ID", "")
     OAUTH_FACEBOOK_CLIENT_SECRET = os.environ.get("OAUTH_FACEBOOK_CLIENT_SECRET", "")
+    # Применять миграции при старте процесса (удобно локально, в production — `flask db upgrade`)
+    AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "0") == "1"
+    # Адрес и параметры сервера (run.py и gunicorn.conf.py)
+    SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.environ.get("SERVER_PORT", 5000))
+    WEB_WORKERS = int(os.environ.get("WEB_WORKERS", (os.cpu_count() or 1) * 2 + 1))
+    WEB_THREADS = int(os.environ.get("WEB_THREADS", 4))
+    WEB_TIMEOUT = int(os.environ.get("WEB_TIMEOUT", 30))
+    WEB_GRACEFUL_TIMEOUT = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+    WEB_MAX_REQUESTS = int(os.environ.get("WEB_MAX_REQUESTS", 2000))
+    # Кэш текущего пользователя в load_user (на процесс)
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+    # Кэш ответов для анонимных посетителей: memory | filesystem | redis | null
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 30))
+    RESPONSE_CACHE_DIR = os.environ.get(
+        "RESPONSE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "instance", "response_cache")
+    )
+    # как часто (сек) filesystem-бэкенд удаляет файлы с истёкшим сроком
+    RESPONSE_CACHE_SWEEP_INTERVAL = float(os.environ.get("RESPONSE_CACHE_SWEEP_INTERVAL", 60))
+    RESPONSE_CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    REPOSTS_PER_PAGE = 20
+    # Комментарии в ленте: сколько последних показывать сразу и сколько подгружать за раз
+    COMMENTS_PREVIEW = 3
+    COMMENTS_PAGE_SIZE = 20
+    # Окно склейки переключений лайков в памяти, мс (0 — писать сразу)
+    LIKE_COALESCE_MS = int(os.environ.get("LIKE_COALESCE_MS", 0))
+    # Кэш отрендеренных карточек постов (ключ содержит версию поста)
+    FRAGMENT_CACHE_TTL = float(os.environ.get("FRAGMENT_CACHE_TTL", 600))
+    # Байткод скомпилированных шаблонов Jinja ("" — не кэшировать)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get(
+        "JINJA_BYTECODE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "instance", "jinja_cache")
+    )
+    PRECOMPILE_TEMPLATES = True
+    # Замеры запросов (app/instrumentation.py) и /metrics для Prometheus
+    INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "1") == "1"
+    # В production без токена /metrics отвечает 404
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+    # Каталог, где воркеры gunicorn складывают свои счётчики для общего /metrics ("" — только свой процесс)
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(os.path.dirname(__file__), "instance", "metrics"))
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1))
+    SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+    # Бюджеты SQL-запросов по эндпоинтам, например {"main.feed": 5}
+    QUERY_BUDGETS = {}
+    # Превышение бюджета — ошибка (в тестах), иначе только метрика
+    QUERY_BUDGET_STRICT = False
+    # Ограничение частоты записей (app/ratelimit.py): (ёмкость ведра, пополнение в секунду).
+    # За обратным прокси request.remote_addr должен быть настоящим адресом (ProxyFix).
+    RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+    # memory — в каждом процессе своё состояние, sqlite — общий файл для всех воркеров
+    RATE_LIMIT_STORAGE = os.environ.get("RATE_LIMIT_STORAGE", "memory")
+    RATE_LIMIT_STORAGE_PATH = os.environ.get(
+        "RATE_LIMIT_STORAGE_PATH", os.path.join(os.path.dirname(__file__), "instance", "ratelimit.db")
+    )
+    RATE_LIMITS = {
+        "like": {"per_user": (20, 1.0), "per_ip": (60, 3.0)},
+        "comment": {"per_user": (10, 0.2), "per_ip": (30, 1.0)},
+        "repost": {"per_user": (10, 0.2), "per_ip": (30, 1.0)},
+        "message": {"per_user": (20, 0.5), "per_ip": (60, 2.0)},
+        "group_post": {"per_user": (5, 0.1), "per_ip": (20, 0.5)},
+    }
 
 
 class DevConfig(BaseConfig):
     DEBUG = True
+    AUTO_MIGRATE = True
+    PRECOMPILE_TEMPLATES = False
+    MAIL_QUEUE_IN_PROCESS = True
+    JOBS_IN_PROCESS = True
+    TRENDING_IN_PROCESS = True
+    ARCHIVE_IN_PROCESS = True
+    # dev-сервер — один процесс, складывать нечего
+    METRICS_DIR = ""
 
 
 class TestConfig(BaseConfig):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = "sqlite://"
+    AUTO_MIGRATE = True
+    PRECOMPILE_TEMPLATES = False
+    JINJA_BYTECODE_CACHE_DIR = ""
+    QUERY_BUDGET_STRICT = True
+    METRICS_DIR = ""
+    TRENDING_LAG_SECONDS = 0
 
 
 config_by_name = dict(dev=DevConfig, test=TestConfig, prod=BaseConfig)
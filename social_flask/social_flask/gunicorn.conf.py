@@ -0,0 +1,49 @@
+"""Настройки gunicorn: pre-fork воркеры с потоками.
+
+Значения берутся из config.py (и, соответственно, из переменных окружения).
+Приложение создаётся один раз в мастер-процессе (preload_app) и наследуется
+воркерами через fork. Поэтому `kill -HUP <pid мастера>` перезапускает воркеры
+со старым кодом — новый код он не подхватывает.
+
+Выкладка нового кода без потери запросов:
+    kill -USR2 <pid мастера>    # новый мастер с новым кодом и его воркеры
+    kill -WINCH <pid старого>   # старые воркеры дорабатывают запросы и выходят
+    kill -QUIT <pid старого>    # старый мастер завершается
+PID старого мастера после USR2 лежит в <pidfile>.oldbin (если задан --pid).
+"""
+
+import os
+
+from config import config_by_name
+
+_settings = config_by_name.get(os.environ.get("APP_CONFIG", "prod"), config_by_name["prod"])
+
+bind = f"{_settings.SERVER_HOST}:{_settings.SERVER_PORT}"
+workers = _settings.WEB_WORKERS
+threads = _settings.WEB_THREADS
+worker_class = "gthread"
+timeout = _settings.WEB_TIMEOUT
+graceful_timeout = _settings.WEB_GRACEFUL_TIMEOUT
+# периодический перезапуск воркеров, со сдвигом, чтобы не перезапускались все разом
+max_requests = _settings.WEB_MAX_REQUESTS
+max_requests_jitter = max(1, _settings.WEB_MAX_REQUESTS // 10)
+preload_app = True
+accesslog = "-"
+
+
+def on_starting(server):
+    # воркеры складывают счётчики /metrics в METRICS_DIR (app/instrumentation.py);
+    # файлы прошлого запуска убираем, иначе они суммировались бы с новыми
+    directory = _settings.METRICS_DIR
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def post_fork(server, worker):
+    # Соединения пула, открытые в мастере до fork, нельзя делить между процессами
+    from app.extensions import db
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,9 +1,23 @@
-from app import create_app, ensure_dirs
+import os
 
-app = create_app()
+from app import archive, create_app, ensure_dirs, jobs, mail_queue, trending
+
+app = create_app(os.environ.get("APP_CONFIG", "dev"))
 ensure_dirs()
 
 if __name__ == "__main__":
-    # Запускаем сервер напрямую на локальном IP, чтобы основным адресом был 192.168.0.105:5000
-    app.run(host="192.168.0.105", port=5000, debug=True)
-
+    # С debug=True reloader Werkzeug выполняет этот модуль дважды: в наблюдающем
+    # процессе и в дочернем, который обслуживает запросы. Фоновые потоки нужны
+    # только в дочернем, иначе каждый воркер работал бы в двух экземплярах.
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if app.config["MAIL_QUEUE_IN_PROCESS"]:
+            mail_queue.start_worker_thread(app)
+        if app.config["JOBS_IN_PROCESS"]:
+            jobs.start_worker_thread(app)
+        if app.config["TRENDING_IN_PROCESS"]:
+            trending.start_worker_thread(app)
+        if app.config["ARCHIVE_IN_PROCESS"]:
+            archive.start_worker_thread(app)
+    # Только для разработки. В production: gunicorn -c gunicorn.conf.py wsgi:app
+    # Адрес задаётся через SERVER_HOST/SERVER_PORT (например, SERVER_HOST=192.168.0.105).
+    app.run(host=app.config["SERVER_HOST"], port=app.config["SERVER_PORT"], debug=app.debug)
@@ -0,0 +1,90 @@
+"""Общие фикстуры: приложение на конфиге 'test' (SQLite в памяти), клиент и пользователи.
+
+Запуск из каталога с config.py:
+
+    python -m pytest -q
+"""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+from flask.testing import FlaskClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Post, User, Visibility, friendship  # noqa: E402
+
+PASSWORD = "secret1"
+XHR = {"X-Requested-With": "XMLHttpRequest"}
+
+
+class Client(FlaskClient):
+    """Каждый запрос — в своём контексте приложения, как в настоящем сервере.
+
+    Иначе запрос переиспользует контекст теста, и flask.g (а с ним
+    пользователь Flask-Login и граф зрителя) переходит из запроса одного
+    клиента в запрос другого.
+    """
+
+    def open(self, *args, **kwargs):
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def app():
+    app = create_app("test")
+    app.config.update(WTF_CSRF_ENABLED=False, RATE_LIMIT_ENABLED=False)
+    app.test_client_class = Client
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(name: str, phone: str) -> User:
+    user = User(email=f"{phone}@example.com", phone=phone, name=name, date_of_birth=date(2000, 1, 1))
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_post(author: User, body: str = "пост", visibility: Visibility = Visibility.PUBLIC) -> Post:
+    post = Post(user_id=author.id, body=body, visibility=visibility)
+    db.session.add(post)
+    db.session.commit()
+    return post
+
+
+def befriend(a: User, b: User) -> None:
+    db.session.execute(friendship.insert().values(user_id=a.id, friend_id=b.id))
+    db.session.commit()
+
+
+def login(client, user: User) -> None:
+    response = client.post("/auth/login", data={"phone": user.phone, "password": PASSWORD})
+    assert response.status_code == 302
+
+
+@pytest.fixture
+def alice(app):
+    return make_user("Алиса", "100")
+
+
+@pytest.fixture
+def bob(app):
+    return make_user("Боб", "200")
+
+
+@pytest.fixture
+def carol(app):
+    return make_user("Кэрол", "300")
@@ -0,0 +1,66 @@
+"""Матрица видимости: SQL-условие (лента) и проверка объекта (страница комментариев) должны совпадать."""
+
+import pytest
+
+from app.extensions import db
+from app.models import Group, GroupMember, Visibility
+
+from conftest import befriend, login, make_post
+
+VISIBILITIES = [Visibility.PUBLIC, Visibility.FRIENDS, Visibility.PRIVATE]
+
+# кто видит пост каждого уровня
+EXPECTED = {
+    "anonymous": {Visibility.PUBLIC},
+    "stranger": {Visibility.PUBLIC},
+    "friend": {Visibility.PUBLIC, Visibility.FRIENDS},
+    "author": set(VISIBILITIES),
+}
+
+
+@pytest.fixture
+def posts(alice, bob):
+    # дружба записана в одну сторону (Боб → Алиса) и должна действовать в обе
+    befriend(bob, alice)
+    return {visibility: make_post(alice, f"пост-{visibility.value}", visibility) for visibility in VISIBILITIES}
+
+
+def as_viewer(client, viewer, alice, bob, carol):
+    users = {"stranger": carol, "friend": bob, "author": alice}
+    if viewer in users:
+        login(client, users[viewer])
+
+
+@pytest.mark.parametrize("viewer", list(EXPECTED))
+def test_feed_visibility(client, posts, alice, bob, carol, viewer):
+    as_viewer(client, viewer, alice, bob, carol)
+    html = client.get("/").get_data(as_text=True)
+    shown = {visibility for visibility, post in posts.items() if post.body in html}
+    assert shown == EXPECTED[viewer]
+
+
+@pytest.mark.parametrize("viewer", list(EXPECTED))
+def test_post_page_visibility(client, posts, alice, bob, carol, viewer):
+    as_viewer(client, viewer, alice, bob, carol)
+    for visibility, post in posts.items():
+        status = client.get(f"/post/{post.id}/comments").status_code
+        assert status == (200 if visibility in EXPECTED[viewer] else 404), visibility
+
+
+@pytest.fixture
+def private_group(alice, bob):
+    group = Group(name="Закрытая", owner_id=alice.id, visibility=Visibility.PRIVATE)
+    db.session.add(group)
+    db.session.flush()
+    db.session.add(GroupMember(group_id=group.id, user_id=bob.id))
+    db.session.commit()
+    return group
+
+
+@pytest.mark.parametrize("viewer, status", [("author", 200), ("friend", 200), ("stranger", 404)])
+def test_private_group(client, private_group, alice, bob, carol, viewer, status):
+    # здесь «friend» — участник группы: закрытая группа видна владельцу и участникам
+    as_viewer(client, viewer, alice, bob, carol)
+    assert client.get(f"/groups/{private_group.id}").status_code == status
+    listed = "Закрытая" in client.get("/groups/").get_data(as_text=True)
+    assert listed == (status == 200)
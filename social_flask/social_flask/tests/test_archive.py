@@ -0,0 +1,103 @@
+"""Архив сообщений и уведомлений: перенос в сегменты, чтение переписки через границу архива."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import archive
+from app.extensions import db
+from app.models import Chat, ChatMembership, Message, MessageSegment, Notification, NotificationSegment
+
+from conftest import login
+
+NOW = datetime.utcnow()
+OLD = NOW - timedelta(days=400)
+
+
+@pytest.fixture(autouse=True)
+def small_segments(app):
+    app.config.update(ARCHIVE_SEGMENT_SIZE=3, MESSAGES_PAGE_SIZE=4)
+
+
+@pytest.fixture
+def chat(alice, bob):
+    chat = Chat(is_group=False)
+    db.session.add(chat)
+    db.session.flush()
+    db.session.add_all([ChatMembership(chat_id=chat.id, user_id=user.id) for user in (alice, bob)])
+    # 7 старых сообщений попеременно от Алисы и Боба и 2 свежих
+    for i in range(9):
+        sender = alice if i % 2 == 0 else bob
+        db.session.add(
+            Message(chat_id=chat.id, sender_id=sender.id, body=f"сообщение {i}", created_at=OLD if i < 7 else NOW)
+        )
+    db.session.commit()
+    return chat
+
+
+def test_run_moves_old_prefix_to_segments(chat):
+    assert archive.run() == {"messages": 7, "notifications": 0}
+    assert [m.body for m in Message.query.order_by(Message.id)] == ["сообщение 7", "сообщение 8"]
+    assert [s.count for s in MessageSegment.query.order_by(MessageSegment.first_id)] == [3, 3, 1]
+    assert archive.run() == {"messages": 0, "notifications": 0}
+
+
+def test_chat_messages_pages_across_segments(chat):
+    archive.run()
+    bodies, before = [], None
+    while True:
+        page, has_more = archive.chat_messages(chat.id, 4, before)
+        bodies = [m.body for m in page] + bodies
+        if not has_more:
+            break
+        before = page[0].id
+    assert bodies == [f"сообщение {i}" for i in range(9)]
+
+
+def test_direct_page_reads_archive(client, chat, alice, bob):
+    archive.run()
+    login(client, alice)
+    page = client.get(f"/messages/with/{bob.id}").get_data(as_text=True)
+    assert "сообщение 8" in page and "сообщение 5" in page and "сообщение 4" not in page
+    first_shown = archive.chat_messages(chat.id, 4)[0][0].id
+    older = client.get(f"/messages/with/{bob.id}?before={first_shown}").get_data(as_text=True)
+    assert "сообщение 4" in older and "сообщение 1" in older
+
+
+def test_message_counts_include_archive(client, chat, alice):
+    archive.run()
+    assert archive.message_counts([chat.id, 999]) == {chat.id: 9, 999: 0}
+    login(client, alice)
+    assert '<span class="badge text-bg-light">9</span>' in client.get("/messages/").get_data(as_text=True)
+
+
+def test_claim_lost_to_concurrent_run(chat):
+    ids = [m.id for m in Message.query.order_by(Message.id).limit(3)]
+    # соседний запуск уже забрал одну строку пачки
+    Message.query.filter(Message.id == ids[0]).delete()
+    db.session.commit()
+    assert archive._claim(Message, ids) is False
+    assert Message.query.filter(Message.id.in_(ids)).count() == 2
+
+
+def test_only_old_read_notifications_archived(alice):
+    db.session.add_all(
+        [
+            Notification(user_id=alice.id, kind="like", payload={}, is_read=True, created_at=OLD),
+            Notification(user_id=alice.id, kind="like", payload={}, is_read=False, created_at=OLD),
+            Notification(user_id=alice.id, kind="like", payload={}, is_read=True),
+        ]
+    )
+    db.session.commit()
+    assert archive.run()["notifications"] == 1
+    assert Notification.query.count() == 2
+    assert [len(rows) for rows in archive.notification_archive_rows(alice.id)] == [1]
+    assert NotificationSegment.query.one().count == 1
+
+
+def test_forget_sender_rewrites_segments(chat, bob):
+    archive.run()
+    assert archive.forget_sender([chat.id], bob.id) == 3
+    remaining = [row for rows in archive.message_archive_rows([chat.id]) for row in rows]
+    assert [row["body"] for row in remaining] == ["сообщение 0", "сообщение 2", "сообщение 4", "сообщение 6"]
+    assert sum(s.count for s in MessageSegment.query) == 4
@@ -0,0 +1,68 @@
+"""Кэш ответов анонимам: HIT/MISS, ETag и 304, инвалидация и очистка файлового хранилища."""
+
+import os
+
+from app.caching import FileSystemBackend, TTLCache
+
+from conftest import XHR, login, make_post
+
+
+def test_anonymous_feed_cached_with_etag(client, alice):
+    make_post(alice, "первый пост")
+    first = client.get("/")
+    assert first.headers["X-Cache"] == "MISS"
+    assert "public" in first.headers["Cache-Control"]
+    assert client.get("/").headers["X-Cache"] == "HIT"
+
+    etag = first.headers["ETag"]
+    assert client.get("/", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_logged_in_feed_not_shared(client, alice):
+    login(client, alice)
+    response = client.get("/")
+    assert "X-Cache" not in response.headers
+    assert "private" in response.headers["Cache-Control"]
+
+
+def test_new_post_and_comment_invalidate_anonymous_feed(app, client, alice, bob):
+    post = make_post(alice, "пост для обсуждения")
+    assert "пост для обсуждения" in client.get("/").get_data(as_text=True)
+
+    author = app.test_client()
+    login(author, bob)
+    assert author.post(f"/post/{post.id}/comment", data={"body": "свежий комментарий"}, headers=XHR).json["ok"]
+    response = client.get("/")
+    assert response.headers["X-Cache"] == "MISS"
+    assert "свежий комментарий" in response.get_data(as_text=True)
+
+    author.post("/post", data={"body": "второй пост", "media_type": "none", "visibility": "public"})
+    assert "второй пост" in client.get("/").get_data(as_text=True)
+
+
+def test_filesystem_backend_sweeps_expired_files(tmp_path):
+    backend = FileSystemBackend(str(tmp_path), sweep_interval=3600)
+    backend.set("старый", b"1", ttl=-1)
+    backend.set("живой", b"2", ttl=60)
+    # незаконченная запись соседнего процесса не трогается
+    (tmp_path / f"{FileSystemBackend.TMP_PREFIX}пишется").write_bytes(b"")
+    assert backend.sweep() == 1
+    assert backend.get("живой") == b"2"
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_filesystem_backend_sweeps_on_set(tmp_path):
+    backend = FileSystemBackend(str(tmp_path), sweep_interval=0)
+    for i in range(5):
+        backend.set(f"ключ{i}", b"x", ttl=-1)
+    backend.set("живой", b"2", ttl=60)
+    assert os.listdir(tmp_path) == [os.path.basename(backend._path("живой"))]
+
+
+def test_ttl_cache_evicts_oldest():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
@@ -0,0 +1,85 @@
+"""Комментарии: курсорная пагинация, границы limit и проверка формы до запросов к базе."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.extensions import db
+from app.models import Comment, Visibility
+
+from conftest import XHR, login, make_post
+
+
+@pytest.fixture
+def thread(alice, bob):
+    post = make_post(alice)
+    start = datetime(2024, 1, 1)
+    # часть комментариев с одинаковым временем: порядок держится на id
+    for i in range(45):
+        db.session.add(
+            Comment(post_id=post.id, user_id=bob.id, body=f"к{i}", created_at=start + timedelta(minutes=i // 3))
+        )
+    db.session.commit()
+    return post
+
+
+def page(client, post_id, **params):
+    response = client.get(f"/post/{post_id}/comments", query_string=params)
+    assert response.status_code == 200
+    return response.json
+
+
+def test_cursor_walks_all_comments(client, app, thread):
+    size = app.config["COMMENTS_PAGE_SIZE"]
+    seen, cursor, pages = [], None, 0
+    while True:
+        data = page(client, thread.id, **({"before": cursor} if cursor else {}))
+        seen.extend(comment["body"] for comment in data["comments"])
+        pages += 1
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == -(-45 // size)
+    assert seen == [f"к{i}" for i in reversed(range(45))]
+
+
+@pytest.mark.parametrize("limit, expected", [(0, 1), (-5, 1), (3, 3), (10_000, None)])
+def test_limit_bounds(client, app, thread, limit, expected):
+    data = page(client, thread.id, limit=limit)
+    assert len(data["comments"]) == (expected or app.config["COMMENTS_PAGE_SIZE"])
+
+
+def test_bad_cursor(client, thread):
+    assert client.get(f"/post/{thread.id}/comments", query_string={"before": "мусор"}).status_code == 400
+
+
+def test_replies_page(client, alice, bob, thread):
+    parent = Comment.query.filter_by(post_id=thread.id, body="к44").one()
+    db.session.add(Comment(post_id=thread.id, user_id=alice.id, parent_id=parent.id, body="ответ"))
+    db.session.commit()
+    data = page(client, thread.id, parent=parent.id)
+    assert [comment["body"] for comment in data["comments"]] == ["ответ"]
+    # ответ не попадает в ленту верхнего уровня, но учтён в счётчике родителя
+    top = page(client, thread.id)["comments"]
+    assert top[0]["body"] == "к44" and top[0]["replies"] == 1
+
+
+def test_invalid_form_rejected_before_lookup(client, bob):
+    login(client, bob)
+    # пустое тело отклоняется формой, до поиска поста: 400, а не 404
+    assert client.post("/post/999/comment", data={"body": ""}, headers=XHR).status_code == 400
+
+
+def test_reply_to_comment_of_other_post(client, alice, bob, thread):
+    other = make_post(alice)
+    parent = Comment.query.filter_by(post_id=thread.id).first()
+    login(client, bob)
+    response = client.post(f"/post/{other.id}/comment", data={"body": "ответ", "parent_id": str(parent.id)}, headers=XHR)
+    assert response.status_code == 400
+
+
+def test_comment_and_page_respect_visibility(client, alice, bob):
+    post = make_post(alice, visibility=Visibility.PRIVATE)
+    login(client, bob)
+    assert client.post(f"/post/{post.id}/comment", data={"body": "привет"}, headers=XHR).status_code == 404
+    assert client.get(f"/post/{post.id}/comments").status_code == 404
@@ -0,0 +1,80 @@
+"""Удаление аккаунта пачками: отключение по запросу, чистка данных, хэштеги и уведомления."""
+
+import pytest
+
+from app import jobs, trending
+from app.deletion import delete_user
+from app.extensions import db
+from app.models import Comment, Job, Like, Notification, Post, PostTag, TrendingTag, User
+
+from conftest import PASSWORD, login, make_post
+
+
+@pytest.fixture(autouse=True)
+def small_batches(app):
+    # по одной строке в пачке: каждый шаг проходит несколько транзакций
+    app.config["DELETE_BATCH_SIZE"] = 1
+
+
+def test_delete_request_disables_account_until_job_runs(client, alice):
+    user_id = alice.id
+    login(client, alice)
+    response = client.post("/profile/delete", data={"password": PASSWORD})
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert db.session.get(User, user_id).deleted_at is not None
+    assert client.get("/notifications/").status_code == 302
+    assert client.post("/auth/login", data={"phone": alice.phone, "password": PASSWORD}).status_code != 302
+
+    assert jobs.drain() == 1
+    assert db.session.get(User, user_id) is None
+    job = Job.query.filter_by(kind="delete_account").one()
+    assert job.status == "done"
+    assert job.progress["users"] == 1
+
+
+def test_posts_removed_with_children_and_other_posts_recounted(alice, bob):
+    own = make_post(alice, "пост Алисы")
+    other = make_post(bob, "пост Боба")
+    db.session.add_all(
+        [
+            Like(post_id=own.id, user_id=bob.id),
+            Comment(post_id=own.id, user_id=bob.id, body="под постом Алисы"),
+            Like(post_id=other.id, user_id=alice.id),
+        ]
+    )
+    db.session.commit()
+    Post.query.filter_by(id=other.id).update({Post.likes_count: 1})
+    db.session.commit()
+
+    reported = []
+    counts = delete_user(alice.id, lambda **c: reported.append(c))
+    assert counts["posts"] == 1 and counts["post_likes"] == 1 and counts["post_comments"] == 1
+    assert reported[-1] == counts
+    assert Comment.query.count() == 0 and Like.query.count() == 0
+    assert db.session.get(Post, other.id).likes_count == 0
+
+
+def test_post_tags_and_notifications_cleaned_up(alice, bob, carol):
+    shared = make_post(alice, "#общий и #свой")
+    make_post(alice, "ещё #общий")
+    make_post(bob, "тоже #общий")
+    trending.update()
+    assert db.session.get(TrendingTag, "общий").posts == 3
+
+    # уведомление о посте Алисы у другого пользователя: после удаления ссылка вела бы в никуда
+    db.session.add(Notification(user_id=carol.id, kind="comment", payload={"from": "Боб", "post_id": shared.id}))
+    db.session.add(Notification(user_id=carol.id, kind="export", payload={"job_id": 1}))
+    db.session.commit()
+
+    counts = delete_user(alice.id)
+    assert counts["post_notifications"] == 1
+    assert db.session.get(TrendingTag, "общий").posts == 1
+    assert db.session.get(TrendingTag, "свой") is None
+    assert PostTag.query.count() == 1
+    assert [n.kind for n in Notification.query.filter_by(user_id=carol.id)] == ["export"]
+
+
+def test_missing_user(app):
+    with pytest.raises(LookupError):
+        delete_user(12345)
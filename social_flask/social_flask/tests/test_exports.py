@@ -0,0 +1,103 @@
+"""Выгрузка данных: задача собирает zip, скачать можно только последний архив своего аккаунта."""
+
+import json
+import os
+import zipfile
+
+import pytest
+
+from app import jobs
+from app.exports import export_user
+from app.extensions import db
+from app.models import Chat, ChatMembership, Job, Message, Notification
+
+from conftest import login, make_post
+
+
+@pytest.fixture(autouse=True)
+def export_dir(app, tmp_path):
+    app.config.update(EXPORT_DIR=str(tmp_path / "exports"), EXPORT_CHUNK_SIZE=2)
+    # загрузки пользователей — во временном каталоге, а не в static приложения
+    app.static_folder = str(tmp_path / "static")
+    os.makedirs(os.path.join(app.static_folder, "uploads"))
+    return tmp_path / "exports"
+
+
+def read_section(path, name):
+    with zipfile.ZipFile(path) as archive:
+        return [json.loads(line) for line in archive.read(f"{name}.jsonl").decode().splitlines() if line]
+
+
+def test_export_requested_built_and_downloaded(client, alice):
+    for i in range(5):
+        make_post(alice, f"пост {i}")
+    login(client, alice)
+    assert client.post("/profile/export").status_code == 302
+    assert jobs.drain() == 1
+
+    job = Job.query.filter_by(kind="export").one()
+    assert job.status == "done" and job.progress["posts"] == 5
+    assert Notification.query.filter_by(user_id=alice.id, kind="export").count() == 1
+    response = client.get(f"/profile/export/{job.id}")
+    assert response.status_code == 200
+    assert "attachment" in response.headers["Content-Disposition"]
+    response.close()
+
+
+def test_archive_contents(alice, bob, tmp_path):
+    for name in ("своё.png", "чужое.png"):
+        with open(os.path.join(tmp_path, "static", "uploads", name), "wb") as f:
+            f.write(b"png")
+    chat = Chat()
+    db.session.add(chat)
+    db.session.flush()
+    db.session.add_all(
+        [
+            ChatMembership(chat_id=chat.id, user_id=alice.id),
+            ChatMembership(chat_id=chat.id, user_id=bob.id),
+            Message(chat_id=chat.id, sender_id=alice.id, body="привет", media_url="/static/uploads/своё.png"),
+            Message(chat_id=chat.id, sender_id=bob.id, body="ответ", media_url="/static/uploads/чужое.png"),
+        ]
+    )
+    db.session.commit()
+    make_post(alice, "пост")
+
+    path = str(tmp_path / "out.zip")
+    counts = export_user(alice.id, path)
+    assert counts["messages"] == 2 and counts["posts"] == 1 and counts["media"] == 1
+    assert [row["body"] for row in read_section(path, "messages")] == ["привет", "ответ"]
+    with zipfile.ZipFile(path) as archive:
+        assert json.loads(archive.read("profile.json"))["name"] == "Алиса"
+        assert [name for name in archive.namelist() if name.startswith("media/")] == ["media/своё.png"]
+    assert not os.path.exists(path + ".part")
+
+
+def test_new_export_removes_previous_file(client, alice, export_dir):
+    login(client, alice)
+    client.post("/profile/export")
+    jobs.drain()
+    first = Job.query.filter_by(kind="export").one()
+    first_id, first_file = first.id, first.result
+
+    client.post("/profile/export")
+    jobs.drain()
+    assert first_file not in os.listdir(export_dir) and len(os.listdir(export_dir)) == 1
+    assert client.get(f"/profile/export/{first_id}").status_code == 404
+
+
+def test_export_of_another_user_not_found(client, app, alice, bob):
+    login(client, alice)
+    client.post("/profile/export")
+    jobs.drain()
+    job = Job.query.filter_by(kind="export").one()
+
+    other = app.test_client()
+    login(other, bob)
+    assert other.get(f"/profile/export/{job.id}").status_code == 404
+
+
+def test_export_form_requires_csrf_token(client, app, alice):
+    login(client, alice)
+    app.config["WTF_CSRF_ENABLED"] = True
+    assert client.post("/profile/export").status_code == 302
+    assert Job.query.count() == 0
@@ -0,0 +1,51 @@
+"""Лента укладывается в постоянное число запросов, сколько бы ни было постов и комментаторов."""
+
+import pytest
+
+from app.extensions import db
+from app.instrumentation import QueryBudgetExceeded, query_budget
+from app.models import Comment
+
+from conftest import login, make_post, make_user
+
+
+def populate(authors: int):
+    users = [make_user(f"Автор {i}", f"9{i:03d}") for i in range(authors)]
+    for user in users:
+        post = make_post(user, f"пост автора {user.id}")
+        # у каждого комментария свой автор: ленивые загрузки comment.author дали бы N+1
+        for commenter in users[:4]:
+            db.session.add(Comment(post_id=post.id, user_id=commenter.id, body="комментарий"))
+    db.session.commit()
+    return users
+
+
+@pytest.mark.parametrize("authors", [3, 15])
+def test_anonymous_feed_query_budget(client, authors):
+    populate(authors)
+    with query_budget(3):
+        response = client.get("/")
+    assert response.status_code == 200
+    assert f"пост автора {authors}" in response.get_data(as_text=True)
+    # повторный запрос анонима отдаётся из кэша ответов
+    with query_budget(0):
+        assert client.get("/").headers["X-Cache"] == "HIT"
+
+
+@pytest.mark.parametrize("authors", [3, 15])
+def test_logged_in_feed_query_budget(client, authors):
+    users = populate(authors)
+    login(client, users[0])
+    # снимок пользователя, посты с авторами, превью комментариев, число ответов, непрочитанные уведомления
+    with query_budget(5):
+        response = client.get("/")
+    assert response.status_code == 200
+    # дальше снимок пользователя берётся из кэша load_user
+    with query_budget(4):
+        client.get("/")
+
+
+def test_query_budget_reports_overrun(client, alice):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(0):
+            client.get("/")
@@ -0,0 +1,30 @@
+"""Страница группы укладывается в постоянное число запросов, сколько бы ни было участников и записей."""
+
+import pytest
+
+from app.extensions import db
+from app.instrumentation import query_budget
+from app.models import Group, GroupMember, GroupPost, Visibility
+
+from conftest import login, make_user
+
+
+@pytest.mark.parametrize("members", [3, 15])
+def test_group_detail_query_budget(client, members):
+    users = [make_user(f"Участник {i}", f"8{i:03d}") for i in range(members)]
+    group = Group(name="Клуб", visibility=Visibility.PUBLIC, owner_id=users[0].id)
+    db.session.add(group)
+    db.session.flush()
+    for user in users:
+        db.session.add(GroupMember(group_id=group.id, user_id=user.id, is_admin=user is users[0]))
+        # у каждой записи свой автор: ленивые загрузки post.author дали бы N+1
+        db.session.add(GroupPost(group_id=group.id, author_id=user.id, body=f"запись {user.id}"))
+    db.session.commit()
+
+    login(client, users[-1])
+    # группа и проверка доступа к ней, снимок пользователя, участники, друзья зрителя, записи, непрочитанные уведомления
+    with query_budget(7):
+        response = client.get(f"/groups/{group.id}")
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert f"Участник {members - 1}" in page and f"запись {users[0].id}" in page
@@ -0,0 +1,146 @@
+"""Переключение лайка: сразу в базу и через накопитель LikeBuffer."""
+
+import threading
+
+import pytest
+
+from app import create_app
+from app.extensions import db
+from app.likes import like_buffer
+from app.models import Like, Notification, Post, Visibility
+from config import TestConfig
+
+from conftest import XHR, login, make_post, make_user
+
+
+def like(client, post_id):
+    return client.post(f"/post/{post_id}/like", headers=XHR)
+
+
+def test_toggle_like(client, alice, bob):
+    post = make_post(alice)
+    login(client, bob)
+    assert like(client, post.id).json == {"liked": True, "likes_count": 1}
+    assert Like.query.filter_by(post_id=post.id, user_id=bob.id).count() == 1
+    assert Notification.query.filter_by(user_id=alice.id, kind="like").count() == 1
+
+    assert like(client, post.id).json == {"liked": False, "likes_count": 0}
+    assert Like.query.count() == 0
+    assert db.session.get(Post, post.id).likes_count == 0
+
+
+def test_own_like_does_not_notify(client, alice):
+    post = make_post(alice)
+    login(client, alice)
+    assert like(client, post.id).json["liked"] is True
+    assert Notification.query.count() == 0
+
+
+def test_like_hidden_or_missing_post(client, alice, bob):
+    post = make_post(alice, visibility=Visibility.PRIVATE)
+    login(client, bob)
+    assert like(client, post.id).status_code == 404
+    assert like(client, post.id + 100).status_code == 404
+    assert Like.query.count() == 0
+
+
+@pytest.fixture
+def buffered(app):
+    # окно заведомо длиннее теста: пишем в базу только явным flush()
+    app.config["LIKE_COALESCE_MS"] = 60_000
+    yield like_buffer
+    like_buffer.flush()
+
+
+def test_buffer_collapses_double_click(client, alice, bob, buffered):
+    post = make_post(alice)
+    login(client, bob)
+    assert like(client, post.id).json == {"liked": True, "likes_count": 1}
+    assert like(client, post.id).json == {"liked": False, "likes_count": 0}
+    assert buffered.flush() == 0
+    assert Like.query.count() == 0
+
+
+def test_buffer_writes_final_state(client, alice, bob, carol, buffered):
+    post = make_post(alice)
+    login(client, bob)
+    like(client, post.id)
+    login(client, carol)
+    assert like(client, post.id).json == {"liked": True, "likes_count": 2}
+    assert buffered.flush() == 2
+    assert db.session.get(Post, post.id).likes_count == 2
+
+
+def test_toggle_after_flush_reads_committed_state(client, alice, bob, buffered):
+    # клик после записи окна должен видеть лайк уже в базе и снять его
+    post = make_post(alice)
+    login(client, bob)
+    like(client, post.id)
+    assert buffered.flush() == 1
+    assert like(client, post.id).json == {"liked": False, "likes_count": 0}
+    assert buffered.flush() == 1
+    assert Like.query.count() == 0
+    assert db.session.get(Post, post.id).likes_count == 0
+
+
+def test_click_racing_a_flush_rereads_state(client, alice, bob, buffered, monkeypatch):
+    # первый клик прочитал «лайка нет», а пока он не взял блокировку, параллельный клик
+    # той же пары попал в окно и окно записалось; иначе второй клик потерялся бы
+    post = make_post(alice)
+    read = buffered._read
+    raced = []
+
+    def racing_read(*args):
+        result = read(*args)
+        if not raced:
+            raced.append(True)
+            buffered.toggle(post.id, bob.id, bob.name)
+            buffered.flush()
+        return result
+
+    monkeypatch.setattr(buffered, "_read", racing_read)
+    assert buffered.toggle(post.id, bob.id, bob.name) == (False, 0)
+    buffered.flush()
+    assert Like.query.count() == 0
+    assert db.session.get(Post, post.id).likes_count == 0
+
+
+def test_buffer_under_concurrent_clicks_and_flushes(tmp_path, monkeypatch):
+    # потокам нужна общая база в файле: SQLite в памяти — одно соединение на всех
+    monkeypatch.setattr(TestConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'likes.db'}")
+    app = create_app("test")
+    app.config["LIKE_COALESCE_MS"] = 60_000
+    with app.app_context():
+        users = [make_user(f"Пользователь {i}", f"5{i}") for i in range(4)]
+        post = make_post(users[0])
+        post_id, user_ids = post.id, [user.id for user in users]
+    clicks = {user_id: 7 + user_id for user_id in user_ids}
+    done = threading.Event()
+
+    def click(user_id):
+        with app.app_context():
+            for _ in range(clicks[user_id]):
+                like_buffer.toggle(post_id, user_id, "имя")
+            db.session.remove()
+
+    def flusher():
+        with app.app_context():
+            while not done.is_set():
+                like_buffer.flush()
+                db.session.remove()
+
+    flush_thread = threading.Thread(target=flusher)
+    flush_thread.start()
+    threads = [threading.Thread(target=click, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    flush_thread.join()
+    with app.app_context():
+        like_buffer.flush()
+        liked = set(db.session.scalars(db.select(Like.user_id).where(Like.post_id == post_id)))
+        assert liked == {user_id for user_id, n in clicks.items() if n % 2}
+        assert db.session.get(Post, post_id).likes_count == len(liked)
+        db.session.remove()
@@ -0,0 +1,73 @@
+"""Очередь писем: отправка пачкой, повторы и ошибки отдельных писем."""
+
+import smtplib
+
+from flask_mail import Connection
+
+from app import mail_queue
+from app.extensions import db, mail
+from app.models import OutgoingMail
+
+
+def queue(*subjects):
+    items = [mail_queue.enqueue(subject, ["to@example.com"], "текст") for subject in subjects]
+    db.session.commit()
+    return items
+
+
+def test_drain_sends_and_marks_sent(app):
+    queue("первое", "второе")
+    with mail.record_messages() as outbox:
+        assert mail_queue.drain() == 2
+    assert [message.subject for message in outbox] == ["первое", "второе"]
+    assert {item.status for item in OutgoingMail.query} == {"sent"}
+    assert mail_queue.drain() == 0
+
+
+def test_claimed_mail_is_not_claimed_twice(app):
+    queue("одно")
+    assert len(mail_queue._claim_batch(10)) == 1
+    assert mail_queue._claim_batch(10) == []
+
+
+def test_smtp_error_schedules_retry(app, monkeypatch):
+    (item,) = queue("письмо")
+
+    def refuse(self, message):
+        raise smtplib.SMTPRecipientsRefused({})
+
+    monkeypatch.setattr(Connection, "send", refuse)
+    assert mail_queue.drain() == 0
+    item = db.session.get(OutgoingMail, item.id)
+    assert (item.status, item.attempts) == ("pending", 1)
+    assert item.last_error.startswith("SMTPRecipientsRefused")
+
+
+def test_broken_message_does_not_resend_batch(app, monkeypatch):
+    app.config["MAIL_QUEUE_MAX_ATTEMPTS"] = 1
+    queue("хорошее", "сломанное", "последнее")
+    build = mail_queue.Message
+
+    def message(subject, **kwargs):
+        if subject == "сломанное":
+            raise ValueError("не собирается")
+        return build(subject, **kwargs)
+
+    monkeypatch.setattr(mail_queue, "Message", message)
+    with mail.record_messages() as outbox:
+        assert mail_queue.drain() == 2
+    assert [message.subject for message in outbox] == ["хорошее", "последнее"]
+    statuses = {item.subject: (item.status, item.attempts) for item in OutgoingMail.query}
+    # отправленные остаются отправленными, сломанное письмо доходит до failed
+    assert statuses == {"хорошее": ("sent", 0), "сломанное": ("failed", 1), "последнее": ("sent", 0)}
+
+
+def test_connection_error_retries_whole_batch(app, monkeypatch):
+    queue("а", "б")
+
+    def broken_connect():
+        raise ConnectionRefusedError("smtp недоступен")
+
+    monkeypatch.setattr(mail, "connect", broken_connect)
+    assert mail_queue.drain() == 0
+    assert {(item.status, item.attempts) for item in OutgoingMail.query} == {("pending", 1)}
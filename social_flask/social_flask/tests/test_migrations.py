@@ -0,0 +1,99 @@
+"""Версионированные миграции: запись версий, повторный запуск, перенос данных, отложенные индексы."""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations
+from app.migrations import CONCURRENT_INDEXES, MIGRATIONS, create_index, current_version, upgrade
+
+LATEST = MIGRATIONS[-1][0]
+
+
+@pytest.fixture
+def engine(app, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    yield engine
+    engine.dispose()
+
+
+def versions(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+
+
+def test_fresh_database_upgraded_once(engine):
+    assert current_version(engine) == 0
+    assert upgrade(engine) == [number for number, _description, _fn in MIGRATIONS]
+    assert current_version(engine) == LATEST
+    assert versions(engine) == list(range(1, LATEST + 1))
+    assert upgrade(engine) == []
+    assert versions(engine) == list(range(1, LATEST + 1))
+
+
+def test_upgrade_stops_at_target(engine):
+    assert upgrade(engine, target=3) == [1, 2, 3]
+    assert current_version(engine) == 3
+    assert "ix_post_user_id_created_at" in {ix["name"] for ix in inspect(engine).get_indexes("post")}
+    assert upgrade(engine)[0] == 4
+
+
+def test_legacy_repost_copies_moved_to_repost_table(engine):
+    upgrade(engine, target=5)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE post ADD COLUMN original_post_id INTEGER"))
+        conn.execute(text("INSERT INTO post (id, user_id, body) VALUES (1, 1, 'оригинал')"))
+        # два репоста одного пользователя — двойной клик в старой версии
+        for copy_id in (2, 3):
+            conn.execute(
+                text("INSERT INTO post (id, user_id, body, original_post_id) VALUES (:id, 2, 'оригинал', 1)"),
+                {"id": copy_id},
+            )
+        conn.execute(text("INSERT INTO comment (post_id, user_id, body) VALUES (2, 3, 'под копией')"))
+
+    upgrade(engine, target=6)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, reposts_count FROM post")).all() == [(1, 1)]
+        assert conn.execute(text("SELECT original_post_id, user_id FROM repost")).all() == [(1, 2)]
+        assert conn.execute(text("SELECT COUNT(*) FROM comment")).scalar() == 0
+
+
+def test_index_created_in_place_outside_postgresql(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (a INTEGER)"))
+        create_index(conn, "ix_t_a", "t", ["a"])
+        assert CONCURRENT_INDEXES not in conn.info
+    assert [ix["name"] for ix in inspect(engine).get_indexes("t")] == ["ix_t_a"]
+
+
+def test_postgresql_index_deferred_until_commit():
+    conn = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), info={})
+    create_index(conn, "ix_t_a", "t", ["a"], unique=True)
+    assert conn.info[CONCURRENT_INDEXES] == [
+        ("ix_t_a", 'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_t_a ON "t" ("a")')
+    ]
+
+
+def test_version_recorded_only_after_deferred_indexes(engine, monkeypatch):
+    upgrade(engine)
+    ran = []
+
+    def deferring(conn):
+        ran.append(True)
+        conn.info.setdefault(CONCURRENT_INDEXES, []).append(("ix_x", "CREATE INDEX ix_x ON x (a)"))
+
+    def failing_build(_engine, _indexes):
+        raise RuntimeError("сборка индекса прервана")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS + [(LATEST + 1, "тест", deferring)])
+    monkeypatch.setattr(migrations, "_build_concurrently", failing_build)
+    with pytest.raises(RuntimeError):
+        upgrade(engine)
+    assert current_version(engine) == LATEST
+
+    built = []
+    monkeypatch.setattr(migrations, "_build_concurrently", lambda _engine, indexes: built.extend(indexes))
+    assert upgrade(engine) == [LATEST + 1]
+    assert len(ran) == 2 and [name for name, _ddl in built] == ["ix_x"]
+    assert current_version(engine) == LATEST + 1
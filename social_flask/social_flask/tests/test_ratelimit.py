@@ -0,0 +1,63 @@
+"""Token bucket: 429 с Retry-After, и отклонённый запрос не тратит остальные вёдра."""
+
+import pytest
+
+from app.ratelimit import MemoryBucketStore, SQLiteBucketStore
+
+from conftest import XHR, login, make_post
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBucketStore(str(tmp_path / "ratelimit.db"))
+    return MemoryBucketStore()
+
+
+# пополнение настолько медленное, что за время теста его не видно
+USER = ("like:user:1", 2, 0.001)
+IP = ("like:ip:127.0.0.1", 5, 0.001)
+
+
+def test_all_buckets_charged_together(store):
+    assert store.take([USER, IP]) == (True, 0.0)
+    assert store.take([USER, IP]) == (True, 0.0)
+    allowed, retry_after = store.take([USER, IP])
+    assert not allowed and retry_after > 0
+
+
+def test_rejected_request_keeps_other_buckets(store):
+    for _ in range(2):
+        store.take([USER, IP])
+    for _ in range(10):
+        assert not store.take([USER, IP])[0]
+    # в ведре IP осталось 3 жетона: отказы по ведру пользователя их не тронули
+    assert [store.take([IP])[0] for _ in range(4)] == [True, True, True, False]
+
+
+@pytest.fixture
+def limited(app):
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMITS={"like": {"per_user": (2, 0.001), "per_ip": (3, 0.001)}})
+    return app
+
+
+def test_like_rate_limited(client, limited, alice, bob, carol):
+    post = make_post(alice)
+    login(client, bob)
+    statuses = [client.post(f"/post/{post.id}/like", headers=XHR).status_code for _ in range(5)]
+    assert statuses == [200, 200, 429, 429, 429]
+    response = client.post(f"/post/{post.id}/like", headers=XHR)
+    assert response.json == {"ok": False, "error": "rate_limited"}
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # с того же IP другой пользователь получает остаток ведра IP
+    login(client, carol)
+    assert client.post(f"/post/{post.id}/like", headers=XHR).status_code == 200
+    assert client.post(f"/post/{post.id}/like", headers=XHR).status_code == 429
+
+
+def test_disabled_limiter(client, app, alice, bob):
+    app.config["RATE_LIMITS"] = {"like": {"per_user": (1, 0.001)}}
+    post = make_post(alice)
+    login(client, bob)
+    assert {client.post(f"/post/{post.id}/like", headers=XHR).status_code for _ in range(3)} == {200}
@@ -0,0 +1,48 @@
+"""Репост — ссылка на исходный пост со счётчиком на оригинале."""
+
+from app.extensions import db
+from app.models import Notification, Post, Repost, Visibility
+
+from conftest import XHR, login, make_post
+
+
+def repost(client, post_id):
+    return client.post(f"/post/{post_id}/repost", headers=XHR)
+
+
+def test_toggle_repost(client, alice, bob):
+    post = make_post(alice, "оригинал")
+    login(client, bob)
+    assert repost(client, post.id).json == {"action": "added", "reposts_count": 1}
+    # содержимое не копируется: новых постов нет, только ссылка
+    assert Post.query.count() == 1
+    assert Repost.query.filter_by(original_post_id=post.id, user_id=bob.id).count() == 1
+    assert Notification.query.filter_by(user_id=alice.id, kind="repost").count() == 1
+    assert "оригинал" in client.get("/my-reposts").get_data(as_text=True)
+
+    assert repost(client, post.id).json == {"action": "removed", "reposts_count": 0}
+    assert Repost.query.count() == 0
+    assert db.session.get(Post, post.id).reposts_count == 0
+
+
+def test_reposts_count_across_users(client, alice, bob, carol):
+    post = make_post(alice)
+    login(client, bob)
+    repost(client, post.id)
+    login(client, carol)
+    assert repost(client, post.id).json == {"action": "added", "reposts_count": 2}
+
+
+def test_repost_hidden_post(client, alice, bob):
+    post = make_post(alice, visibility=Visibility.FRIENDS)
+    login(client, bob)
+    assert repost(client, post.id).status_code == 404
+    assert Repost.query.count() == 0
+
+
+def test_my_reposts_hides_post_made_private(client, alice, bob):
+    post = make_post(alice, "скоро скрою")
+    login(client, bob)
+    repost(client, post.id)
+    Post.query.filter_by(id=post.id).update({"visibility": Visibility.PRIVATE})
+    assert "скоро скрою" not in client.get("/my-reposts").get_data(as_text=True)
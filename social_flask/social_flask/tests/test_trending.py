@@ -0,0 +1,86 @@
+"""Пересчёт популярного: отметки, повторные лайки, теги из миграции 13."""
+
+from sqlalchemy import event
+
+from app import trending
+from app.extensions import db
+from app.migrations import MIGRATIONS
+from app.models import Like, PostTag, TrendingPost, TrendingTag, TrendingWatermark
+
+from conftest import make_post
+
+
+def watermark(source: str) -> int:
+    return db.session.execute(
+        db.select(TrendingWatermark.last_id).where(TrendingWatermark.source == source)
+    ).scalar()
+
+
+def test_update_after_tag_backfill(alice):
+    # пост из базы до миграции 13: миграция уже записала его теги в post_tag
+    post = make_post(alice, "hello #мир")
+    backfill = dict((number, fn) for number, _description, fn in MIGRATIONS)[13]
+    with db.engine.begin() as conn:
+        backfill(conn)
+    assert PostTag.query.filter_by(post_id=post.id, tag="мир").count() == 1
+
+    assert trending.update()["post"] == 1
+    assert watermark("post") == post.id
+    assert trending.update()["post"] == 0
+    assert db.session.get(TrendingTag, "мир").posts == 1
+
+    newer = make_post(alice, "ещё #мир")
+    assert trending.update()["post"] == 1
+    assert db.session.get(TrendingTag, "мир").posts == 2
+    assert PostTag.query.filter_by(post_id=newer.id).count() == 1
+
+
+def test_like_scores_once_per_user(alice, bob):
+    post = make_post(alice)
+    db.session.add(Like(post_id=post.id, user_id=bob.id))
+    db.session.commit()
+    trending.update()
+    score = db.session.get(TrendingPost, post.id).score
+
+    # снял и поставил снова: новая строка лайка, но та же пара (пост, пользователь)
+    Like.query.delete()
+    db.session.add(Like(post_id=post.id, user_id=bob.id))
+    db.session.commit()
+    trending.update()
+    assert db.session.get(TrendingPost, post.id).score == score
+
+
+def test_claim_lost_to_concurrent_update(alice, bob):
+    post = make_post(alice)
+    like = Like(post_id=post.id, user_id=bob.id)
+    db.session.add(like)
+    db.session.commit()
+    trending._ensure_watermarks()
+
+    def race(state):
+        # параллельный пересчёт забирает пачку между чтением отметки и её захватом
+        if state.is_update and not raced:
+            raced.append(True)
+            state.session.execute(
+                db.text("UPDATE trending_watermark SET last_id = :id WHERE source = 'like'"), {"id": like.id}
+            )
+
+    raced = []
+    event.listen(db.session, "do_orm_execute", race)
+    try:
+        assert trending._consume("like", Like, Like.post_id, True, Like.user_id) == 0
+    finally:
+        event.remove(db.session, "do_orm_execute", race)
+    assert raced
+    assert db.session.get(TrendingPost, post.id) is None
+
+
+def test_cyrillic_tag_filter(client, alice, bob):
+    post = make_post(alice, "Привет, #Москва")
+    db.session.add(Like(post_id=post.id, user_id=bob.id))
+    db.session.commit()
+    trending.update()
+    for tag in ("москва", "МОСКВА"):
+        html = client.get("/trending", query_string={"tag": tag}).get_data(as_text=True)
+        assert "Привет, #Москва" in html
+    assert "Привет" not in client.get("/trending", query_string={"tag": "питер"}).get_data(as_text=True)
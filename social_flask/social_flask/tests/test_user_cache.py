@@ -0,0 +1,45 @@
+"""Кэш снимков пользователя в load_user и его сброс после коммита."""
+
+from app.extensions import db, user_cache
+from app.instrumentation import query_budget
+from app.models import User, Visibility, load_user
+
+from conftest import login
+
+
+def test_snapshot_cached_between_requests(client, alice):
+    login(client, alice)
+    client.get("/notifications/")
+    assert user_cache.get(alice.id) is not None
+    with query_budget(0):
+        assert load_user(str(alice.id)).name == "Алиса"
+
+
+def test_password_change_invalidated_after_commit(alice):
+    load_user(str(alice.id))
+    user = db.session.get(User, alice.id)
+    old_snapshot = user_cache.get(alice.id)
+    user.set_password("новый пароль")
+    # параллельный запрос между set_password и коммитом снова кладёт в кэш старый снимок
+    user_cache.set(alice.id, old_snapshot)
+    db.session.commit()
+    assert user_cache.get(alice.id) is None
+    assert load_user(str(alice.id)).check_password("новый пароль")
+
+
+def test_rolled_back_change_forgets_pending_invalidation(alice):
+    load_user(str(alice.id))
+    db.session.get(User, alice.id).set_password("не сохранится")
+    db.session.rollback()
+    db.session.commit()
+    assert user_cache.get(alice.id) is not None
+
+
+def test_profile_edit_refreshes_snapshot(client, alice):
+    login(client, alice)
+    client.get("/notifications/")
+    form = {"bio": "", "city": "", "occupation": "", "interests": "", "date_of_birth": "2000-01-01"}
+    client.post("/profile/edit", data=dict(form, privacy_level="friends"))
+    assert user_cache.get(alice.id) is None
+    client.get("/notifications/")
+    assert user_cache.get(alice.id)["privacy_level"] == Visibility.FRIENDS
@@ -0,0 +1,11 @@
+"""WSGI-точка входа для production-сервера.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+from app import create_app, ensure_dirs
+
+app = create_app(os.environ.get("APP_CONFIG", "prod"))
+ensure_dirs()